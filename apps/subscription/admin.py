@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db.models import Q
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Plan, Subscription, ExchangeRateLog
+from .models import Plan, Subscription, ExchangeRateLog, ExchangeRateSnapshot, ExchangeRateRollup, PlanSubscriptionStats
+from .counters import transition_status
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Plan)
 class PlanAdmin(admin.ModelAdmin):
@@ -15,8 +20,13 @@ class PlanAdmin(admin.ModelAdmin):
         return f"${obj.price}"
     price_display.short_description = "Price"
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('stats')
+    
     def subscription_count(self, obj):
-        count = obj.subscriptions.count()
+        # read from the denormalized counters, no COUNT per row ==>
+        stats = getattr(obj, 'stats', None)
+        count = stats.total_count if stats else 0
         if count > 0:
             url = reverse('admin:subscription_subscription_changelist')
             return format_html(
@@ -26,23 +36,79 @@ class PlanAdmin(admin.ModelAdmin):
         return "0 subscriptions"
     subscription_count.short_description = "Subscriptions"
 
+@admin.register(PlanSubscriptionStats)
+class PlanSubscriptionStatsAdmin(admin.ModelAdmin):
+    list_display = ['plan', 'active_count', 'cancelled_count', 'expired_count', 'updated_at']
+    readonly_fields = ['plan', 'active_count', 'cancelled_count', 'expired_count', 'updated_at']
+    ordering = ['plan__price']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('plan')
+    
+    def has_add_permission(self, request):
+        return False
+
+class EffectiveStatusFilter(admin.SimpleListFilter):
+    # the status as of now, an active row past its end_date is listed as expired
+    title = 'status'
+    parameter_name = 'status'
+    
+    def lookups(self, request, model_admin):
+        return Subscription.STATUS_CHOICES
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.effective(self.value())
+        return queryset
+
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
-    list_display = ['user_display', 'plan', 'start_date', 'end_date', 'status_display', 'days_remaining', 'created_at']
-    list_filter = ['status', 'plan', 'created_at', 'start_date', 'end_date']
-    search_fields = ['user__username', 'user__email', 'plan__name']
+    list_display = ['user_display', 'plan', 'start_date', 'end_date', 'status_display', 'days_remaining', 'auto_renew', 'created_at']
+    list_filter = [EffectiveStatusFilter, 'plan', 'auto_renew', 'created_at']
+    search_fields = ['^user__username', '=user__email', '=plan__name']
+    search_help_text = "Username prefix, exact email or exact plan name"
     readonly_fields = ['created_at', 'updated_at', 'days_remaining_display']
-    date_hierarchy = 'created_at'
     actions = ['cancel_subscriptions', 'activate_subscriptions']
     
+    # large table mode: no COUNT(*) / SELECT DISTINCT date per page load,
+    # no full User / Plan dropdowns on the change form ==>
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ['user']
+    autocomplete_fields = ['plan']
+    ordering = ['-created_at', '-id']
+    sortable_by = ['created_at']
+    
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'plan')
+        return super().get_queryset(request).select_related('user', 'plan').with_effective_status()
+    
+    def get_search_results(self, request, queryset, search_term):
+        # resolve the term against users and plans first, then filter
+        # subscriptions by id so the (user, -created_at, -id) index is used
+        # instead of LIKE '%term%' over the joined tables ==>
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        
+        user_filter = Q(email__iexact=term) if '@' in term else Q(username__istartswith=term)
+        user_ids = list(
+            User.objects.filter(user_filter).values_list('id', flat=True)[:settings.ADMIN_COUNT_LIMIT]
+        )
+        plan_ids = list(Plan.objects.filter(name__iexact=term).values_list('id', flat=True))
+        
+        condition = Q(pk__in=[])
+        if user_ids:
+            condition |= Q(user_id__in=user_ids)
+        if plan_ids:
+            condition |= Q(plan_id__in=plan_ids)
+        return queryset.filter(condition), False
     
     def user_display(self, obj):
         return f"{obj.user.username} ({obj.user.email})"
     user_display.short_description = "User"
     
     def status_display(self, obj):
+        status = obj.get_effective_status()
         colors = {
             'active': 'green',
             'cancelled': 'orange', 
@@ -50,17 +116,15 @@ class SubscriptionAdmin(admin.ModelAdmin):
         }
         return format_html(
             '<span style="color: {};">{}</span>',
-            colors.get(obj.status, 'black'),
-            obj.get_status_display()
+            colors.get(status, 'black'),
+            dict(Subscription.STATUS_CHOICES).get(status, status)
         )
     status_display.short_description = "Status"
     
     def days_remaining(self, obj):
-        if obj.status != 'active':
+        if obj.end_date is None or obj.get_effective_status() != 'active':
             return '-'
-        from django.utils import timezone
-        remaining = (obj.end_date - timezone.now()).days
-        return max(0, remaining)
+        return obj.get_days_remaining()
     days_remaining.short_description = "Days Left"
     
     def days_remaining_display(self, obj):
@@ -68,12 +132,12 @@ class SubscriptionAdmin(admin.ModelAdmin):
     days_remaining_display.short_description = "Days Remaining"
     
     def cancel_subscriptions(self, request, queryset):
-        updated = queryset.filter(status='active').update(status='cancelled')
+        updated = transition_status(queryset, ['active'], 'cancelled')
         self.message_user(request, f'{updated} subscriptions cancelled.')
     cancel_subscriptions.short_description = "Cancel selected subscriptions"
     
     def activate_subscriptions(self, request, queryset):
-        updated = queryset.filter(status__in=['cancelled', 'expired']).update(status='active')
+        updated = transition_status(queryset, ['cancelled', 'expired'], 'active')
         self.message_user(request, f'{updated} subscriptions activated.')
     activate_subscriptions.short_description = "Activate selected subscriptions"
 
@@ -89,3 +153,28 @@ class ExchangeRateLogAdmin(admin.ModelAdmin):
     def currency_pair(self, obj):
         return f"{obj.base_currency}/{obj.target_currency}"
     currency_pair.short_description = "Currency Pair"
+
+@admin.register(ExchangeRateSnapshot)
+class ExchangeRateSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['base_currency', 'rates_count', 'fetched_at']
+    list_filter = ['base_currency']
+    readonly_fields = ['fetched_at']
+    ordering = ['-fetched_at']
+    
+    def rates_count(self, obj):
+        return len(obj.rates)
+    rates_count.short_description = "Rates"
+
+@admin.register(ExchangeRateRollup)
+class ExchangeRateRollupAdmin(admin.ModelAdmin):
+    list_display = ['currency_pair', 'interval', 'bucket_start', 'open', 'high', 'low', 'close', 'samples']
+    list_filter = ['interval', 'base_currency', 'target_currency']
+    ordering = ['-bucket_start']
+    
+    def currency_pair(self, obj):
+        return f"{obj.base_currency}/{obj.target_currency}"
+    currency_pair.short_description = "Currency Pair"
+    
+    def has_add_permission(self, request):
+        # maintained from the rate snapshots, see rollups.py
+        return False
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .blacklist import get_token_blacklist
+
+
+def user_cache_key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+# what the authentication checks and permissions need, nothing else goes in
+# the shared cache: no password hash, no email
+CACHED_USER_FIELDS = ['id', 'username', 'is_active', 'is_staff', 'is_superuser']
+
+
+def cached_user_entry(user):
+    entry = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+    # compared with the token's revocation claim, never the hash itself
+    entry['revoke_fingerprint'] = get_md5_hash_password(user.password)
+    return entry
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication with the user kept in the shared cache for
+    JWT_USER_CACHE_TTL seconds (0 turns it off). Only CACHED_USER_FIELDS and
+    the revocation fingerprint are cached, a hit is rebuilt into an unsaved
+    User with just those fields and from_auth_cache set: enough for
+    permissions and user_id filters, never to be saved or serialized. Saving or deleting a user drops the
+    entry (see signals), cached users go through the same active / revoked
+    checks as freshly loaded ones.
+    """
+
+    def get_user(self, validated_token):
+        ttl = settings.JWT_USER_CACHE_TTL
+        if not ttl:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            # not found / inactive users raise here and are never cached
+            user = super().get_user(validated_token)
+            cache.set(key, cached_user_entry(user), ttl)
+            return user
+
+        self.check_user(entry, validated_token)
+        user = self.user_model(**{field: entry[field] for field in CACHED_USER_FIELDS})
+        user.from_auth_cache = True
+        return user
+
+    def check_user(self, entry, validated_token):
+        # JWTAuthentication.get_user's checks, for users from the cache
+        if api_settings.CHECK_USER_IS_ACTIVE and not entry['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry['revoke_fingerprint']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+
+class ReadOnlyClaimsJWTAuthentication(CachedJWTAuthentication):
+    """
+    For read-only endpoints: with JWT_TRUST_CLAIMS_ON_READS on, safe requests
+    get a TokenUser built from the token claims and no user lookup at all.
+    A deactivated user keeps read access until the access token expires.
+    Other methods, or the setting off, behave like CachedJWTAuthentication.
+    """
+
+    def authenticate(self, request):
+        self.trust_claims = settings.JWT_TRUST_CLAIMS_ON_READS and request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if getattr(self, 'trust_claims', False):
+            return JWTStatelessUserAuthentication.get_user(self, validated_token)
+        return super().get_user(validated_token)
+
+
+class BlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token checked against the token blacklist (blacklist.py)
+    instead of the token_blacklist app's tables: no writes on issue, and a
+    revocation is one key with the token's remaining lifetime.
+    """
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        self.check_blacklist()
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in get_token_blacklist():
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        get_token_blacklist().add(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+
+class BlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    # ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION: the used token is revoked
+    token_class = BlacklistRefreshToken
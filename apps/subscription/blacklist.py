@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def blacklist_key(jti):
+    return f"jwt_blacklist:{jti}"
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter over strings: no false negatives, false
+    positives at about error_rate once capacity items are in.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # double hashing over one 128 bit digest, lazily: a miss stops at
+        # the first unset bit
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        for i in range(self.hashes):
+            yield (first + i * second) % size
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class CacheTokenBlacklist:
+    """
+    Revoked token ids in the Django cache until the token expires, one
+    cache read per check. Used without JWT_BLACKLIST_REDIS_URL; a cache that
+    evicts (local memory MAX_ENTRIES, an LRU Redis) can drop revocations.
+    """
+
+    def add(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl > 0:
+            cache.set(blacklist_key(jti), 1, ttl)
+
+    def __contains__(self, jti):
+        return cache.get(blacklist_key(jti)) is not None
+
+
+# revocation: the exact key with the token's remaining lifetime, and an entry
+# in the log that processes sync their bloom filters from. Log scores are
+# Redis server time in microseconds, strictly increasing, so a cursor never
+# skips an entry; entries older than the refresh lifetime are dropped since
+# those tokens have expired anyway
+ADD_SCRIPT = """
+local now = redis.call('TIME')
+local score = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local last = tonumber(redis.call('GET', KEYS[3]) or '0')
+if score <= last then
+    score = last + 1
+end
+redis.call('SET', KEYS[3], string.format('%d', score))
+redis.call('SET', KEYS[1], '1', 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], string.format('%d', score), ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', string.format('(%d', score - tonumber(ARGV[3]) * 1000000))
+return score
+"""
+
+
+class RedisTokenBlacklist:
+    """
+    Revoked token ids in Redis, with a per-process bloom filter in front.
+    A check for a token that isn't revoked, nearly every one, is answered by
+    the filter without a round trip; a filter hit is confirmed with one
+    EXISTS. The filter follows the revocation log, pulling new entries at
+    most every sync_interval seconds: a token revoked by another process can
+    pass here for up to that long (0 syncs on every check).
+    """
+    log_key = 'jwt_blacklist:log'
+    last_key = 'jwt_blacklist:last'
+    sync_batch = 10000
+
+    def __init__(self, client, capacity, error_rate, sync_interval, retention):
+        self.client = client
+        self.add_script = client.register_script(ADD_SCRIPT)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.retention = int(retention)
+
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.cursor = 0
+        self.synced_at = 0.0
+
+    def add(self, jti, exp):
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            return
+        self.add_script(keys=[blacklist_key(jti), self.log_key, self.last_key], args=[jti, ttl, self.retention])
+
+        # known here right away, other processes on their next sync
+        bloom = self.bloom
+        if bloom is not None:
+            bloom.add(jti)
+
+    def sync(self):
+        if self.bloom is not None and time.monotonic() - self.synced_at < self.sync_interval:
+            return
+
+        with self.lock:
+            if self.bloom is not None and time.monotonic() - self.synced_at < self.sync_interval:
+                return
+
+            bloom = self.bloom
+            cursor = self.cursor
+            if bloom is None or bloom.count >= bloom.capacity:
+                # first use, or full: rebuilt from the log, which only holds
+                # tokens that can still be used
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                cursor = 0
+
+            while True:
+                rows = self.client.zrangebyscore(
+                    self.log_key, f'({cursor}', '+inf', start=0, num=self.sync_batch, withscores=True
+                )
+                for member, score in rows:
+                    bloom.add(member.decode())
+                if rows:
+                    cursor = int(rows[-1][1])
+                if len(rows) < self.sync_batch:
+                    break
+
+            if bloom is not self.bloom:
+                logger.info(f"Token blacklist filter built with {bloom.count} revoked tokens")
+            self.bloom = bloom
+            self.cursor = cursor
+            self.synced_at = time.monotonic()
+
+    def __contains__(self, jti):
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return bool(self.client.exists(blacklist_key(jti)))
+
+
+_blacklist = None
+_blacklist_lock = threading.Lock()
+
+
+def get_token_blacklist():
+    global _blacklist
+    if _blacklist is None:
+        with _blacklist_lock:
+            if _blacklist is None:
+                _blacklist = build_token_blacklist()
+    return _blacklist
+
+
+def build_token_blacklist():
+    if not settings.JWT_BLACKLIST_REDIS_URL:
+        return CacheTokenBlacklist()
+
+    import redis
+    from rest_framework_simplejwt.settings import api_settings
+
+    return RedisTokenBlacklist(
+        redis.Redis.from_url(settings.JWT_BLACKLIST_REDIS_URL),
+        capacity=settings.JWT_BLACKLIST_BLOOM_CAPACITY,
+        error_rate=settings.JWT_BLACKLIST_BLOOM_ERROR_RATE,
+        sync_interval=settings.JWT_BLACKLIST_SYNC_INTERVAL,
+        retention=api_settings.REFRESH_TOKEN_LIFETIME.total_seconds(),
+    )
@@ -0,0 +1,92 @@
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Plan
+
+PLAN_CATALOG_VERSION_KEY = 'plan_catalog:version'
+
+
+def plan_catalog_key(version):
+    return f"plan_catalog:{version}"
+
+
+class PlanCatalog:
+    """
+    Immutable snapshot of every plan, built once per catalog version: the
+    Plan instances by id (for validation) and the serialized list served by
+    the plans endpoint.
+    """
+
+    def __init__(self, version, plans):
+        from .serializers import PlanSerializer
+
+        self.version = version
+        self.plans = plans
+        self.by_id = {plan.id: plan for plan in plans}
+        self.data = [dict(item) for item in PlanSerializer(plans, many=True).data]
+
+    @property
+    def etag(self):
+        return f'"plans-{self.version}"'
+
+    @property
+    def last_modified(self):
+        # the version stamp is the time of the last plan change, in whole
+        # seconds like the HTTP date it is compared with
+        return datetime.fromtimestamp(self.version // 10 ** 9, tz=dt_timezone.utc)
+
+    def get(self, plan_id):
+        return self.by_id.get(plan_id)
+
+    def __len__(self):
+        return len(self.plans)
+
+
+_local = {'catalog': None, 'checked_at': 0.0}
+_local_lock = threading.Lock()
+
+
+def get_catalog_version():
+    version = cache.get(PLAN_CATALOG_VERSION_KEY)
+    if version is None:
+        # first use or evicted: whoever gets here first sets it
+        cache.add(PLAN_CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(PLAN_CATALOG_VERSION_KEY)
+    return version
+
+
+def get_plan_catalog():
+    """
+    Process-local catalog, revalidated against the shared version stamp at
+    most every PLAN_CATALOG_LOCAL_TTL seconds. On a version change the new
+    catalog comes from the shared cache, and only the first process to see
+    the new version reads the plans table.
+    """
+    catalog = _local['catalog']
+    now = time.monotonic()
+    if catalog is not None and now - _local['checked_at'] < settings.PLAN_CATALOG_LOCAL_TTL:
+        return catalog
+
+    version = get_catalog_version()
+    if catalog is None or catalog.version != version:
+        key = plan_catalog_key(version)
+        catalog = cache.get(key)
+        if catalog is None:
+            catalog = PlanCatalog(version, list(Plan.objects.order_by('price')))
+            cache.set(key, catalog, settings.PLAN_CATALOG_CACHE_TTL)
+
+    with _local_lock:
+        _local['catalog'] = catalog
+        _local['checked_at'] = now
+    return catalog
+
+
+def invalidate_plan_catalog():
+    # new version stamp for every process, this one rebuilds right away
+    cache.set(PLAN_CATALOG_VERSION_KEY, time.time_ns(), None)
+    with _local_lock:
+        _local['catalog'] = None
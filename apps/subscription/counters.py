@@ -0,0 +1,143 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import PlanSubscriptionStats, Subscription
+
+STATUS_FIELDS = {
+    'active': 'active_count',
+    'cancelled': 'cancelled_count',
+    'expired': 'expired_count',
+}
+
+
+def adjust_plan_counters(plan_id, create=True, **deltas):
+    """
+    Apply status deltas to a plan's counters, e.g. active=-1, cancelled=1.
+    Relative F() updates so concurrent writers never overwrite each other.
+    With create=False a missing counters row is left missing, for deletes
+    that run while the plan itself is being deleted.
+    """
+    updates = {
+        STATUS_FIELDS[status]: F(STATUS_FIELDS[status]) + delta
+        for status, delta in deltas.items() if delta
+    }
+    if not updates:
+        return
+
+    if not PlanSubscriptionStats.objects.filter(plan_id=plan_id).update(**updates) and create:
+        PlanSubscriptionStats.objects.get_or_create(plan_id=plan_id)
+        PlanSubscriptionStats.objects.filter(plan_id=plan_id).update(**updates)
+
+
+def transition_status(queryset, from_statuses, to_status):
+    """
+    Bulk status change that keeps the counters exact: one UPDATE per
+    (plan, status) group, and the affected row count of each UPDATE is what
+    gets moved between counters.
+    """
+    updated_total = 0
+
+    with transaction.atomic():
+        groups = (
+            queryset.filter(status__in=from_statuses)
+            .order_by()
+            .values_list('plan_id', 'status')
+            .distinct()
+        )
+        for plan_id, status in list(groups):
+            updated = queryset.filter(plan_id=plan_id, status=status).update(
+                status=to_status, updated_at=timezone.now()
+            )
+            if updated:
+                adjust_plan_counters(plan_id, **{status: -updated, to_status: updated})
+                updated_total += updated
+
+    return updated_total
+
+
+def transition_status_by_id(queryset, from_status, to_status):
+    """
+    Like transition_status, but the rows change in a single UPDATE by
+    primary key: the matching rows are locked first (SELECT ... FOR UPDATE),
+    which also says which plans' counters to move. Returns the ids of the
+    rows that changed.
+    """
+    with transaction.atomic():
+        rows = dict(
+            queryset.filter(status=from_status)
+            .select_for_update()
+            .order_by()
+            .values_list('id', 'plan_id')
+        )
+        if not rows:
+            return []
+
+        updated = Subscription.objects.filter(id__in=rows, status=from_status).update(
+            status=to_status, updated_at=timezone.now()
+        )
+        if updated == len(rows):
+            for plan_id, count in Counter(rows.values()).items():
+                adjust_plan_counters(plan_id, **{from_status: -count, to_status: count})
+        else:
+            # no row locks on SQLite, a concurrent write got in between:
+            # recount these plans instead of guessing which rows moved
+            rebuild_plan_counters(set(rows.values()))
+            return list(
+                Subscription.objects.filter(id__in=rows, status=to_status).values_list('id', flat=True)
+            )
+
+    return list(rows)
+
+
+# the counters move with the stored status, reads resolve it as of now: an
+# active row past its end_date is still counted as active until the expiry
+# sweep stores it as expired (every minute, auto-renew rows once the renewal
+# grace period is over)
+STATUS_COUNTS_NOTE = (
+    "Counts follow the stored status: subscriptions that just ended are counted "
+    "as active until the expiry sweep moves them, about a minute, longer for "
+    "auto-renewing ones in their renewal grace period."
+)
+
+
+def get_status_totals():
+    # system wide counters in O(plans), with the lag of STATUS_COUNTS_NOTE
+    totals = PlanSubscriptionStats.objects.aggregate(
+        active=Sum('active_count'),
+        cancelled=Sum('cancelled_count'),
+        expired=Sum('expired_count'),
+    )
+    return {status: totals[status] or 0 for status in STATUS_FIELDS}
+
+
+@transaction.atomic
+def rebuild_plan_counters(plan_ids=None):
+    # reconcile the counters table from a full GROUP BY over subscriptions
+    from .models import Plan
+
+    plans = Plan.objects.all()
+    if plan_ids:
+        plans = plans.filter(id__in=plan_ids)
+
+    stats = {plan_id: PlanSubscriptionStats(plan_id=plan_id) for plan_id in plans.values_list('id', flat=True)}
+
+    rows = (
+        Subscription.objects.filter(plan_id__in=stats.keys())
+        .order_by()
+        .values('plan_id', 'status')
+        .annotate(count=Count('id'))
+    )
+    for row in rows:
+        setattr(stats[row['plan_id']], STATUS_FIELDS[row['status']], row['count'])
+
+    PlanSubscriptionStats.objects.bulk_create(
+        stats.values(),
+        update_conflicts=True,
+        # MySQL upserts on any unique key and rejects an explicit target
+        unique_fields=['plan'] if connection.features.supports_update_conflicts_with_target else None,
+        update_fields=list(STATUS_FIELDS.values()) + ['updated_at'],
+    )
+    return list(stats.values())
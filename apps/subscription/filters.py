@@ -0,0 +1,20 @@
+import django_filters
+
+from .models import Subscription
+
+
+class SubscriptionFilter(django_filters.FilterSet):
+    # every filter is combined with the user, see Subscription.Meta.indexes
+    status = django_filters.ChoiceFilter(choices=Subscription.STATUS_CHOICES, method='filter_status')
+    plan = django_filters.NumberFilter(field_name='plan_id')
+    created_at = django_filters.IsoDateTimeFromToRangeFilter()
+    start_date = django_filters.IsoDateTimeFromToRangeFilter()
+    end_date = django_filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Subscription
+        fields = ['status', 'plan', 'created_at', 'start_date', 'end_date']
+
+    def filter_status(self, queryset, name, value):
+        # the status as of now: 'expired' includes active rows past their end_date
+        return queryset.effective(value)
@@ -0,0 +1,216 @@
+import atexit
+import collections
+import json
+import logging
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ExchangeRateLog
+
+logger = logging.getLogger(__name__)
+
+FLUSH_LOCK_KEY = 'exchange_rate_log_flush:lock'
+FLUSH_MAX_SECONDS = 30
+
+
+def write_observations(observations):
+    # (base, target, rate, fetched_at) tuples, one INSERT per batch
+    ExchangeRateLog.objects.bulk_create([
+        ExchangeRateLog(base_currency=base_currency, target_currency=target_currency, rate=rate, fetched_at=fetched_at)
+        for base_currency, target_currency, rate, fetched_at in observations
+    ], batch_size=settings.EXCHANGE_RATE_LOG_FLUSH_BATCH_SIZE)
+
+
+class LocalRateLogBuffer:
+    """
+    Observations in a bounded per-process queue, written by a daemon thread
+    every flush_interval seconds (0 leaves it to flush() calls) and once
+    more at interpreter exit. Used without EXCHANGE_RATE_LOG_BUFFER_REDIS_URL;
+    a process that is killed loses what it had buffered.
+    """
+
+    def __init__(self, max_size, batch_size, flush_interval):
+        self.queue = collections.deque()
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self.lock = threading.Lock()
+        self.thread = None
+        atexit.register(self.flush)
+
+    def add(self, observation):
+        if len(self.queue) >= self.max_size:
+            self.dropped += 1
+            return False
+        self.queue.append(observation)
+        if self.flush_interval and self.thread is None:
+            self.start()
+        return True
+
+    async def aadd(self, observation):
+        return self.add(observation)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='rate-log-flusher', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Rate log flush failed, {len(self.queue)} observations kept: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def flush(self, deadline=None):
+        written = 0
+        with self.lock:
+            while self.queue and (deadline is None or time.monotonic() < deadline):
+                batch = []
+                while self.queue and len(batch) < self.batch_size:
+                    batch.append(self.queue.popleft())
+                try:
+                    write_observations(batch)
+                except Exception:
+                    # back at the head, in order, for the next flush
+                    self.queue.extendleft(reversed(batch))
+                    raise
+                written += len(batch)
+
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning(f"Rate log buffer full, dropped {dropped} observations")
+        return written
+
+    def clear(self):
+        self.queue.clear()
+        self.dropped = 0
+
+
+# bounded push: full list, the observation is counted as dropped instead
+PUSH_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    redis.call('INCR', KEYS[2])
+    return 0
+end
+return redis.call('RPUSH', KEYS[1], ARGV[2])
+"""
+
+
+class RedisRateLogBuffer:
+    """
+    Observations in a bounded Redis list shared by every process, drained
+    by the flush_exchange_rate_logs task. A batch leaves the list only once
+    its INSERT is done, so a flusher dying in between writes that batch
+    again on the next run instead of losing it.
+    """
+    key = 'exchange_rate_log:buffer'
+    dropped_key = 'exchange_rate_log:dropped'
+
+    def __init__(self, client, max_size, batch_size):
+        self.client = client
+        self.push_script = client.register_script(PUSH_SCRIPT)
+        self.max_size = max_size
+        self.batch_size = batch_size
+
+    def add(self, observation):
+        base_currency, target_currency, rate, fetched_at = observation
+        payload = json.dumps([base_currency, target_currency, str(rate), fetched_at.isoformat()])
+        return bool(self.push_script(keys=[self.key, self.dropped_key], args=[self.max_size, payload]))
+
+    async def aadd(self, observation):
+        return await sync_to_async(self.add)(observation)
+
+    def flush(self, deadline=None):
+        written = 0
+        while deadline is None or time.monotonic() < deadline:
+            rows = self.client.lrange(self.key, 0, self.batch_size - 1)
+            if not rows:
+                break
+            observations = []
+            for row in rows:
+                base_currency, target_currency, rate, fetched_at = json.loads(row)
+                observations.append((base_currency, target_currency, Decimal(rate), parse_datetime(fetched_at)))
+            write_observations(observations)
+            self.client.ltrim(self.key, len(rows), -1)
+            written += len(rows)
+            if len(rows) < self.batch_size:
+                break
+
+        dropped = self.client.getdel(self.dropped_key)
+        if dropped:
+            logger.warning(f"Rate log buffer full, dropped {int(dropped)} observations")
+        return written
+
+    def clear(self):
+        self.client.delete(self.key, self.dropped_key)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_rate_log_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = build_rate_log_buffer()
+    return _buffer
+
+
+def build_rate_log_buffer():
+    if not settings.EXCHANGE_RATE_LOG_BUFFER_REDIS_URL:
+        return LocalRateLogBuffer(
+            max_size=settings.EXCHANGE_RATE_LOG_BUFFER_SIZE,
+            batch_size=settings.EXCHANGE_RATE_LOG_FLUSH_BATCH_SIZE,
+            flush_interval=settings.EXCHANGE_RATE_LOG_FLUSH_INTERVAL,
+        )
+
+    import redis
+
+    return RedisRateLogBuffer(
+        redis.Redis.from_url(settings.EXCHANGE_RATE_LOG_BUFFER_REDIS_URL),
+        max_size=settings.EXCHANGE_RATE_LOG_BUFFER_SIZE,
+        batch_size=settings.EXCHANGE_RATE_LOG_FLUSH_BATCH_SIZE,
+    )
+
+
+def record_rate_observation(base_currency, target_currency, rate):
+    # no database write on the request path, the row shows up after the next flush
+    return get_rate_log_buffer().add((base_currency, target_currency, rate, timezone.now()))
+
+
+async def arecord_rate_observation(base_currency, target_currency, rate):
+    return await get_rate_log_buffer().aadd((base_currency, target_currency, rate, timezone.now()))
+
+
+def flush_rate_log_buffer(max_seconds=FLUSH_MAX_SECONDS):
+    """
+    Write the buffered observations, batch by batch, until the buffer is
+    empty or max_seconds is spent. One flusher at a time: returns None when
+    another one holds the lock, else the number of rows written.
+    """
+    token = uuid.uuid4().hex
+    if not cache.add(FLUSH_LOCK_KEY, token, max_seconds + 60):
+        return None
+    try:
+        return get_rate_log_buffer().flush(time.monotonic() + max_seconds)
+    finally:
+        if cache.get(FLUSH_LOCK_KEY) == token:
+            cache.delete(FLUSH_LOCK_KEY)
@@ -0,0 +1,303 @@
+import math
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.subscription.counters import rebuild_plan_counters
+from apps.subscription.models import ExchangeRateLog, Plan, Subscription, cross_rate
+
+# USD quotes the generated rate history moves around
+REFERENCE_RATES = {'USD': 1.0, 'BDT': 121.5, 'EUR': 0.92, 'GBP': 0.79}
+
+USER_COLUMNS = [
+    'id', 'password', 'username', 'email', 'first_name', 'last_name',
+    'is_superuser', 'is_staff', 'is_active', 'date_joined',
+]
+SUBSCRIPTION_COLUMNS = [
+    'user_id', 'plan_id', 'start_date', 'end_date', 'status', 'auto_renew', 'created_at', 'updated_at',
+]
+RATE_LOG_COLUMNS = ['base_currency', 'target_currency', 'rate', 'fetched_at']
+
+
+@contextmanager
+def historical_timestamps(model):
+    # created_at / updated_at as generated, not the time of the load
+    fields = [field for field in model._meta.fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def mysql_value(value):
+    # LOAD DATA text format: \N is NULL, datetimes as naive UTC like Django stores them
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if hasattr(value, 'astimezone'):
+        return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def load_data_infile(model, columns, rows):
+    # MySQL native bulk load, needs local_infile on the server and in the
+    # connection OPTIONS
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8') as data_file:
+        for row in rows:
+            data_file.write('\t'.join(mysql_value(value) for value in row) + '\n')
+    try:
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {quote(model._meta.db_table)} "
+                f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({', '.join(quote(column) for column in columns)})",
+                [data_file.name]
+            )
+    finally:
+        os.unlink(data_file.name)
+
+
+def write_rows(model, columns, rows, method, batch_size):
+    if method == 'load-data':
+        load_data_infile(model, columns, rows)
+        return
+    with historical_timestamps(model):
+        model.objects.bulk_create([model(**dict(zip(columns, row))) for row in rows], batch_size=batch_size)
+
+
+def generate_users(rng, first_id, count, options):
+    # sign-ups skew recent, like a growing product; all share one password
+    now, days, prefix = options['now'], options['days'], options['prefix']
+    for user_id in range(first_id, first_id + count):
+        joined = now - timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+        yield (
+            user_id, options['password'], f'{prefix}{user_id}', f'{prefix}{user_id}@example.com', '', '',
+            False, False, rng.random() > 0.02, joined,
+        )
+
+
+def generate_subscriptions(rng, users, count, options):
+    """
+    count subscriptions over the given (user_id, date_joined) pairs, a
+    random spread of them per user. Each one starts after the user joined;
+    running ones are mostly active, ended ones mostly expired, the rest
+    cancelled part way through. A user never has two active rows for the
+    same plan.
+    """
+    now, plans, weights = options['now'], options['plans'], options['plan_weights']
+    per_user = [0] * len(users)
+    for _ in range(count):
+        per_user[rng.randrange(len(users))] += 1
+
+    for (user_id, joined), subscriptions in zip(users, per_user):
+        active_plans = set()
+        starts = sorted(joined + (now - joined) * rng.random() for _ in range(subscriptions))
+        for start_date in reversed(starts):
+            plan_id, duration = rng.choices(plans, cum_weights=weights)[0]
+            end_date = start_date + timedelta(days=duration)
+            updated_at = start_date
+            if end_date > now and plan_id not in active_plans and rng.random() < 0.85:
+                status = 'active'
+                active_plans.add(plan_id)
+            elif end_date <= now and rng.random() < 0.75:
+                status, updated_at = 'expired', end_date
+            else:
+                status = 'cancelled'
+                updated_at = min(now, start_date + (end_date - start_date) * rng.random())
+            yield (user_id, plan_id, start_date, end_date, status, rng.random() < 0.35, start_date, updated_at)
+
+
+def generate_rate_logs(rng, first, count, options):
+    # evenly spaced fetches over the history, each pair drifting slowly
+    # around its reference rate with some noise
+    now, start, step, pairs = options['now'], options['rates_start'], options['rates_step'], options['pairs']
+    for index in range(first, first + count):
+        (base_currency, target_currency, reference), offset = pairs[index % len(pairs)], index // len(pairs)
+        fetched_at = start + step * offset
+        drift = 1 + 0.04 * math.sin(offset / 500) + 0.01 * math.sin(offset / 37)
+        rate = Decimal(reference * drift * (1 + rng.gauss(0, 0.002))).quantize(Decimal('0.000001'))
+        yield (base_currency, target_currency, rate, min(fetched_at, now))
+
+
+def run_chunk(chunk):
+    """
+    One unit of work, in this process or a pool worker: a range of users
+    with their subscriptions, or a range of rate log rows. Random numbers
+    come from the seed and the range, the data doesn't depend on how many
+    processes share the work. Returns (kind, users, subscriptions, rate logs).
+    """
+    kind, first, count, extra, options = chunk
+    rng = random.Random(f"{options['seed']}:{kind}:{first}")
+    method, batch_size = options['method'], options['batch_size']
+
+    if kind == 'users':
+        users = list(generate_users(rng, first, count, options))
+        subscriptions = list(generate_subscriptions(rng, [(row[0], row[-1]) for row in users], extra, options))
+        with transaction.atomic():
+            write_rows(User, USER_COLUMNS, users, method, batch_size)
+            write_rows(Subscription, SUBSCRIPTION_COLUMNS, subscriptions, method, batch_size)
+        return kind, len(users), len(subscriptions), 0
+
+    rows = list(generate_rate_logs(rng, first, count, options))
+    write_rows(ExchangeRateLog, RATE_LOG_COLUMNS, rows, method, batch_size)
+    return kind, 0, 0, len(rows)
+
+
+def run_pool_chunk(chunk):
+    # a fresh connection per process, the forked one belongs to the parent
+    connections['default'].close()
+    return run_chunk(chunk)
+
+
+class Command(BaseCommand):
+    help = "Generate users, subscriptions and exchange rate history in bulk for capacity testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=100000, help='Subscriptions to create')
+        parser.add_argument('--users', type=int, help='Users to create, default a quarter of --subscriptions')
+        parser.add_argument('--rate-logs', type=int, help='Exchange rate log rows, default a tenth of --subscriptions')
+        parser.add_argument('--days', type=int, default=730, help='History the dates are spread over')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Users (or rate log rows) per unit of work')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes writing in parallel')
+        parser.add_argument(
+            '--method', choices=['auto', 'bulk-create', 'load-data'], default='auto',
+            help='load-data uses MySQL LOAD DATA LOCAL INFILE, auto picks it on MySQL'
+        )
+        parser.add_argument('--prefix', default='load', help='Username prefix of the generated users')
+        parser.add_argument('--password', default='testpass123', help='Password of every generated user')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        subscriptions = options['subscriptions']
+        users = options['users'] if options['users'] is not None else max(1, subscriptions // 4)
+        rate_logs = options['rate_logs'] if options['rate_logs'] is not None else subscriptions // 10
+        if min(subscriptions, users, rate_logs) < 0 or options['chunk_size'] < 1 or options['processes'] < 1:
+            raise CommandError("Counts can't be negative, --chunk-size and --processes must be at least 1")
+        if subscriptions and not users:
+            raise CommandError("Subscriptions need at least one user")
+
+        method = options['method']
+        if method == 'auto':
+            method = 'load-data' if connection.vendor == 'mysql' else 'bulk-create'
+        if method == 'load-data' and connection.vendor != 'mysql':
+            raise CommandError("--method load-data needs a MySQL database")
+
+        plans = list(Plan.objects.order_by('price').values_list('id', 'duration_days', 'price'))
+        if not plans:
+            raise CommandError("No plans yet, run create_sample_data first")
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users named {options['prefix']}* exist already, pick another --prefix")
+
+        now = timezone.now()
+        # cheaper plans sell more
+        weights = []
+        for _, _, price in plans:
+            weights.append((weights[-1] if weights else 0) + 1 / float(price or 1))
+        pairs = [
+            (base_currency, target_currency, cross_rate(REFERENCE_RATES, base_currency, target_currency))
+            for base_currency, target_currency in settings.EXCHANGE_RATE_ROLLUP_PAIRS
+            if cross_rate(REFERENCE_RATES, base_currency, target_currency) is not None
+        ]
+        if rate_logs and not pairs:
+            raise CommandError("None of EXCHANGE_RATE_ROLLUP_PAIRS can be priced, nothing to log")
+
+        first_user_id = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        fetches = -(-rate_logs // len(pairs)) if pairs else 0
+        shared = {
+            'now': now,
+            'days': options['days'],
+            'prefix': options['prefix'],
+            # hashed once, a hash per user would take longer than the load
+            'password': make_password(options['password']),
+            'plans': [(plan_id, duration) for plan_id, duration, _ in plans],
+            'plan_weights': weights,
+            'pairs': pairs,
+            'rates_start': now - timedelta(days=options['days']),
+            'rates_step': timedelta(days=options['days']) / max(fetches, 1),
+            'method': method,
+            'batch_size': options['batch_size'],
+            'seed': options['seed'],
+        }
+
+        chunk_size = options['chunk_size']
+        chunks = []
+        for start in range(0, users, chunk_size):
+            count = min(chunk_size, users - start)
+            # exact total: each range gets its share of the subscriptions
+            share = subscriptions * (start + count) // users - subscriptions * start // users
+            chunks.append(('users', first_user_id + start, count, share, shared))
+        for start in range(0, rate_logs, chunk_size):
+            chunks.append(('rate_logs', start, min(chunk_size, rate_logs - start), 0, shared))
+
+        self.stdout.write(
+            f"Generating {users} users, {subscriptions} subscriptions and {rate_logs} exchange rate log rows "
+            f"({method}, {len(chunks)} chunks, {options['processes']} processes)..."
+        )
+
+        started = time.monotonic()
+        totals = {'users': 0, 'subscriptions': 0, 'rate_logs': 0}
+        reported = started
+        for _, users_done, subscriptions_done, rate_logs_done in self.run_chunks(chunks, options['processes']):
+            totals['users'] += users_done
+            totals['subscriptions'] += subscriptions_done
+            totals['rate_logs'] += rate_logs_done
+            if time.monotonic() - reported >= 2 or sum(totals.values()) == users + subscriptions + rate_logs:
+                reported = time.monotonic()
+                elapsed = reported - started
+                self.stdout.write(
+                    f"  users {totals['users']}/{users}, subscriptions {totals['subscriptions']}/{subscriptions}, "
+                    f"rate logs {totals['rate_logs']}/{rate_logs} "
+                    f"({sum(totals.values()) / elapsed if elapsed else 0:.0f} rows/s)"
+                )
+
+        # explicit user ids leave PostgreSQL's sequence behind ==>
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [User])
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+        # bulk writes send no signals, the counters are recounted once ==>
+        rebuild_plan_counters()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {sum(totals.values())} rows in {elapsed:.1f}s. "
+            f"Users log in as {options['prefix']}<id> / {options['password']}"
+        ))
+
+    def run_chunks(self, chunks, processes):
+        if processes == 1:
+            for chunk in chunks:
+                yield run_chunk(chunk)
+            return
+
+        if connection.vendor == 'sqlite':
+            # the processes queue on the one writer lock instead of failing on it
+            self.stdout.write(self.style.WARNING("SQLite has one writer lock, the processes will take turns"))
+            connection.settings_dict['OPTIONS'].update(timeout=600, transaction_mode='IMMEDIATE')
+        # forked children must not share the parent's connection
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            yield from pool.imap_unordered(run_pool_chunk, chunks)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from apps.subscription.counters import rebuild_plan_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-plan subscription counters from the subscriptions table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--plan',
+            type=int,
+            action='append',
+            dest='plans',
+            help='Only rebuild these plan ids (repeatable), default is every plan',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Rebuilding plan subscription counters...")
+
+        stats = rebuild_plan_counters(options['plans'])
+
+        for row in stats:
+            self.stdout.write(
+                f"Plan {row.plan_id}: {row.active_count} active, "
+                f"{row.cancelled_count} cancelled, {row.expired_count} expired"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {len(stats)} plans"))
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.subscription.rollups import rebuild_rate_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the exchange rate OHLC buckets from the stored rate snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild from the week containing this date (YYYY-MM-DD), default is all history',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = timezone.make_aware(datetime.strptime(options['since'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError(f"Invalid --since date: {options['since']}")
+
+        self.stdout.write("Rebuilding exchange rate rollups...")
+
+        rollups = rebuild_rate_rollups(since)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(rollups)} rate buckets"))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_plan_stats(apps, schema_editor):
+    Plan = apps.get_model('subscription', 'Plan')
+    Subscription = apps.get_model('subscription', 'Subscription')
+    PlanSubscriptionStats = apps.get_model('subscription', 'PlanSubscriptionStats')
+
+    stats = {plan_id: PlanSubscriptionStats(plan_id=plan_id) for plan_id in Plan.objects.values_list('id', flat=True)}
+    rows = Subscription.objects.order_by().values('plan_id', 'status').annotate(count=Count('id'))
+    for row in rows:
+        setattr(stats[row['plan_id']], f"{row['status']}_count", row['count'])
+
+    PlanSubscriptionStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0004_subscription_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanSubscriptionStats',
+            fields=[
+                ('plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='subscription.plan')),
+                ('active_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('expired_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Plan subscription stats',
+            },
+        ),
+        migrations.RunPython(backfill_plan_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0006_expiry_sweeper'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRateRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base_currency', models.CharField(max_length=3)),
+                ('target_currency', models.CharField(max_length=3)),
+                ('interval', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=6, max_digits=15)),
+                ('high', models.DecimalField(decimal_places=6, max_digits=15)),
+                ('low', models.DecimalField(decimal_places=6, max_digits=15)),
+                ('close', models.DecimalField(decimal_places=6, max_digits=15)),
+                ('samples', models.IntegerField(default=0)),
+                ('opened_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('base_currency', 'target_currency', 'interval', 'bucket_start'), name='unique_rate_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0007_exchangeraterollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exchangeratelog',
+            index=models.Index(fields=['fetched_at', 'id'], name='subscriptio_fetched_ff1989_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0008_exchangeratelog_retention_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exchangeratelog',
+            name='fetched_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
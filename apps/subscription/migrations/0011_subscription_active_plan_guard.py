@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0010_subscription_auto_renew'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='subscription',
+            name='unique_active_user_plan',
+        ),
+        migrations.AddField(
+            model_name='subscription',
+            name='active_plan_id',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(status='active', then=models.F('plan_id'))), output_field=models.BigIntegerField(null=True)),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'active_plan_id'), name='unique_active_user_plan'),
+        ),
+    ]
@@ -25,6 +25,65 @@ class Plan(models.Model):
     class Meta:
         ordering = ['price']
 
+class DaysUntil(models.Func):
+    """
+    Whole days from `now` until a datetime column, in SQL. For dates ahead
+    of now it matches Python's (end_date - now).days.
+    """
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, now):
+        super().__init__(expression, models.Value(now, output_field=models.DateTimeField()))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL: timestamptz - timestamptz is an interval of days and time
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(EXTRACT(DAY FROM (%(expressions)s)) AS integer)', arg_joiner=' - ',
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS integer)', arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        (end_sql, end_params), (now_sql, now_params) = (
+            compiler.compile(expression) for expression in self.get_source_expressions()
+        )
+        return f"TIMESTAMPDIFF(DAY, {now_sql}, {end_sql})", (*now_params, *end_params)
+
+class SubscriptionQuerySet(models.QuerySet):
+
+    def with_effective_status(self, now=None):
+        # status as of now, computed in SQL: an active row past its end_date
+        # reads as expired before the expiry sweeper gets to it
+        now = now or timezone.now()
+        return self.annotate(
+            effective_status=models.Case(
+                models.When(status='active', end_date__lt=now, then=models.Value('expired')),
+                default=models.F('status'),
+                output_field=models.CharField(),
+            ),
+            days_remaining=models.Case(
+                models.When(status='active', end_date__gte=now, then=DaysUntil('end_date', now)),
+                default=models.Value(0),
+                output_field=models.IntegerField(),
+            ),
+        )
+
+    def effective(self, status, now=None):
+        # filter on the status as of now, same conditions as with_effective_status
+        now = now or timezone.now()
+        if status == 'active':
+            return self.filter(status='active', end_date__gte=now)
+        if status == 'expired':
+            return self.filter(models.Q(status='expired') | models.Q(status='active', end_date__lt=now))
+        return self.filter(status=status)
+
 class Subscription(models.Model):
     STATUS_CHOICES = [
         ('active', 'Active'),
@@ -37,9 +96,28 @@ class Subscription(models.Model):
     start_date = models.DateTimeField(default=timezone.now)
     end_date = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    # renewed by apps.subscription.renewals when its end_date comes into the renewal window
+    auto_renew = models.BooleanField(default=False)
+    # plan_id while the row is active, NULL otherwise: the unique
+    # (user, active_plan_id) index allows one active row per user and plan on
+    # every backend, MySQL has no partial indexes for a conditional constraint
+    active_plan_id = models.GeneratedField(
+        expression=models.Case(models.When(status='active', then=models.F('plan_id'))),
+        output_field=models.BigIntegerField(null=True),
+        db_persist=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SubscriptionQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # (plan, status) as loaded, lets the counter signals see changes on save()
+        instance._loaded_state = (instance.__dict__.get('plan_id'), instance.__dict__.get('status'))
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.end_date:
             self.end_date = self.start_date + timedelta(days=self.plan.duration_days)
@@ -48,24 +126,85 @@ class Subscription(models.Model):
     def is_expired(self):
         return timezone.now() > self.end_date
 
+    def get_effective_status(self):
+        # annotated by with_effective_status, or worked out here
+        if 'effective_status' in self.__dict__:
+            return self.__dict__['effective_status']
+        if self.status == 'active' and self.end_date < timezone.now():
+            return 'expired'
+        return self.status
+
+    def get_days_remaining(self):
+        if 'days_remaining' in self.__dict__:
+            return self.__dict__['days_remaining']
+        if self.get_effective_status() != 'active':
+            return 0
+        return max(0, (self.end_date - timezone.now()).days)
+
     def __str__(self):
         return f"{self.user.username} - {self.plan.name} ({self.status})"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # user listing: keyset pagination and its status / plan filters
+            models.Index(fields=['user', '-created_at', '-id']),
+            models.Index(fields=['user', 'status', '-created_at']),
+            models.Index(fields=['user', 'plan', '-created_at']),
+            # dashboard listing
+            models.Index(fields=['-created_at', '-id']),
+            # expiry sweeper: active rows past their end_date, in end_date order
+            models.Index(fields=['status', 'end_date']),
+            # renewals: due rows walked per user id range
+            models.Index(fields=['status', 'auto_renew', 'user', 'end_date']),
+        ]
         constraints = [
             models.UniqueConstraint(
-                fields=['user', 'plan'],
-                condition=models.Q(status='active'),
+                fields=['user', 'active_plan_id'],
                 name='unique_active_user_plan'
             )
         ]
 
+class PlanSubscriptionStats(models.Model):
+    # denormalized per-plan counters, kept in sync by apps.subscription.counters
+    plan = models.OneToOneField(Plan, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    active_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    expired_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def total_count(self):
+        return self.active_count + self.cancelled_count + self.expired_count
+
+    def __str__(self):
+        return f"{self.plan.name}: {self.active_count} active, {self.cancelled_count} cancelled, {self.expired_count} expired"
+
+    class Meta:
+        verbose_name_plural = "Plan subscription stats"
+
+class SweepWatermark(models.Model):
+    # progress of a batched background sweep, so an interrupted run resumes
+    # after the last committed batch instead of starting over
+    name = models.CharField(max_length=100, primary_key=True)
+    last_end_date = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def reset(self):
+        self.last_end_date = None
+        self.last_id = 0
+        self.save()
+
+    def __str__(self):
+        return f"{self.name}: ({self.last_end_date}, {self.last_id})"
+
 class ExchangeRateLog(models.Model):
     base_currency = models.CharField(max_length=3)
     target_currency = models.CharField(max_length=3)
     rate = models.DecimalField(max_digits=15, decimal_places=6)
-    fetched_at = models.DateTimeField(auto_now_add=True)
+    # a default rather than auto_now_add: buffered rows keep the time they were observed
+    fetched_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.base_currency}/{self.target_currency}: {self.rate} at {self.fetched_at}"
@@ -74,4 +213,66 @@ class ExchangeRateLog(models.Model):
         ordering = ['-fetched_at']
         indexes = [
             models.Index(fields=['base_currency', 'target_currency', '-fetched_at']),
+            # retention: oldest rows first, across pairs
+            models.Index(fields=['fetched_at', 'id']),
+        ]
+
+class ExchangeRateSnapshot(models.Model):
+    # full provider rate table for one base currency, one row per fetch
+    base_currency = models.CharField(max_length=3)
+    rates = models.JSONField()
+    fetched_at = models.DateTimeField(auto_now_add=True)
+
+    def get_rate(self, base_currency, target_currency):
+        return cross_rate(self.rates, base_currency, target_currency)
+
+    def __str__(self):
+        return f"{self.base_currency} ({len(self.rates)} rates) at {self.fetched_at}"
+
+    class Meta:
+        ordering = ['-fetched_at']
+        indexes = [
+            models.Index(fields=['base_currency', '-fetched_at']),
+        ]
+
+class ExchangeRateRollup(models.Model):
+    # OHLC bucket of the rates seen for a pair, maintained by apps.subscription.rollups
+    INTERVAL_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+        ('week', 'Week'),
+    ]
+
+    base_currency = models.CharField(max_length=3)
+    target_currency = models.CharField(max_length=3)
+    interval = models.CharField(max_length=4, choices=INTERVAL_CHOICES)
+    bucket_start = models.DateTimeField()
+    open = models.DecimalField(max_digits=15, decimal_places=6)
+    high = models.DecimalField(max_digits=15, decimal_places=6)
+    low = models.DecimalField(max_digits=15, decimal_places=6)
+    close = models.DecimalField(max_digits=15, decimal_places=6)
+    samples = models.IntegerField(default=0)
+    opened_at = models.DateTimeField()
+    closed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.base_currency}/{self.target_currency} {self.interval} {self.bucket_start}: {self.open}-{self.close}"
+
+    class Meta:
+        ordering = ['bucket_start']
+        constraints = [
+            # also the index behind the history range scans
+            models.UniqueConstraint(
+                fields=['base_currency', 'target_currency', 'interval', 'bucket_start'],
+                name='unique_rate_rollup_bucket'
+            ),
         ]
+
+
+def cross_rate(rates, base_currency, target_currency):
+    # rates are quoted against the snapshot base: base->target = rates[target] / rates[base]
+    base_rate = rates.get(base_currency)
+    target_rate = rates.get(target_currency)
+    if not base_rate or target_rate is None:
+        return None
+    return target_rate / base_rate
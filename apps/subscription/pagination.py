@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    # keyset pagination, backed by the (user, -created_at, -id) index so
+    # every page costs the same no matter how deep the client goes
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_keyset_cursor(subscription):
+    # "<created_at in microseconds since the epoch>_<id>", exact and URL safe
+    return f"{(subscription.created_at - EPOCH) // timedelta(microseconds=1)}_{subscription.id}"
+
+
+def decode_keyset_cursor(cursor):
+    try:
+        microseconds, pk = (int(part) for part in cursor.split('_'))
+        return EPOCH + timedelta(microseconds=microseconds), pk
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+class KeysetPage:
+    """
+    One page of the (-created_at, -id) listing for the server-rendered
+    pages, read like SubscriptionCursorPagination reads the API: `after`
+    continues past a row, `before` goes back from one, and every page is a
+    single range read over the (-created_at, -id) index however deep it is.
+    There are no page numbers and no last page. A cursor that can't be
+    decoded gives the first page.
+    """
+
+    def __init__(self, queryset, per_page, after=None, before=None):
+        self.per_page = per_page
+        after, before = decode_keyset_cursor(after), decode_keyset_cursor(before)
+
+        if before is not None:
+            created_at, pk = before
+            rows = list(
+                queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+                .order_by('created_at', 'id')[:per_page + 1]
+            )
+            self.has_previous = len(rows) > per_page
+            self.has_next = True
+            self.object_list = rows[:per_page][::-1]
+        else:
+            if after is not None:
+                created_at, pk = after
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            rows = list(queryset.order_by('-created_at', '-id')[:per_page + 1])
+            self.has_previous = after is not None
+            self.has_next = len(rows) > per_page
+            self.object_list = rows[:per_page]
+
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    @property
+    def next_cursor(self):
+        return encode_keyset_cursor(self.object_list[-1]) if self.has_next and self.object_list else None
+
+    @property
+    def previous_cursor(self):
+        return encode_keyset_cursor(self.object_list[0]) if self.has_previous and self.object_list else None
+
+
+def estimate_table_rows(model):
+    # planner statistics instead of COUNT(*), None where the backend has none
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator for tables too big to COUNT(*) on every changelist.
+    Below ADMIN_LARGE_TABLE_THRESHOLD rows the count is exact. Past it the
+    unfiltered list shows the estimated table size and filtered lists count
+    at most ADMIN_COUNT_LIMIT rows, a bounded index range scan. A capped
+    count is shown as "10,000+" and does not bound the pages: a page past
+    the cap is served as long as it has rows.
+    """
+    capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        estimate = estimate_table_rows(queryset.model)
+
+        if estimate is not None and estimate < settings.ADMIN_LARGE_TABLE_THRESHOLD:
+            return queryset.count()
+        if estimate is not None and not queryset.query.where:
+            return estimate
+
+        count = queryset.order_by()[:settings.ADMIN_COUNT_LIMIT].count()
+        self.capped = count >= settings.ADMIN_COUNT_LIMIT
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.capped):
+            return super().validate_number(number)
+
+        # past the cap only the lower bound is known, page() finds the end
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if not (self.count and self.capped):
+            return super().page(number)
+
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        # one row more than the page tells whether another page follows
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+
+        last_page = number + 1 if len(object_list) > self.per_page else number
+        self.num_pages = max(self.num_pages, last_page)
+        return self._get_page(object_list[:self.per_page], number, self)
+
+    @property
+    def count_display(self):
+        return f"{self.count:,}+" if self.capped else f"{self.count:,}"
@@ -0,0 +1,151 @@
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .catalog import get_plan_catalog
+from .counters import adjust_plan_counters, transition_status_by_id
+from .models import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+def get_active_pairs(pairs):
+    """
+    (user_id, plan_id) pairs out of the given ones that already have an
+    active subscription, one query for the whole set: the IN lists select a
+    superset on the unique (user, active_plan_id) index, the exact pairs are
+    picked out here. Active rows already past their end_date are expired
+    on the way and don't count.
+    """
+    if not pairs:
+        return set()
+    pairs = set(pairs)
+    user_ids = {user_id for user_id, _ in pairs}
+    plan_ids = {plan_id for _, plan_id in pairs}
+    rows = Subscription.objects.filter(
+        user_id__in=user_ids, active_plan_id__in=plan_ids
+    ).order_by().values_list('id', 'user_id', 'plan_id', 'end_date')
+
+    # rows past their end_date are expired here and now, the slot is free
+    # again without waiting for the expiry sweeper
+    now = timezone.now()
+    active, lapsed = set(), []
+    for subscription_id, user_id, plan_id, end_date in rows:
+        if (user_id, plan_id) not in pairs:
+            continue
+        if end_date < now:
+            lapsed.append(subscription_id)
+        else:
+            active.add((user_id, plan_id))
+    if lapsed:
+        transition_status_by_id(Subscription.objects.filter(id__in=lapsed), 'active', 'expired')
+    return active
+
+
+def bulk_subscribe(items, batch_size=None):
+    """
+    Create active subscriptions for a list of {'user_id', 'plan_id'} items,
+    with an optional 'auto_renew' flag.
+    Validation is set based (plans from the catalog, one query for the
+    users, one for the active pairs), the rows go in with bulk_create in
+    batches of batch_size and the plan counters are moved once per plan.
+    Returns one result per item, in order: status 'created' with the
+    subscription_id, or 'failed' with an error.
+    """
+    batch_size = batch_size or settings.SUBSCRIPTION_BULK_BATCH_SIZE
+    catalog = get_plan_catalog()
+
+    results = [
+        {'index': index, 'user_id': item['user_id'], 'plan_id': item['plan_id'], 'status': 'failed'}
+        for index, item in enumerate(items)
+    ]
+    auto_renew = [item.get('auto_renew', False) for item in items]
+
+    user_ids = {result['user_id'] for result in results}
+    valid_users = set(User.objects.filter(id__in=user_ids, is_active=True).values_list('id', flat=True))
+
+    seen = set()
+    pending = []
+    for result in results:
+        pair = (result['user_id'], result['plan_id'])
+        if result['user_id'] not in valid_users:
+            result['error'] = "User not found."
+        elif catalog.get(result['plan_id']) is None:
+            result['error'] = "Plan not found."
+        elif pair in seen:
+            result['error'] = "Duplicate user and plan in this request."
+        else:
+            seen.add(pair)
+            pending.append(result)
+
+    # a concurrent subscribe can take a pair between the check and the insert,
+    # the whole insert is rolled back then and the check runs once more ==>
+    for attempt in range(2):
+        active = get_active_pairs([(result['user_id'], result['plan_id']) for result in pending])
+        to_create = []
+        for result in pending:
+            if (result['user_id'], result['plan_id']) in active:
+                result['error'] = "User already has an active subscription for this plan."
+            else:
+                to_create.append(result)
+        try:
+            subscriptions = create_subscriptions(
+                [dict(result, auto_renew=auto_renew[result['index']]) for result in to_create], catalog, batch_size
+            )
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+            logger.info("Bulk subscribe raced a concurrent subscribe, checking the active pairs again")
+
+    for result, subscription in zip(to_create, subscriptions):
+        result['status'] = 'created'
+        result['subscription_id'] = subscription.id
+        result.pop('error', None)
+
+    return results
+
+
+@transaction.atomic
+def create_subscriptions(items, catalog, batch_size):
+    if not items:
+        return []
+
+    now = timezone.now()
+    subscriptions = Subscription.objects.bulk_create([
+        Subscription(
+            user_id=item['user_id'],
+            plan_id=item['plan_id'],
+            start_date=now,
+            # bulk_create skips Subscription.save(), end_date is set here
+            end_date=now + timedelta(days=catalog.get(item['plan_id']).duration_days),
+            status='active',
+            auto_renew=item.get('auto_renew', False),
+        )
+        for item in items
+    ], batch_size=batch_size)
+
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL doesn't return the new ids, they are looked up by pair
+        ids = {
+            (user_id, plan_id): pk
+            for user_id, plan_id, pk in Subscription.objects.filter(
+                status='active',
+                user_id__in={item['user_id'] for item in items},
+                plan_id__in={item['plan_id'] for item in items},
+                start_date=now,
+            ).values_list('user_id', 'plan_id', 'id')
+        }
+        for subscription in subscriptions:
+            subscription.id = ids.get((subscription.user_id, subscription.plan_id))
+
+    # bulk_create sends no post_save, the counters move once per plan ==>
+    for plan_id, count in Counter(item['plan_id'] for item in items).items():
+        adjust_plan_counters(plan_id, active=count)
+
+    return subscriptions
@@ -0,0 +1,245 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_API_URL = "https://open.er-api.com/v6/latest/{base}"
+
+
+class RateProviderError(Exception):
+    pass
+
+
+class CircuitOpenError(RateProviderError):
+    pass
+
+
+class RateProviderRejectedError(RateProviderError):
+    """The provider answered with an error result, e.g. an unsupported base."""
+
+
+class CircuitBreaker:
+    """
+    Per-process breaker: after `failure_threshold` consecutive failures the
+    provider is not called for `reset_timeout` seconds, then a single trial
+    call decides whether it closes again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # let exactly one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RateProviderClient:
+    """
+    Keep-alive HTTP client for the rate provider. Connections are pooled by a
+    shared requests.Session, failed calls are retried with full-jitter
+    exponential backoff and every exhausted call counts against the breaker.
+    An error result reported by the provider is neither retried nor counted.
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, timeout=(2, 4), max_retries=2,
+                 backoff=0.25, pool_size=10, breaker=None):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_rates(self, base_currency):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Rate provider circuit is open")
+
+        try:
+            rates = self._get_rates(base_currency)
+        except RateProviderRejectedError:
+            # the provider is up and answering, this is not a failure
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            # any way out but a success counts, a trial call must never
+            # leave the breaker half open
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return rates
+
+    def _get_rates(self, base_currency):
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            try:
+                return self._request(base_currency)
+            except RateProviderRejectedError:
+                # the same request gets the same answer
+                raise
+            except requests.HTTPError as e:
+                last_error = e
+                # client errors won't get better by retrying (except throttling)
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code and status_code < 500 and status_code != 429:
+                    break
+            except (requests.RequestException, RateProviderError, ValueError) as e:
+                last_error = e
+
+        raise RateProviderError(f"Rate provider request failed: {last_error}")
+
+    def _request(self, base_currency):
+        response = self.session.get(self.api_url.format(base=base_currency), timeout=self.timeout)
+        response.raise_for_status()
+        return parse_rates(response.json())
+
+
+class AsyncRateProviderClient:
+    """
+    asyncio counterpart of RateProviderClient for the async views, backed by
+    a pooled httpx.AsyncClient per event loop. Shares the breaker with the
+    sync client so both see the same provider health.
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, timeout=(2, 4), max_retries=2,
+                 backoff=0.25, pool_size=10, breaker=None):
+        self.api_url = api_url
+        self.timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        session = self._clients.get(loop)
+        if session is None:
+            session = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._clients[loop] = session
+        return session
+
+    async def get_rates(self, base_currency):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Rate provider circuit is open")
+
+        try:
+            rates = await self._get_rates(base_currency)
+        except RateProviderRejectedError:
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            # cancellation included, see RateProviderClient.get_rates
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return rates
+
+    async def _get_rates(self, base_currency):
+        session = self._get_session()
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            try:
+                response = await session.get(self.api_url.format(base=base_currency))
+                response.raise_for_status()
+                return parse_rates(response.json())
+            except RateProviderRejectedError:
+                raise
+            except httpx.HTTPStatusError as e:
+                last_error = e
+                status_code = e.response.status_code
+                if status_code < 500 and status_code != 429:
+                    break
+            except (httpx.HTTPError, RateProviderError, ValueError) as e:
+                last_error = e
+
+        raise RateProviderError(f"Rate provider request failed: {last_error}")
+
+
+def parse_rates(data):
+    # anything but the documented shape is a provider error, not a crash
+    if not isinstance(data, dict):
+        raise RateProviderError(f"Unexpected API response: {data!r:.200}")
+    if data.get("result") != "success":
+        raise RateProviderRejectedError(f"API returned error: {data!r:.200}")
+
+    rates = data.get("rates")
+    if not rates:
+        raise RateProviderError("Rates not found in API response.")
+    if not isinstance(rates, dict):
+        raise RateProviderError(f"Unexpected rates in API response: {rates!r:.200}")
+    return rates
+
+
+_clients = {}
+_client_lock = threading.Lock()
+
+
+def _build_client(client_class):
+    # one client (pool + breaker) per process, configured from settings
+    from django.conf import settings
+
+    with _client_lock:
+        if 'breaker' not in _clients:
+            _clients['breaker'] = CircuitBreaker(
+                failure_threshold=settings.EXCHANGE_RATE_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.EXCHANGE_RATE_BREAKER_RESET_TIMEOUT,
+            )
+        if client_class not in _clients:
+            _clients[client_class] = client_class(
+                api_url=settings.EXCHANGE_RATE_API_URL,
+                timeout=(settings.EXCHANGE_RATE_CONNECT_TIMEOUT, settings.EXCHANGE_RATE_READ_TIMEOUT),
+                max_retries=settings.EXCHANGE_RATE_MAX_RETRIES,
+                backoff=settings.EXCHANGE_RATE_RETRY_BACKOFF,
+                pool_size=settings.EXCHANGE_RATE_POOL_SIZE,
+                breaker=_clients['breaker'],
+            )
+        return _clients[client_class]
+
+
+def get_rate_provider_client():
+    return _clients.get(RateProviderClient) or _build_client(RateProviderClient)
+
+
+def get_async_rate_provider_client():
+    return _clients.get(AsyncRateProviderClient) or _build_client(AsyncRateProviderClient)
@@ -0,0 +1,168 @@
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .catalog import get_plan_catalog
+from .counters import adjust_plan_counters
+from .models import Plan, Subscription
+
+logger = logging.getLogger(__name__)
+
+
+def renewal_window(now=None):
+    # due: ending before the next nightly run, or lapsed within the grace
+    # period and not swept yet
+    now = now or timezone.now()
+    return (
+        now - timedelta(hours=settings.SUBSCRIPTION_RENEWAL_GRACE_HOURS),
+        now + timedelta(hours=settings.SUBSCRIPTION_RENEWAL_LEAD_HOURS),
+    )
+
+
+def due_renewals(since, until):
+    # over the (status, auto_renew, user, end_date) index
+    return Subscription.objects.filter(
+        status='active', auto_renew=True, end_date__gte=since, end_date__lt=until
+    )
+
+
+def renewal_partitions(since, until, partitions=None):
+    """
+    Split the subscriptions due in [since, until) into at most `partitions`
+    user id ranges of equal width, one aggregate query. max_id bounds every
+    partition to the rows that exist now, successors inserted by the run
+    are never picked up again. Returns (due count, max_id, [(user_from,
+    user_to), ...]) with user_to exclusive.
+    """
+    partitions = partitions or settings.SUBSCRIPTION_RENEWAL_PARTITIONS
+    stats = due_renewals(since, until).aggregate(
+        due=Count('id'), first_user=Min('user_id'), last_user=Max('user_id'), max_id=Max('id')
+    )
+    if not stats['due']:
+        return 0, 0, []
+
+    first, last = stats['first_user'], stats['last_user'] + 1
+    width = -(-(last - first) // partitions)
+    ranges = [(start, min(start + width, last)) for start in range(first, last, width)]
+    return stats['due'], stats['max_id'], ranges
+
+
+def plan_durations(plan_ids, catalog):
+    # durations come from this process's catalog copy; plans created since
+    # that copy was loaded are read from the table
+    durations = {}
+    for plan_id in plan_ids:
+        plan = catalog.get(plan_id)
+        if plan is not None:
+            durations[plan_id] = plan.duration_days
+
+    missing = set(plan_ids) - durations.keys()
+    if missing:
+        durations.update(Plan.objects.filter(id__in=missing).values_list('id', 'duration_days'))
+    return durations
+
+
+def renew_batch(since, until, user_from, user_to, max_id, cursor, batch_size, catalog):
+    """
+    Renew the next batch_size due subscriptions of one user id range, from
+    user id `cursor` on: the predecessors are expired with one UPDATE and
+    their successors, starting where they end, go in with one bulk_create,
+    in the same transaction. Returns (rows renewed, next cursor); a batch
+    with nothing left returns (0, None).
+    """
+    ids = list(
+        due_renewals(since, until)
+        .filter(user_id__gte=cursor, user_id__lt=user_to, id__lte=max_id)
+        .order_by('user_id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0, None
+
+    now = timezone.now()
+    with transaction.atomic():
+        # status / window are checked again, rows may have changed since the read
+        rows = list(
+            due_renewals(since, until).filter(id__in=ids)
+            .select_for_update()
+            .order_by()
+            .values_list('id', 'user_id', 'plan_id', 'end_date')
+        )
+        if not rows:
+            return 0, cursor
+
+        updated = Subscription.objects.filter(id__in=[row[0] for row in rows], status='active').update(
+            status='expired', updated_at=now
+        )
+        if updated != len(rows):
+            # no row locks on SQLite, a concurrent write got in between:
+            # nothing from this batch is kept, the next pass reads it again
+            transaction.set_rollback(True)
+            return 0, cursor
+
+        # bulk_create skips Subscription.save(), end_date is set here
+        durations = plan_durations({row[2] for row in rows}, catalog)
+        Subscription.objects.bulk_create([
+            Subscription(
+                user_id=user_id,
+                plan_id=plan_id,
+                start_date=end_date,
+                end_date=end_date + timedelta(days=durations[plan_id]),
+                status='active',
+                auto_renew=True,
+            )
+            for _, user_id, plan_id, end_date in rows
+        ])
+
+        # active counts don't change, one expired row per renewal ==>
+        for plan_id, count in Counter(row[2] for row in rows).items():
+            adjust_plan_counters(plan_id, expired=count)
+
+    return len(rows), max(row[1] for row in rows)
+
+
+def renew_partition(since, until, user_from, user_to, max_id, batch_size=None, max_seconds=None):
+    """
+    Renew the subscriptions due in [since, until) for users in
+    [user_from, user_to), batch by batch, each batch its own transaction,
+    until none are left or max_seconds is spent. A renewed row is no longer
+    due, so a run that stops early is finished by the next one.
+    """
+    batch_size = batch_size or settings.SUBSCRIPTION_RENEWAL_BATCH_SIZE
+    max_seconds = max_seconds or settings.SUBSCRIPTION_RENEWAL_MAX_SECONDS
+    catalog = get_plan_catalog()
+
+    started = time.monotonic()
+    cursor = user_from
+    batches = renewed_total = 0
+    drained = False
+
+    while time.monotonic() - started < max_seconds:
+        renewed, cursor = renew_batch(since, until, user_from, user_to, max_id, cursor, batch_size, catalog)
+        if cursor is None:
+            drained = True
+            break
+        if renewed:
+            batches += 1
+            renewed_total += renewed
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Renewal partition users [{user_from}, {user_to}): {renewed_total} renewed in {batches} batches, "
+        f"{elapsed:.3f}s"
+    )
+    return {
+        'user_from': user_from,
+        'user_to': user_to,
+        'renewed_count': renewed_total,
+        'batches': batches,
+        'drained': drained,
+        'elapsed': round(elapsed, 3),
+        'rows_per_second': round(renewed_total / elapsed) if elapsed else renewed_total,
+    }
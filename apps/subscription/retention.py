@@ -0,0 +1,112 @@
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExchangeRateLog
+from .rollups import fold_samples
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_LOCK_KEY = 'exchange_rate_log_compaction:lock'
+
+
+def compaction_candidates(cutoff):
+    # oldest first over the (fetched_at, id) index
+    return ExchangeRateLog.objects.filter(fetched_at__lt=cutoff).order_by('fetched_at', 'id')
+
+
+def compact_batch(cutoff, batch_size):
+    """
+    Fold the oldest batch_size log rows before cutoff into the rate rollups
+    and delete them by primary key. Rows of the configured pairs are only
+    deleted: their buckets are filled from the snapshots, which quote the
+    same fetches, and rebuild_rate_rollups recomputes them from there.
+    Folding and deleting commit together, so an interrupted run never
+    counts a row twice; the transaction only locks those rows and their
+    buckets. Returns the rows compacted.
+    """
+    rows = list(compaction_candidates(cutoff).values_list(
+        'id', 'base_currency', 'target_currency', 'rate', 'fetched_at'
+    )[:batch_size])
+    if not rows:
+        return []
+
+    configured = set(settings.EXCHANGE_RATE_ROLLUP_PAIRS)
+    with transaction.atomic():
+        fold_samples([row[1:] for row in rows if (row[1], row[2]) not in configured])
+        ExchangeRateLog.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+    return rows
+
+
+def compact_exchange_rate_logs(retention_days=None, batch_size=None, max_seconds=None, progress=None):
+    """
+    Apply the log retention: rows older than retention_days are compacted
+    into the hour / day / week rate rollups and removed, in short batches
+    until none are left or max_seconds is spent. Nothing to resume, the next
+    run starts from the oldest row still there. progress, if given, is
+    called with the running totals after every batch.
+    """
+    retention_days = retention_days or settings.EXCHANGE_RATE_LOG_RETENTION_DAYS
+    batch_size = batch_size or settings.EXCHANGE_RATE_LOG_COMPACT_BATCH_SIZE
+    max_seconds = max_seconds or settings.EXCHANGE_RATE_LOG_COMPACT_MAX_SECONDS
+
+    token = uuid.uuid4().hex
+    if not cache.add(COMPACTION_LOCK_KEY, token, max_seconds + 60):
+        logger.info("Exchange rate log compaction already running, skipping")
+        return {'skipped': True, 'compacted_count': 0, 'batches': 0}
+
+    try:
+        cutoff = timezone.now() - timedelta(days=retention_days)
+        # an index range count, for progress only
+        total = compaction_candidates(cutoff).count()
+        logger.info(f"Compacting {total} exchange rate log rows fetched before {cutoff.isoformat()}")
+
+        started = time.monotonic()
+        batches = compacted = 0
+        drained = False
+
+        while time.monotonic() - started < max_seconds:
+            batch_started = time.monotonic()
+            rows = compact_batch(cutoff, batch_size)
+            if rows:
+                batches += 1
+                compacted += len(rows)
+                elapsed = time.monotonic() - batch_started
+                logger.info(
+                    f"Compaction batch {batches}: {len(rows)} rows in {elapsed:.3f}s, "
+                    f"{compacted}/{total}, up to {rows[-1][4].isoformat()}"
+                )
+                if progress is not None:
+                    progress({
+                        'compacted_count': compacted,
+                        'total': total,
+                        'batches': batches,
+                        'compacted_until': rows[-1][4].isoformat(),
+                    })
+            if len(rows) < batch_size:
+                drained = True
+                break
+            if settings.EXCHANGE_RATE_LOG_COMPACT_PAUSE:
+                time.sleep(settings.EXCHANGE_RATE_LOG_COMPACT_PAUSE)
+
+        elapsed = time.monotonic() - started
+        return {
+            'skipped': False,
+            'compacted_count': compacted,
+            'total': total,
+            'batches': batches,
+            'drained': drained,
+            'cutoff': cutoff.isoformat(),
+            'elapsed': round(elapsed, 3),
+            'rows_per_second': round(compacted / elapsed) if elapsed else compacted,
+        }
+    finally:
+        if cache.get(COMPACTION_LOCK_KEY) == token:
+            cache.delete(COMPACTION_LOCK_KEY)
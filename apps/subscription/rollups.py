@@ -0,0 +1,192 @@
+import logging
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+
+from .models import ExchangeRateRollup, ExchangeRateSnapshot, cross_rate
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+}
+
+RATE_PLACES = Decimal('0.000001')
+
+ROLLUP_FIELDS = ['open', 'high', 'low', 'close', 'samples', 'opened_at', 'closed_at']
+
+
+def bucket_start(moment, interval):
+    # buckets are aligned in UTC, weeks start on Monday
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if interval == 'hour':
+        return moment
+    moment = moment.replace(hour=0)
+    if interval == 'week':
+        moment -= timedelta(days=moment.weekday())
+    return moment
+
+
+def snapshot_pair_rates(snapshot):
+    # the configured pairs this snapshot quotes, at the precision they are stored with
+    rates = {}
+    for base_currency, target_currency in settings.EXCHANGE_RATE_ROLLUP_PAIRS:
+        rate = cross_rate(snapshot.rates, base_currency, target_currency)
+        if rate is not None:
+            rates[(base_currency, target_currency)] = Decimal(str(rate)).quantize(RATE_PLACES)
+    return rates
+
+
+def merge_sample(rollup, rate, fetched_at):
+    # open / close follow fetched_at, not arrival order: a late task or a
+    # backfill can fold in an older sample
+    if not rollup.samples:
+        rollup.open = rollup.high = rollup.low = rollup.close = rate
+        rollup.opened_at = rollup.closed_at = fetched_at
+    else:
+        if fetched_at < rollup.opened_at:
+            rollup.open, rollup.opened_at = rate, fetched_at
+        if fetched_at >= rollup.closed_at:
+            rollup.close, rollup.closed_at = rate, fetched_at
+        rollup.high = max(rollup.high, rate)
+        rollup.low = min(rollup.low, rate)
+    rollup.samples += 1
+    return rollup
+
+
+def fold_samples(samples):
+    """
+    Fold rate samples, (base, target, rate, fetched_at) tuples, into their
+    hour, day and week buckets. Missing buckets are inserted first
+    (conflicts ignored), then every bucket is locked, merged and written
+    back, so two writers at once can't lose a sample. An insert, a select
+    and an update for any number of samples, the insert and update
+    batched by the backend's parameter limit.
+    """
+    if not samples:
+        return []
+
+    buckets = {}
+    for base_currency, target_currency, rate, fetched_at in samples:
+        for interval in INTERVALS:
+            key = (base_currency, target_currency, interval, bucket_start(fetched_at, interval))
+            buckets.setdefault(key, []).append((rate, fetched_at))
+
+    # one IN list per pair and interval: the condition stays a few terms
+    # deep however many buckets a batch spans (SQLite caps expression depth)
+    starts = {}
+    for base_currency, target_currency, interval, start in buckets:
+        starts.setdefault((base_currency, target_currency, interval), []).append(start)
+
+    condition = Q()
+    for (base_currency, target_currency, interval), bucket_starts in starts.items():
+        condition |= Q(
+            base_currency=base_currency, target_currency=target_currency, interval=interval,
+            bucket_start__in=bucket_starts,
+        )
+
+    with transaction.atomic():
+        ExchangeRateRollup.objects.bulk_create([
+            ExchangeRateRollup(
+                base_currency=base_currency,
+                target_currency=target_currency,
+                interval=interval,
+                bucket_start=start,
+                open=bucket_samples[0][0],
+                high=bucket_samples[0][0],
+                low=bucket_samples[0][0],
+                close=bucket_samples[0][0],
+                samples=0,
+                opened_at=bucket_samples[0][1],
+                closed_at=bucket_samples[0][1],
+            )
+            for (base_currency, target_currency, interval, start), bucket_samples in buckets.items()
+        ], ignore_conflicts=True)
+
+        rollups = list(ExchangeRateRollup.objects.select_for_update().filter(condition))
+        for rollup in rollups:
+            key = (rollup.base_currency, rollup.target_currency, rollup.interval, rollup.bucket_start)
+            for rate, fetched_at in buckets[key]:
+                merge_sample(rollup, rate, fetched_at)
+        ExchangeRateRollup.objects.bulk_update(rollups, ROLLUP_FIELDS)
+
+    return rollups
+
+
+def record_rates(rates, fetched_at):
+    # one sample per pair, {(base, target): rate}, all seen at fetched_at
+    return fold_samples([
+        (base_currency, target_currency, rate, fetched_at)
+        for (base_currency, target_currency), rate in rates.items()
+    ])
+
+
+def record_snapshot_rollups(snapshot):
+    # a failed update keeps the snapshot, rebuild_rate_rollups repairs the buckets.
+    # Only provider base tables count, tables for other bases quote the same
+    # cross rates and would repeat every sample
+    if snapshot.base_currency != settings.EXCHANGE_RATE_PROVIDER_BASE:
+        return []
+    try:
+        return record_rates(snapshot_pair_rates(snapshot), snapshot.fetched_at)
+    except DatabaseError as e:
+        logger.error(f"Rate rollup update failed for snapshot {snapshot.id}: {str(e)}")
+        return []
+
+
+def rebuild_rate_rollups(since=None, chunk_size=2000):
+    """
+    Recompute the buckets of the configured pairs from the stored
+    snapshots, all of them or from the start of the week containing
+    `since`. Backfills a newly configured pair and repairs buckets a failed
+    update missed.
+    """
+    snapshots = ExchangeRateSnapshot.objects.filter(
+        base_currency=settings.EXCHANGE_RATE_PROVIDER_BASE
+    ).only('rates', 'fetched_at').order_by('fetched_at')
+    # other pairs only have buckets compacted from the rate log, which a
+    # rebuild from snapshots can't reproduce
+    configured = Q(pk__in=[])
+    for base_currency, target_currency in settings.EXCHANGE_RATE_ROLLUP_PAIRS:
+        configured |= Q(base_currency=base_currency, target_currency=target_currency)
+    stale = ExchangeRateRollup.objects.filter(configured)
+    if since is not None:
+        start = bucket_start(since, 'week')
+        snapshots = snapshots.filter(fetched_at__gte=start)
+        stale = stale.filter(bucket_start__gte=start)
+
+    rollups = {}
+    for snapshot in snapshots.iterator(chunk_size=chunk_size):
+        for (base_currency, target_currency), rate in snapshot_pair_rates(snapshot).items():
+            for interval in INTERVALS:
+                key = (base_currency, target_currency, interval, bucket_start(snapshot.fetched_at, interval))
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = rollups[key] = ExchangeRateRollup(
+                        base_currency=base_currency,
+                        target_currency=target_currency,
+                        interval=interval,
+                        bucket_start=key[3],
+                    )
+                merge_sample(rollup, rate, snapshot.fetched_at)
+
+    with transaction.atomic():
+        stale.delete()
+        ExchangeRateRollup.objects.bulk_create(rollups.values(), batch_size=500)
+    return list(rollups.values())
+
+
+def rollup_history_queryset(base_currency, target_currency, interval, start, end):
+    # one range scan over the unique (pair, interval, bucket_start) index
+    return ExchangeRateRollup.objects.filter(
+        base_currency=base_currency,
+        target_currency=target_currency,
+        interval=interval,
+        bucket_start__gte=bucket_start(start, interval),
+        bucket_start__lte=end,
+    ).order_by('bucket_start')
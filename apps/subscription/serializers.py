@@ -1,8 +1,12 @@
-from rest_framework import serializers
+from rest_framework import exceptions, serializers, status
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db import transaction
-from .models import Plan, Subscription, ExchangeRateLog
+from django.db import IntegrityError, transaction
+from .models import Plan, Subscription, ExchangeRateLog, ExchangeRateRollup, PlanSubscriptionStats
+from .catalog import get_plan_catalog
+from .counters import adjust_plan_counters, transition_status_by_id
+from .rollups import INTERVALS
 
 
 class PlanSerializer(serializers.ModelSerializer):
@@ -12,6 +16,17 @@ class PlanSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class PlanStatsSerializer(serializers.ModelSerializer):
+    plan_id = serializers.IntegerField(source='plan.id', read_only=True)
+    plan_name = serializers.CharField(source='plan.name', read_only=True)
+    total_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = PlanSubscriptionStats
+        fields = ['plan_id', 'plan_name', 'active_count', 'cancelled_count', 'expired_count', 'total_count', 'updated_at']
+        read_only_fields = fields
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -24,7 +39,9 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     plan = PlanSerializer(read_only=True)
     plan_name = serializers.CharField(source='plan.name', read_only=True)
     plan_price = serializers.DecimalField(source='plan.price', max_digits=10, decimal_places=2, read_only=True)
-    days_remaining = serializers.SerializerMethodField()
+    # as of now, not waiting for the expiry sweeper ==>
+    status = serializers.CharField(source='get_effective_status', read_only=True)
+    days_remaining = serializers.IntegerField(source='get_days_remaining', read_only=True)
     is_expired = serializers.BooleanField(read_only=True)
     
     class Meta:
@@ -32,96 +49,233 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'plan', 'plan_name', 'plan_price',
             'start_date', 'end_date', 'status', 'days_remaining', 
-            'is_expired', 'created_at', 'updated_at'
+            'is_expired', 'auto_renew', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'plan', 'end_date', 'created_at', 'updated_at']
-    
-    def get_days_remaining(self, obj):
-        if obj.status != 'active':
-            return 0
-        
-        remaining = (obj.end_date - timezone.now()).days
-        return max(0, remaining)
+        read_only_fields = ['id', 'user', 'plan', 'end_date', 'auto_renew', 'created_at', 'updated_at']
+
+
+class SubscriptionListSerializer:
+    """
+    Read-only listing path with the same output as SubscriptionSerializer.
+    Rows come from .values() (see get_values), with the status and days
+    remaining as of now computed in SQL; the nested user / plan dicts are
+    built once per id, "now" is taken once per call and datetimes are
+    formatted like DRF's ISO 8601 DateTimeField.
+    """
+    user_fields = ['id', 'username', 'email', 'first_name', 'last_name']
+    plan_fields = ['id', 'name', 'price', 'duration_days', 'created_at', 'updated_at']
+    values_fields = (
+        ['id', 'user_id', 'plan_id', 'start_date', 'end_date', 'effective_status', 'days_remaining',
+         'auto_renew', 'created_at', 'updated_at'] +
+        [f'user__{field}' for field in user_fields if field != 'id'] +
+        [f'plan__{field}' for field in plan_fields if field != 'id']
+    )
+    price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    def __init__(self, rows, now=None):
+        self.rows = rows
+        self.now = now or timezone.now()
+        self.tz = timezone.get_current_timezone()
+
+    @classmethod
+    def get_values(cls, queryset, now=None):
+        return queryset.with_effective_status(now).values(*cls.values_fields)
+
+    def format_datetime(self, value):
+        if value is None:
+            return None
+        value = value.astimezone(self.tz).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def build_user(self, row):
+        user = {'id': row['user_id']}
+        for field in self.user_fields[1:]:
+            user[field] = row[f'user__{field}']
+        return user
+
+    def build_plan(self, row):
+        return {
+            'id': row['plan_id'],
+            'name': row['plan__name'],
+            'price': self.price_field.to_representation(row['plan__price']),
+            'duration_days': row['plan__duration_days'],
+            'created_at': self.format_datetime(row['plan__created_at']),
+            'updated_at': self.format_datetime(row['plan__updated_at']),
+        }
+
+    @property
+    def data(self):
+        return list(self.iter_data())
+
+    def iter_data(self):
+        # one row at a time, for streamed responses
+        now = self.now
+        users = {}
+        plans = {}
+
+        for row in self.rows:
+            user = users.get(row['user_id'])
+            if user is None:
+                user = users[row['user_id']] = self.build_user(row)
+            plan = plans.get(row['plan_id'])
+            if plan is None:
+                plan = plans[row['plan_id']] = self.build_plan(row)
+
+            end_date = row['end_date']
+
+            yield {
+                'id': row['id'],
+                'user': user,
+                'plan': plan,
+                'plan_name': plan['name'],
+                'plan_price': plan['price'],
+                'start_date': self.format_datetime(row['start_date']),
+                'end_date': self.format_datetime(end_date),
+                'status': row['effective_status'],
+                'days_remaining': row['days_remaining'],
+                'is_expired': now > end_date,
+                'auto_renew': row['auto_renew'],
+                'created_at': self.format_datetime(row['created_at']),
+                'updated_at': self.format_datetime(row['updated_at']),
+            }
+
+
+class ActiveSubscriptionConflict(exceptions.APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "You already have an active subscription for this plan."
+    default_code = 'conflict'
 
 
 class CreateSubscriptionSerializer(serializers.Serializer):
     plan_id = serializers.IntegerField()
+    auto_renew = serializers.BooleanField(default=False)
     
     def validate_plan_id(self, value):
-        try:
-            plan = Plan.objects.get(id=value)
-            return value
-        except Plan.DoesNotExist:
+        # in-memory plan catalog, no query per request ==>
+        if get_plan_catalog().get(value) is None:
             raise serializers.ValidationError("Plan not found.")
+        return value
     
-    def validate(self, attrs):
-        user = self.context['request'].user
-        plan_id = attrs['plan_id']
-        
-        # checking any active subscription for this plan ==>
-        existing_subscription = Subscription.objects.filter(
-            user=user,
-            plan_id=plan_id,
-            status='active'
-        ).exists()
-        
-        if existing_subscription:
-            raise serializers.ValidationError(
-                "You already have an active subscription for this plan."
-            )
-        
-        return attrs
-    
-    @transaction.atomic
     def create(self, validated_data):
         user = self.context['request'].user
-        plan = Plan.objects.get(id=validated_data['plan_id'])
-        
-        subscription = Subscription.objects.create(
-            user=user,
-            plan=plan,
-            start_date=timezone.now(),
-            status='active'
-        )
+        plan = get_plan_catalog().get(validated_data['plan_id'])
+        # a user from the auth cache carries no profile fields, the
+        # response then loads the row by id ==>
+        owner = {'user_id': user.id} if getattr(user, 'from_auth_cache', False) else {'user': user}
         
-        return subscription
+        # no exists() check first, the unique (user, active_plan_id) index
+        # decides on every backend: a read can't see a concurrent insert,
+        # the index can ==>
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    return Subscription.objects.create(
+                        **owner,
+                        plan=plan,
+                        start_date=timezone.now(),
+                        status='active',
+                        auto_renew=validated_data['auto_renew']
+                    )
+            except IntegrityError:
+                # only on the failure path, anything but the active pair is re-raised
+                active = Subscription.objects.filter(
+                    user=user, active_plan_id=plan.id
+                ).values_list('id', 'end_date').first()
+                if active is None:
+                    raise
+                
+                # the active row already ended, the sweeper just hasn't been
+                # there yet: expire it now and insert again ==>
+                subscription_id, end_date = active
+                if attempt or end_date >= timezone.now():
+                    raise ActiveSubscriptionConflict()
+                transition_status_by_id(Subscription.objects.filter(id=subscription_id), 'active', 'expired')
+
+
+class BulkSubscribeItemSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    plan_id = serializers.IntegerField()
+    auto_renew = serializers.BooleanField(default=False)
+
+
+class BulkSubscribeSerializer(serializers.Serializer):
+    # users, plans and active pairs are checked per item in bulk_subscribe ==>
+    items = serializers.ListField(
+        child=BulkSubscribeItemSerializer(),
+        allow_empty=False,
+        max_length=settings.SUBSCRIPTION_BULK_MAX_ITEMS
+    )
+
+
+class BulkSubscribeResultSerializer(serializers.Serializer):
+    index = serializers.IntegerField()
+    user_id = serializers.IntegerField()
+    plan_id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['created', 'failed'])
+    subscription_id = serializers.IntegerField(required=False)
+    error = serializers.CharField(required=False)
 
 
 class CancelSubscriptionSerializer(serializers.Serializer):
     subscription_id = serializers.IntegerField()
     
-    def validate_subscription_id(self, value):
-        user = self.context['request'].user
-        
-        try:
-            subscription = Subscription.objects.get(
-                id=value,
-                user=user,
-                status='active'
-            )
-            return value
-        except Subscription.DoesNotExist:
-            raise serializers.ValidationError(
-                "Active subscription not found or doesn't belong to you."
-            )
+    not_found_message = "Active subscription not found or doesn't belong to you."
     
     @transaction.atomic
     def save(self):
+        """
+        One conditional UPDATE: the row count decides, so of two concurrent
+        cancels exactly one succeeds. Returns None when nothing matched.
+        """
         subscription_id = self.validated_data['subscription_id']
         user = self.context['request'].user
         
-        subscription = Subscription.objects.get(
+        now = timezone.now()
+        # a row past its end_date is expired, whatever the sweeper has stored ==>
+        cancelled = Subscription.objects.filter(
             id=subscription_id,
             user=user,
-            status='active'
-        )
+            status='active',
+            end_date__gte=now
+        ).update(status='cancelled', updated_at=now)
+        
+        if not cancelled:
+            return None
         
-        subscription.status = 'cancelled'
-        subscription.save()
+        # the row for the response, the counters follow the update ==>
+        subscription = Subscription.objects.select_related('user', 'plan').get(id=subscription_id)
+        adjust_plan_counters(subscription.plan_id, active=-1, cancelled=1)
         
         return subscription
 
 
+class BulkCancelSubscriptionSerializer(serializers.Serializer):
+    subscription_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.SUBSCRIPTION_BULK_MAX_ITEMS
+    )
+    
+    def save(self):
+        # only the user's own active subscriptions, in one UPDATE ==>
+        user = self.context['request'].user
+        subscription_ids = list(dict.fromkeys(self.validated_data['subscription_ids']))
+        
+        cancelled = set(transition_status_by_id(
+            Subscription.objects.filter(id__in=subscription_ids, user=user, end_date__gte=timezone.now()),
+            'active',
+            'cancelled'
+        ))
+        
+        return [
+            subscription_id for subscription_id in subscription_ids if subscription_id in cancelled
+        ], [
+            subscription_id for subscription_id in subscription_ids if subscription_id not in cancelled
+        ]
+
+
 class ExchangeRateLogSerializer(serializers.ModelSerializer):
     
     class Meta:
@@ -141,10 +295,49 @@ class ExchangeRateRequestSerializer(serializers.Serializer):
         return value.upper()
 
 
+class ExchangeRateHistoryRequestSerializer(ExchangeRateRequestSerializer):
+    interval = serializers.ChoiceField(choices=ExchangeRateRollup.INTERVAL_CHOICES, required=False)
+    from_ = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+    to = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+
+    def get_fields(self):
+        # 'from' is a keyword, declared as from_
+        fields = super().get_fields()
+        fields['from'] = fields.pop('from_')
+        return fields
+
+    def validate(self, attrs):
+        # none of interval / from / to: the last raw rows, as before
+        if not attrs.keys() & {'interval', 'from', 'to'}:
+            return attrs
+
+        interval = attrs.setdefault('interval', 'day')
+        end = attrs.setdefault('to', timezone.now())
+        start = attrs.setdefault('from', end - INTERVALS[interval] * settings.EXCHANGE_RATE_HISTORY_DEFAULT_BUCKETS)
+
+        if start > end:
+            raise serializers.ValidationError({'from': 'Must not be after to.'})
+        if (end - start) / INTERVALS[interval] > settings.EXCHANGE_RATE_HISTORY_MAX_BUCKETS:
+            raise serializers.ValidationError({
+                'interval': f'At most {settings.EXCHANGE_RATE_HISTORY_MAX_BUCKETS} buckets per request, '
+                            f'use a wider interval or a shorter range.'
+            })
+        return attrs
+
+
+class ExchangeRateRollupSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ExchangeRateRollup
+        fields = ['bucket_start', 'open', 'high', 'low', 'close', 'samples']
+
+
 class ExchangeRateResponseSerializer(serializers.Serializer):
     base_currency = serializers.CharField()
     target_currency = serializers.CharField()
     rate = serializers.DecimalField(max_digits=15, decimal_places=6)
     fetched_at = serializers.DateTimeField()
+    cache_age = serializers.IntegerField(help_text="Seconds since the rate was fetched from the provider")
+    stale = serializers.BooleanField(help_text="True when the provider is unavailable and the last known rate is served")
     success = serializers.BooleanField()
     message = serializers.CharField(required=False) 
\ No newline at end of file
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .catalog import invalidate_plan_catalog
+from .counters import adjust_plan_counters
+from .models import Plan, PlanSubscriptionStats, Subscription
+
+
+@receiver(post_save, sender=Plan)
+def create_plan_stats(sender, instance, created, **kwargs):
+    if created:
+        PlanSubscriptionStats.objects.get_or_create(plan=instance)
+
+
+# after commit, so no process can rebuild the new version from uncommitted rows ==>
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def bump_plan_catalog(sender, **kwargs):
+    transaction.on_commit(invalidate_plan_catalog)
+
+
+# cached users for the JWT authentication, dropped once the change is committed ==>
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+
+# Counters for the save()/delete() paths, bulk updates go through
+# counters.transition_status instead ==>
+@receiver(post_save, sender=Subscription)
+def count_saved_subscription(sender, instance, created, **kwargs):
+    loaded_plan_id, loaded_status = getattr(instance, '_loaded_state', (None, None))
+    current = (instance.plan_id, instance.status)
+
+    if created:
+        adjust_plan_counters(instance.plan_id, **{instance.status: 1})
+    elif loaded_status and (loaded_plan_id, loaded_status) != current:
+        if loaded_plan_id == instance.plan_id:
+            adjust_plan_counters(instance.plan_id, **{loaded_status: -1, instance.status: 1})
+        else:
+            adjust_plan_counters(loaded_plan_id, **{loaded_status: -1})
+            adjust_plan_counters(instance.plan_id, **{instance.status: 1})
+
+    instance._loaded_state = current
+
+
+@receiver(post_delete, sender=Subscription)
+def count_deleted_subscription(sender, instance, **kwargs):
+    plan_id, status = getattr(instance, '_loaded_state', (instance.plan_id, instance.status))
+    # a plan delete cascades to its counters row first, a new one must not be
+    # created for the plan on its way out ==>
+    adjust_plan_counters(plan_id or instance.plan_id, create=False, **{status or instance.status: -1})
@@ -0,0 +1,120 @@
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import transition_status
+from .models import Subscription, SweepWatermark
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_SWEEP_NAME = 'subscription_expiry'
+EXPIRY_SWEEP_LOCK_KEY = 'subscription_expiry_sweep:lock'
+
+
+def expiry_candidates(now, watermark):
+    # keyset walk over the (status, end_date) index, after the watermark
+    queryset = Subscription.objects.filter(status='active', end_date__lt=now)
+    # auto-renew rows get the renewal grace period before they are expired
+    queryset = queryset.exclude(
+        auto_renew=True, end_date__gte=now - timedelta(hours=settings.SUBSCRIPTION_RENEWAL_GRACE_HOURS)
+    )
+    if watermark.last_end_date is not None:
+        queryset = queryset.filter(
+            Q(end_date__gt=watermark.last_end_date) |
+            Q(end_date=watermark.last_end_date, id__gt=watermark.last_id)
+        )
+    return queryset.order_by('end_date', 'id')
+
+
+def expire_batch(now, watermark, batch_size):
+    """
+    Expire the next batch of at most batch_size subscriptions, by primary
+    key, and advance the watermark in the same transaction. Returns
+    (rows scanned, rows expired).
+    """
+    rows = list(expiry_candidates(now, watermark).values_list('id', 'end_date')[:batch_size])
+    if not rows:
+        return 0, 0
+
+    with transaction.atomic():
+        # status / end_date are checked again, rows may have changed since the read
+        batch = Subscription.objects.filter(id__in=[row[0] for row in rows], end_date__lt=now)
+        updated = transition_status(batch, ['active'], 'expired')
+
+        watermark.last_id, watermark.last_end_date = rows[-1]
+        watermark.save()
+
+    return len(rows), updated
+
+
+def sweep_expired_subscriptions(batch_size=None, max_seconds=None):
+    """
+    Expire active subscriptions past their end_date in short batches, each
+    one its own transaction, until nothing is left or max_seconds is spent.
+    A run that stops early (time budget, crash) leaves the watermark where
+    the last batch committed and the next run continues from there; once a
+    run drains everything the watermark is reset so the next pass starts
+    from the oldest end_date again. Reads don't depend on it, they resolve
+    expiry from end_date (SubscriptionQuerySet.with_effective_status); the
+    sweep brings the stored status and the plan counters in line.
+    """
+    batch_size = batch_size or settings.SUBSCRIPTION_EXPIRY_BATCH_SIZE
+    max_seconds = max_seconds or settings.SUBSCRIPTION_EXPIRY_MAX_SECONDS
+
+    # runs are scheduled every minute, don't let two of them overlap
+    token = uuid.uuid4().hex
+    if not cache.add(EXPIRY_SWEEP_LOCK_KEY, token, max_seconds + 60):
+        logger.info("Expiry sweep already running, skipping")
+        return {'skipped': True, 'updated_count': 0, 'batches': 0}
+
+    try:
+        watermark, _ = SweepWatermark.objects.get_or_create(name=EXPIRY_SWEEP_NAME)
+        resumed_from = (watermark.last_end_date, watermark.last_id) if watermark.last_end_date else None
+        if resumed_from:
+            logger.info(f"Resuming expiry sweep after end_date={resumed_from[0]} id={resumed_from[1]}")
+
+        now = timezone.now()
+        started = time.monotonic()
+        batches = updated_total = scanned_total = 0
+        drained = False
+
+        while time.monotonic() - started < max_seconds:
+            batch_started = time.monotonic()
+            scanned, updated = expire_batch(now, watermark, batch_size)
+            if scanned:
+                batches += 1
+                scanned_total += scanned
+                updated_total += updated
+                elapsed = time.monotonic() - batch_started
+                logger.info(
+                    f"Expiry batch {batches}: {updated}/{scanned} expired in {elapsed:.3f}s "
+                    f"({scanned / elapsed if elapsed else scanned:.0f} rows/s), up to id {watermark.last_id}"
+                )
+            if scanned < batch_size:
+                drained = True
+                break
+
+        if drained and watermark.last_end_date is not None:
+            watermark.reset()
+
+        elapsed = time.monotonic() - started
+        return {
+            'skipped': False,
+            'updated_count': updated_total,
+            'scanned_count': scanned_total,
+            'batches': batches,
+            'drained': drained,
+            'resumed': resumed_from is not None,
+            'elapsed': round(elapsed, 3),
+            'rows_per_second': round(scanned_total / elapsed) if elapsed else scanned_total,
+        }
+    finally:
+        if cache.get(EXPIRY_SWEEP_LOCK_KEY) == token:
+            cache.delete(EXPIRY_SWEEP_LOCK_KEY)
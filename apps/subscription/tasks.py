@@ -1,7 +1,17 @@
-from celery import shared_task
+import json
+
+from celery import chord, group, shared_task, states
+from celery.signals import worker_shutdown
+from django.conf import settings
 from django.utils import timezone
-from .utils import convert_usd_to_bdt
-from .models import ExchangeRateLog, Subscription
+from django.utils.dateparse import parse_datetime
+from django_celery_results.models import TaskResult
+from .utils import fetch_rate_snapshot, snapshot_entry, store_exchange_rate_entry, get_entry_rate
+from .models import ExchangeRateLog
+from .sweeper import sweep_expired_subscriptions
+from .renewals import renew_partition, renewal_partitions, renewal_window
+from .retention import compact_exchange_rate_logs as compact_logs
+from .log_buffer import flush_rate_log_buffer
 
 import logging
 
@@ -12,40 +22,47 @@ def fetch_exchange_rate(base_currency='USD', target_currency='BDT'):
     logger.info(f"Starting exchange rate fetch task: {base_currency} to {target_currency}")
     
     try:
-        if base_currency == 'USD' and target_currency == 'BDT':
-            result = convert_usd_to_bdt(1.0)
-            
-            if result is None:
-                logger.error("Failed to fetch exchange rate from external API")
-                return {
-                    'status': 'error',
-                    'message': 'Failed to fetch exchange rate from external API'
-                }
-            
-            bdt_amount, rate = result
-            
-            log_entry = ExchangeRateLog.objects.create(
-                base_currency=base_currency,
-                target_currency=target_currency,
-                rate=rate
-            )
-            
-            logger.info(f"Successfully fetched and saved exchange rate: {base_currency}/{target_currency} = {rate}")
-            
+        # one provider call stores the whole rate table ==>
+        snapshot = fetch_rate_snapshot()
+        
+        if snapshot is None:
+            logger.error("Failed to fetch exchange rate from external API")
             return {
-                'status': 'success',
-                'message': f"Exchange rate fetched and saved: {base_currency}/{target_currency} = {rate}",
-                'rate': str(rate),
-                'log_id': log_entry.id,
-                'fetched_at': log_entry.fetched_at.isoformat()
+                'status': 'error',
+                'message': 'Failed to fetch exchange rate from external API'
             }
         
-        else:
+        # keep the shared cache warm so API requests don't have to fetch ==>
+        entry = snapshot_entry(snapshot)
+        store_exchange_rate_entry(entry)
+        
+        rate = get_entry_rate(entry, base_currency, target_currency)
+        
+        if rate is None:
             logger.warning(f"Currency pair {base_currency}/{target_currency} not supported")
             return {
                 'status': 'error',
-                'message': f'Currency pair {base_currency}/{target_currency} not supported yet'
+                'message': f'Currency pair {base_currency}/{target_currency} not supported',
+                'snapshot_id': snapshot.id
             }
+        
+        log_entry = ExchangeRateLog.objects.create(
+            base_currency=base_currency,
+            target_currency=target_currency,
+            rate=rate
+        )
+        
+        logger.info(f"Successfully fetched and saved exchange rate: {base_currency}/{target_currency} = {rate}")
+        
+        return {
+            'status': 'success',
+            'message': f"Exchange rate fetched and saved: {base_currency}/{target_currency} = {rate}",
+            'rate': str(rate),
+            'log_id': log_entry.id,
+            'snapshot_id': snapshot.id,
+            'rates_count': len(snapshot.rates),
+            'fetched_at': log_entry.fetched_at.isoformat()
+        }
             
     except Exception as e:
         logger.error(f"Error in fetch_exchange_rate task: {str(e)}")
@@ -55,23 +72,31 @@ def fetch_exchange_rate(base_currency='USD', target_currency='BDT'):
         }
 
 @shared_task
-def update_expired_subscriptions():
+def update_expired_subscriptions(batch_size=None, max_seconds=None):
     logger.info("Starting expired subscriptions update task")
     
     try:
-        expired_subscriptions = Subscription.objects.filter(
-            status='active',
-            end_date__lt=timezone.now()
-        )
+        # bounded primary key batches, resumable from the persisted watermark ==>
+        result = sweep_expired_subscriptions(batch_size, max_seconds)
         
-        count = expired_subscriptions.update(status='expired')
+        if result['skipped']:
+            return {
+                'status': 'skipped',
+                'message': 'Expired subscriptions update already running',
+                'updated_count': 0
+            }
         
-        logger.info(f"Updated {count} expired subscriptions")
+        count = result['updated_count']
+        logger.info(f"Updated {count} expired subscriptions in {result['batches']} batches ({result['rows_per_second']} rows/s)")
         
         return {
             'status': 'success',
             'message': f"Updated {count} expired subscriptions",
-            'updated_count': count
+            'updated_count': count,
+            'batches': result['batches'],
+            'drained': result['drained'],
+            'elapsed': result['elapsed'],
+            'rows_per_second': result['rows_per_second']
         }
         
     except Exception as e:
@@ -81,20 +106,170 @@ def update_expired_subscriptions():
             'message': f'Error updating expired subscriptions: {str(e)}'
         }
 
+@shared_task(bind=True)
+def compact_exchange_rate_logs(self, retention_days=None, batch_size=None, max_seconds=None):
+    logger.info("Starting exchange rate log compaction task")
+    
+    def report_progress(meta):
+        # visible as state PROGRESS in the result backend / flower
+        if self.request.id:
+            self.update_state(state='PROGRESS', meta=meta)
+    
+    try:
+        # old raw rows folded into the rate rollups, deleted in small batches ==>
+        result = compact_logs(retention_days, batch_size, max_seconds, progress=report_progress)
+        
+        if result['skipped']:
+            return {
+                'status': 'skipped',
+                'message': 'Exchange rate log compaction already running',
+                'compacted_count': 0
+            }
+        
+        count = result['compacted_count']
+        logger.info(f"Compacted {count} exchange rate log rows in {result['batches']} batches ({result['rows_per_second']} rows/s)")
+        
+        return {
+            'status': 'success',
+            'message': f"Compacted {count} exchange rate log rows",
+            'compacted_count': count,
+            'total': result['total'],
+            'batches': result['batches'],
+            'drained': result['drained'],
+            'cutoff': result['cutoff'],
+            'elapsed': result['elapsed'],
+            'rows_per_second': result['rows_per_second']
+        }
+        
+    except Exception as e:
+        logger.error(f"Error in compact_exchange_rate_logs task: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error compacting exchange rate logs: {str(e)}'
+        }
+
+@shared_task
+def flush_exchange_rate_logs():
+    try:
+        # buffered API observations, bulk inserted in batches ==>
+        written = flush_rate_log_buffer()
+        
+        if written is None:
+            return {
+                'status': 'skipped',
+                'message': 'Exchange rate log flush already running',
+                'written_count': 0
+            }
+        
+        if written:
+            logger.info(f"Flushed {written} buffered exchange rate log rows")
+        
+        return {
+            'status': 'success',
+            'message': f"Flushed {written} exchange rate log rows",
+            'written_count': written
+        }
+        
+    except Exception as e:
+        logger.error(f"Error in flush_exchange_rate_logs task: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error flushing exchange rate logs: {str(e)}'
+        }
+
+@worker_shutdown.connect
+def flush_exchange_rate_logs_on_shutdown(**kwargs):
+    # nothing buffered is left behind when a worker stops
+    try:
+        written = flush_rate_log_buffer()
+        logger.info(f"Flushed {written or 0} buffered exchange rate log rows on shutdown")
+    except Exception as e:
+        logger.error(f"Error flushing exchange rate logs on shutdown: {str(e)}")
+
+@shared_task
+def fetch_rate_table(base_currency):
+    # one member of the periodic fetch group, returns an error result instead
+    # of raising so the summary always gets one result per base
+    try:
+        snapshot = fetch_rate_snapshot(base_currency)
+        
+        if snapshot is None:
+            return {
+                'status': 'error',
+                'base_currency': base_currency,
+                'message': 'Failed to fetch exchange rate from external API'
+            }
+        
+        store_exchange_rate_entry(snapshot_entry(snapshot))
+        
+        return {
+            'status': 'success',
+            'base_currency': base_currency,
+            'snapshot_id': snapshot.id,
+            'rates_count': len(snapshot.rates),
+            'fetched_at': snapshot.fetched_at.isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error fetching {base_currency} rate table: {str(e)}")
+        return {
+            'status': 'error',
+            'base_currency': base_currency,
+            'message': f'Error fetching exchange rate: {str(e)}'
+        }
+
+@shared_task(bind=True)
+def record_exchange_rate_fetch_summary(self, results, started_at):
+    succeeded = [result['base_currency'] for result in results if result['status'] == 'success']
+    failed = [result['base_currency'] for result in results if result['status'] != 'success']
+    
+    summary = {
+        'status': 'error' if not succeeded else 'partial' if failed else 'success',
+        'message': f"Fetched {len(succeeded)} of {len(results)} rate tables",
+        'succeeded': succeeded,
+        'failed': failed,
+        'started_at': started_at,
+        'finished_at': timezone.now().isoformat(),
+        'results': results
+    }
+    
+    # kept in django_celery_results whatever the result backend, visible in the admin ==>
+    TaskResult.objects.store_result(
+        content_type='application/json',
+        content_encoding='utf-8',
+        task_id=self.request.id or f"{self.name}:{started_at}",
+        result=json.dumps(summary),
+        status=states.SUCCESS,
+        task_name=self.name,
+    )
+    
+    logger.info(f"Periodic exchange rate fetch completed: {summary['message']}, failed: {failed or 'none'}")
+    return summary
+
+def exchange_rate_fetch_workflow(bases):
+    # the fetches run in parallel, the summary once they are all done: no
+    # task ever waits on another one's result
+    return chord(
+        group(fetch_rate_table.s(base_currency) for base_currency in bases),
+        record_exchange_rate_fetch_summary.s(timezone.now().isoformat())
+    )
+
 @shared_task
-def periodic_exchange_rate_fetch():
+def periodic_exchange_rate_fetch(bases=None):
     logger.info("Starting periodic exchange rate fetch task")
     
+    bases = bases or settings.EXCHANGE_RATE_FETCH_BASES
+    
     try:
-        result = fetch_exchange_rate.delay('USD', 'BDT')
-        task_result = result.get()
+        result = exchange_rate_fetch_workflow(bases).apply_async()
         
-        logger.info(f"Periodic exchange rate fetch completed: {task_result}")
+        logger.info(f"Periodic exchange rate fetch dispatched for {', '.join(bases)}")
         
         return {
-            'status': 'success',
-            'message': 'Periodic exchange rate fetch completed',
-            'task_result': task_result
+            'status': 'dispatched',
+            'message': f'Periodic exchange rate fetch dispatched for {len(bases)} base currencies',
+            'bases': bases,
+            'summary_task_id': result.id
         }
         
     except Exception as e:
@@ -102,4 +277,101 @@ def periodic_exchange_rate_fetch():
         return {
             'status': 'error',
             'message': f'Error in periodic exchange rate fetch: {str(e)}'
-        }
\ No newline at end of file
+        }
+
+@shared_task
+def renew_subscription_partition(since, until, user_from, user_to, max_id):
+    # one member of the renewal group, returns an error result instead of
+    # raising so the summary always gets one result per partition
+    try:
+        result = renew_partition(parse_datetime(since), parse_datetime(until), user_from, user_to, max_id)
+        return {'status': 'success', **result}
+        
+    except Exception as e:
+        logger.error(f"Error renewing subscriptions for users [{user_from}, {user_to}): {str(e)}")
+        return {
+            'status': 'error',
+            'user_from': user_from,
+            'user_to': user_to,
+            'renewed_count': 0,
+            'message': f'Error renewing subscriptions: {str(e)}'
+        }
+
+@shared_task(bind=True)
+def record_subscription_renewal_summary(self, results, started_at):
+    failed = [[result['user_from'], result['user_to']] for result in results if result['status'] != 'success']
+    undrained = [[result['user_from'], result['user_to']] for result in results
+                 if result['status'] == 'success' and not result['drained']]
+    renewed = sum(result['renewed_count'] for result in results)
+    
+    summary = {
+        'status': 'error' if len(failed) == len(results) else 'partial' if failed or undrained else 'success',
+        'message': f"Renewed {renewed} subscriptions in {len(results)} partitions",
+        'renewed_count': renewed,
+        'failed': failed,
+        'undrained': undrained,
+        'started_at': started_at,
+        'finished_at': timezone.now().isoformat(),
+        'results': results
+    }
+    
+    # kept in django_celery_results whatever the result backend, visible in the admin ==>
+    TaskResult.objects.store_result(
+        content_type='application/json',
+        content_encoding='utf-8',
+        task_id=self.request.id or f"{self.name}:{started_at}",
+        result=json.dumps(summary),
+        status=states.SUCCESS,
+        task_name=self.name,
+    )
+    
+    logger.info(f"Subscription renewal completed: {summary['message']}, failed partitions: {failed or 'none'}")
+    return summary
+
+def subscription_renewal_workflow(since, until, max_id, ranges):
+    # partitions are disjoint user id ranges, renewed in parallel by the
+    # subscriptions workers without touching each other's rows
+    return chord(
+        group(
+            renew_subscription_partition.s(since.isoformat(), until.isoformat(), user_from, user_to, max_id)
+            for user_from, user_to in ranges
+        ),
+        record_subscription_renewal_summary.s(timezone.now().isoformat())
+    )
+
+@shared_task
+def renew_due_subscriptions(partitions=None):
+    logger.info("Starting subscription renewal task")
+    
+    try:
+        # one aggregate over the due rows, then one task per user id range ==>
+        since, until = renewal_window()
+        due, max_id, ranges = renewal_partitions(since, until, partitions)
+        
+        if not due:
+            return {
+                'status': 'success',
+                'message': 'No subscriptions due for renewal',
+                'due_count': 0
+            }
+        
+        result = subscription_renewal_workflow(since, until, max_id, ranges).apply_async()
+        
+        logger.info(f"Subscription renewal dispatched: {due} due in {len(ranges)} partitions")
+        
+        return {
+            'status': 'dispatched',
+            'message': f'Renewal of {due} subscriptions dispatched in {len(ranges)} partitions',
+            'due_count': due,
+            'partitions': len(ranges),
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'summary_task_id': result.id
+        }
+        
+    except Exception as e:
+        logger.error(f"Error in renew_due_subscriptions: {str(e)}")
+        return {
+            'status': 'error',
+            'message': f'Error dispatching subscription renewal: {str(e)}'
+        }
@@ -1,3 +1,1407 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import itertools
+import json
+import random
+from io import StringIO
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipIf, skipUnless
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from celery.schedules import crontab
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+from django_celery_results.models import TaskResult
+import httpx
+import requests
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .authentication import ReadOnlyClaimsJWTAuthentication, user_cache_key
+from .blacklist import BloomFilter, CacheTokenBlacklist, RedisTokenBlacklist, blacklist_key
+from .catalog import get_plan_catalog, invalidate_plan_catalog
+from .rate_provider import (
+    AsyncRateProviderClient, CircuitBreaker, CircuitOpenError, RateProviderClient, RateProviderError,
+    RateProviderRejectedError
+)
+from .log_buffer import LocalRateLogBuffer, flush_rate_log_buffer, get_rate_log_buffer
+from .counters import STATUS_COUNTS_NOTE, rebuild_plan_counters
+from .models import (
+    ExchangeRateLog, ExchangeRateRollup, ExchangeRateSnapshot, Plan, PlanSubscriptionStats, Subscription,
+    SweepWatermark
+)
+from .pagination import encode_keyset_cursor
+from .retention import compact_exchange_rate_logs
+from .renewals import renew_batch, renew_partition, renewal_partitions, renewal_window
+from .tasks import (
+    exchange_rate_fetch_workflow, fetch_rate_table, periodic_exchange_rate_fetch, record_exchange_rate_fetch_summary,
+    renew_due_subscriptions, update_expired_subscriptions
+)
+from .rollups import INTERVALS, bucket_start, rebuild_rate_rollups, record_rates, record_snapshot_rollups
+from .serializers import SubscriptionListSerializer, SubscriptionSerializer
+from .sweeper import EXPIRY_SWEEP_LOCK_KEY, EXPIRY_SWEEP_NAME, sweep_expired_subscriptions
+from .views.api_view import PlansListAPIView
+from .views.async_view import AsyncExchangeRateAPIView, AsyncPlansListAPIView
+from .utils import get_cached_rate_snapshot, get_last_logged_rate_entry, is_stale, store_exchange_rate_entry
+from core import celery_app
+from respond.renderers import StandardizedJSONRenderer, orjson
+
+# tables that grow with traffic, a full scan of any of them fails the suite
+LARGE_TABLES = [
+    Subscription._meta.db_table,
+    ExchangeRateLog._meta.db_table,
+    ExchangeRateSnapshot._meta.db_table,
+    ExchangeRateRollup._meta.db_table,
+    User._meta.db_table,
+]
+
+
+# ============ EXPLAIN helpers ============>>
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+        cursor.execute(f"EXPLAIN {sql}")
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def full_scans(sql, plan):
+    # large tables read end to end: SQLite "SCAN t", MySQL access type ALL,
+    # PostgreSQL "Seq Scan on t". Walking a whole index (SQLite "SCAN t USING
+    # INDEX", MySQL type index) only passes when a LIMIT bounds it.
+    limited = ' LIMIT ' in sql.upper()
+    scanned = []
+    for step in plan:
+        if connection.vendor == 'sqlite':
+            words = step.split()
+            if len(words) >= 2 and words[0] == 'SCAN' and (len(words) == 2 or not limited):
+                scanned.append(words[1])
+        elif connection.vendor == 'mysql':
+            if step.get('type') == 'ALL' or (step.get('type') == 'index' and not limited):
+                scanned.append(step.get('table'))
+        else:
+            line = next(iter(step.values()))
+            if 'Seq Scan on' in line:
+                scanned.append(line.split('Seq Scan on')[1].split()[0])
+    return [table for table in scanned if table in LARGE_TABLES]
+
+
+def explainable(sql):
+    return sql.split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')
+
+
+class QueryPlanTestCase(APITestCase):
+    """
+    Seeds a dataset big enough for the planner to prefer indexes, then every
+    route is called with a fixed query budget and each query it ran is
+    EXPLAINed; a plan that reads a large table without an index fails.
+    """
+    users_count = 200
+    subscriptions_per_user = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        now = timezone.now()
+
+        cls.plans = Plan.objects.bulk_create([
+            Plan(name='Basic', price=9.99, duration_days=30),
+            Plan(name='Pro', price=19.99, duration_days=30),
+            Plan(name='Premium', price=99.99, duration_days=365),
+        ])
+        cls.user = User.objects.create_user('querybudget', 'querybudget@example.com', 'testpass123')
+        users = User.objects.bulk_create([
+            User(username=f'seed{i}', email=f'seed{i}@example.com') for i in range(cls.users_count)
+        ])
+
+        subscriptions = []
+        for user in users + [cls.user]:
+            for i in range(cls.subscriptions_per_user):
+                plan = cls.plans[i % len(cls.plans)]
+                start_date = now - timedelta(days=rng.randint(1, 700))
+                # at most one active subscription per (user, plan)
+                status = 'active' if i < len(cls.plans) and rng.random() < 0.5 else rng.choice(['cancelled', 'expired'])
+                if status == 'active':
+                    # still running, lapsed rows are set up by the tests that need them
+                    start_date = now - timedelta(days=(now - start_date).days % plan.duration_days)
+                subscriptions.append(Subscription(
+                    user=user,
+                    plan=plan,
+                    start_date=start_date,
+                    end_date=start_date + timedelta(days=plan.duration_days),
+                    status=status,
+                ))
+        Subscription.objects.bulk_create(subscriptions, batch_size=500)
+        rebuild_plan_counters()
+
+        rates = {'USD': 1.0, 'BDT': 121.5, 'EUR': 0.92, 'GBP': 0.79}
+        ExchangeRateSnapshot.objects.bulk_create([
+            ExchangeRateSnapshot(base_currency='USD', rates=rates) for _ in range(50)
+        ])
+        ExchangeRateLog.objects.bulk_create([
+            ExchangeRateLog(base_currency='USD', target_currency=target, rate=rates[target])
+            for _ in range(200) for target in ('BDT', 'EUR', 'GBP')
+        ])
+        # two years of hour / day / week buckets per pair, up to the current one
+        ExchangeRateRollup.objects.bulk_create([
+            ExchangeRateRollup(
+                base_currency='USD', target_currency=target, interval=interval,
+                bucket_start=bucket_start(now - length * i, interval),
+                open=rates[target], high=rates[target], low=rates[target], close=rates[target],
+                samples=1, opened_at=now - length * i, closed_at=now - length * i,
+            )
+            for target in ('BDT', 'EUR', 'GBP')
+            for interval, length in INTERVALS.items()
+            for i in range(timedelta(days=730) // length)
+        ], batch_size=1000)
+
+        with connection.cursor() as cursor:
+            # planner statistics, like a long-running database would have
+            if connection.vendor == 'mysql':
+                cursor.execute(f"ANALYZE TABLE {', '.join(LARGE_TABLES)}")
+                cursor.fetchall()
+            else:
+                cursor.execute("ANALYZE")
+
+    def setUp(self):
+        cache.clear()
+        invalidate_plan_catalog()
+        get_rate_log_buffer().clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def call(self, method, url, budget, data=None, expected_status=200):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json' if method == 'post' else None)
+            if response.streaming:
+                # streamed responses run their queries while being consumed
+                response.streaming_content = [response.getvalue()]
+
+        self.assertEqual(response.status_code, expected_status)
+
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{method.upper()} {url} ran {len(queries)} queries, budget is {budget}:\n" + '\n'.join(queries)
+        )
+
+        self.check_plans(f"{method.upper()} {url}", queries)
+        return response
+
+    def check_plans(self, route, queries):
+        report = []
+        for sql in filter(explainable, queries):
+            plan = explain(sql)
+            report.append(f"{sql}\n" + '\n'.join(f"    {step}" for step in plan))
+
+            scanned = full_scans(sql, plan)
+            self.assertFalse(
+                scanned,
+                f"{route} reads {', '.join(scanned)} with a full scan:\n{sql}\n{plan}"
+            )
+
+        if settings.QUERY_PLANS_DIR:
+            directory = Path(settings.QUERY_PLANS_DIR) / connection.vendor
+            directory.mkdir(parents=True, exist_ok=True)
+            name = self._testMethodName.removeprefix('test_')
+            (directory / f"{name}.txt").write_text(f"{route}\n\n" + '\n\n'.join(report) + '\n')
+
+
+class SubscriptionRouteTests(QueryPlanTestCase):
+
+    def test_subscribe(self):
+        plan = self.plans[0]
+        Subscription.objects.filter(user=self.user, plan=plan, status='active').update(status='cancelled')
+        get_plan_catalog()
+
+        # plan lookups come from the warm catalog
+        self.call('post', reverse('api_subscribe'), 5, {'plan_id': plan.id}, expected_status=201)
+
+    def test_subscribe_conflict(self):
+        plan = self.plans[0]
+        if not Subscription.objects.filter(user=self.user, plan=plan, status='active').exists():
+            Subscription.objects.create(user=self.user, plan=plan)
+        get_plan_catalog()
+        active_count = PlanSubscriptionStats.objects.get(plan=plan).active_count
+
+        # the constraint rejects the insert, a clean 409 instead of a 500
+        response = self.call('post', reverse('api_subscribe'), 6, {'plan_id': plan.id}, expected_status=409)
+        self.assertEqual(
+            response.json()['error_details']['errors']['plan_id'],
+            ["You already have an active subscription for this plan."]
+        )
+        self.assertEqual(PlanSubscriptionStats.objects.get(plan=plan).active_count, active_count)
+
+    def test_active_pair_guard_is_unconditional(self):
+        # MySQL creates no conditional constraints, the guard has to be a
+        # plain unique index to hold there too
+        constraint = next(c for c in Subscription._meta.constraints if c.name == 'unique_active_user_plan')
+        self.assertIsNone(constraint.condition)
+
+        plan = self.plans[0]
+        Subscription.objects.filter(user=self.user, plan=plan, status='active').update(status='cancelled')
+        Subscription.objects.create(user=self.user, plan=plan)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Subscription.objects.create(user=self.user, plan=plan)
+        # inactive rows don't take the slot
+        Subscription.objects.create(user=self.user, plan=plan, status='cancelled')
+
+    def test_bulk_subscribe(self):
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        plan = self.plans[0]
+        get_plan_catalog()
+
+        users = list(User.objects.filter(username__startswith='seed').order_by('id')[:50])
+        active = set(Subscription.objects.filter(plan=plan, status='active').values_list('user_id', flat=True))
+        items = [{'user_id': user.id, 'plan_id': plan.id} for user in users]
+        items += [{'user_id': users[0].id, 'plan_id': plan.id}, {'user_id': 0, 'plan_id': plan.id},
+                  {'user_id': users[0].id, 'plan_id': 0}]
+
+        # one query per INSERT batch, not per seat
+        response = self.call('post', reverse('api_bulk_subscribe'), 7, {'items': items}, expected_status=201)
+
+        results = response.json()['data']['data']
+        self.assertEqual([result['index'] for result in results], list(range(len(items))))
+        created = [result for result in results if result['status'] == 'created']
+        self.assertEqual(len(created), sum(1 for user in users if user.id not in active))
+        self.assertEqual(
+            Subscription.objects.filter(id__in=[result['subscription_id'] for result in created], status='active').count(),
+            len(created)
+        )
+        self.assertEqual(
+            [result.get('error') for result in results[-3:]],
+            ["Duplicate user and plan in this request.", "User not found.", "Plan not found."]
+        )
+
+        stats = {stat.plan_id: stat.active_count for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(stats, {stat.plan_id: stat.active_count for stat in rebuild_plan_counters()})
+
+    def test_bulk_subscribe_staff_only(self):
+        self.call('post', reverse('api_bulk_subscribe'), 1,
+                  {'items': [{'user_id': self.user.id, 'plan_id': self.plans[0].id}]}, expected_status=403)
+
+    def test_user_subscriptions(self):
+        response = self.call('get', reverse('api_user_subscriptions'), 2)
+        self.assertEqual(len(response.json()['data']['data']), self.subscriptions_per_user)
+
+    def test_user_subscriptions_filtered(self):
+        url = reverse('api_user_subscriptions')
+        self.call('get', f"{url}?status=cancelled&plan={self.plans[1].id}&page_size=5", 2)
+
+    def test_user_subscriptions_next_page(self):
+        url = reverse('api_user_subscriptions')
+        first = self.call('get', f"{url}?page_size=3", 2)
+        self.call('get', first.json()['data']['next'], 2)
+
+    def test_user_subscriptions_shape(self):
+        # the listing serializer renders exactly what SubscriptionSerializer does
+        queryset = Subscription.objects.filter(user=self.user).order_by('-created_at', '-id')
+        expected = SubscriptionSerializer(queryset.select_related('user', 'plan'), many=True).data
+
+        rows = SubscriptionListSerializer.get_values(queryset)
+        self.assertEqual(JSONRenderer().render(SubscriptionListSerializer(rows).data), JSONRenderer().render(expected))
+
+    def test_subscriptions_export(self):
+        response = self.call('get', reverse('api_subscriptions_export'), 2)
+
+        # streamed bytes are what the renderer makes of the whole list at once
+        rows = SubscriptionListSerializer.get_values(
+            Subscription.objects.filter(user=self.user).order_by('-created_at', '-id')
+        )
+        expected = StandardizedJSONRenderer().render(
+            {'message': 'Subscriptions exported successfully', 'data': SubscriptionListSerializer(rows).data},
+            renderer_context={'response': response}
+        )
+        self.assertEqual(response.getvalue(), expected)
+
+    def test_subscriptions_export_filtered(self):
+        url = reverse('api_subscriptions_export')
+        response = self.call('get', f"{url}?status=expired", 2)
+        statuses = {row['status'] for row in json.loads(response.getvalue())['data']['data']}
+        self.assertLessEqual(statuses, {'expired'})
+
+    def test_cancel(self):
+        plan = self.plans[2]
+        subscription = Subscription.objects.filter(user=self.user, plan=plan).first()
+        Subscription.objects.filter(user=self.user, plan=plan, status='active').update(status='expired')
+        Subscription.objects.filter(id=subscription.id).update(status='active', end_date=timezone.now() + timedelta(days=30))
+
+        rebuild_plan_counters()
+
+        self.call('post', reverse('api_cancel_subscription'), 6, {'subscription_id': subscription.id})
+
+        # the second cancel matches no active row
+        response = self.call('post', reverse('api_cancel_subscription'), 4,
+                             {'subscription_id': subscription.id}, expected_status=400)
+        self.assertEqual(
+            response.json()['error_details']['message'],
+            "Active subscription not found or doesn't belong to you."
+        )
+        stats = {stat.plan_id: stat.active_count for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(stats, {stat.plan_id: stat.active_count for stat in rebuild_plan_counters()})
+
+    def test_bulk_cancel(self):
+        rebuild_plan_counters()
+        active = list(Subscription.objects.filter(user=self.user, status='active').values_list('id', flat=True))
+        inactive = Subscription.objects.filter(user=self.user).exclude(status='active').values_list('id', flat=True)[0]
+        other = Subscription.objects.filter(status='active').exclude(user=self.user).values_list('id', flat=True)[0]
+        ids = active + [inactive, other, 0]
+
+        # one UPDATE for every id, plus one counter update per plan
+        response = self.call('post', reverse('api_bulk_cancel_subscription'), 7, {'subscription_ids': ids})
+
+        data = response.json()['data']['data']
+        self.assertEqual(data['cancelled'], active)
+        self.assertEqual(data['failed'], [inactive, other, 0])
+        self.assertFalse(Subscription.objects.filter(id__in=active).exclude(status='cancelled').exists())
+        self.assertEqual(Subscription.objects.get(id=other).status, 'active')
+
+        stats = {stat.plan_id: (stat.active_count, stat.cancelled_count) for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(stats, {
+            stat.plan_id: (stat.active_count, stat.cancelled_count) for stat in rebuild_plan_counters()
+        })
+
+    def lapse_active_subscription(self, plan):
+        # an active row past its end_date that the expiry sweeper hasn't seen yet
+        subscription = Subscription.objects.filter(user=self.user, plan=plan).first()
+        Subscription.objects.filter(user=self.user, plan=plan, status='active').update(status='expired')
+        Subscription.objects.filter(id=subscription.id).update(status='active', end_date=timezone.now() - timedelta(hours=1))
+        rebuild_plan_counters()
+        return subscription
+
+    def test_lapsed_subscription_reads_as_expired(self):
+        subscription = self.lapse_active_subscription(self.plans[0])
+        url = reverse('api_user_subscriptions')
+
+        rows = {row['id']: row for row in self.call('get', url, 2).json()['data']['data']}
+        self.assertEqual((rows[subscription.id]['status'], rows[subscription.id]['days_remaining']), ('expired', 0))
+
+        expired = [row['id'] for row in self.call('get', f"{url}?status=expired&page_size=100", 2).json()['data']['data']]
+        active = [row['id'] for row in self.call('get', f"{url}?status=active&page_size=100", 2).json()['data']['data']]
+        self.assertIn(subscription.id, expired)
+        self.assertNotIn(subscription.id, active)
+        self.assertEqual(SubscriptionSerializer(Subscription.objects.get(id=subscription.id)).data['status'], 'expired')
+
+    def test_days_remaining_in_sql(self):
+        now = timezone.now()
+        queryset = Subscription.objects.filter(user=self.user).with_effective_status(now)
+        for subscription in queryset.filter(status='active', end_date__gte=now):
+            self.assertEqual(subscription.get_days_remaining(), (subscription.end_date - now).days)
+
+    def test_subscribe_over_lapsed_subscription(self):
+        plan = self.plans[0]
+        subscription = self.lapse_active_subscription(plan)
+        get_plan_catalog()
+
+        # the rejected insert expires the lapsed row inline and inserts again,
+        # savepoints included: the rare path, once per lapsed row
+        self.call('post', reverse('api_subscribe'), 15, {'plan_id': plan.id}, expected_status=201)
+
+        self.assertEqual(Subscription.objects.get(id=subscription.id).status, 'expired')
+        stats = {stat.plan_id: stat.active_count for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(stats, {stat.plan_id: stat.active_count for stat in rebuild_plan_counters()})
+
+    def test_cancel_lapsed_subscription(self):
+        subscription = self.lapse_active_subscription(self.plans[2])
+        self.call('post', reverse('api_cancel_subscription'), 4,
+                  {'subscription_id': subscription.id}, expected_status=400)
+        self.assertEqual(Subscription.objects.get(id=subscription.id).status, 'active')
+
+    def test_subscription_list_page(self):
+        self.client.credentials()
+        response = self.call('get', reverse('subscription-list'), 2)
+        self.assertContains(response, STATUS_COUNTS_NOTE)
+
+    def test_subscription_list_page_deep(self):
+        self.client.credentials()
+        url = reverse('subscription-list')
+        ordered = list(Subscription.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        per_page = settings.PAGINATE_BY
+
+        # follow "Next" for a few pages: one range read each, no rows skipped or repeated
+        page = self.call('get', url, 2).context['page_obj']
+        pages = [page]
+        for _ in range(4):
+            page = self.call('get', f"{url}?after={page.next_cursor}", 1).context['page_obj']
+            pages.append(page)
+        seen = [subscription.id for page in pages for subscription in page.object_list]
+        self.assertEqual(seen, ordered[:5 * per_page])
+        self.assertTrue(page.has_previous and page.has_next)
+
+        # "Previous" goes back to exactly the page before
+        previous = self.call('get', f"{url}?before={page.previous_cursor}", 1).context['page_obj']
+        self.assertEqual([s.id for s in previous.object_list], [s.id for s in pages[-2].object_list])
+
+        # back at the top there is no previous page, a bad cursor gives the first page
+        first = self.call('get', f"{url}?before={pages[1].previous_cursor}", 1).context['page_obj']
+        self.assertEqual([s.id for s in first.object_list], ordered[:per_page])
+        self.assertFalse(first.has_previous)
+        response = self.call('get', f"{url}?after=garbage", 1)
+        self.assertEqual([s.id for s in response.context['page_obj'].object_list], ordered[:per_page])
+        self.assertNotContains(response, 'Last &raquo;')
+
+        # the last page has no "Next"
+        last = Subscription.objects.order_by('-created_at', '-id')[len(ordered) - 2]
+        page = self.call('get', f"{url}?after={encode_keyset_cursor(last)}", 1).context['page_obj']
+        self.assertEqual(([s.id for s in page.object_list], page.has_next), ([ordered[-1]], False))
+
+
+@override_settings(ADMIN_COUNT_LIMIT=150)
+class SubscriptionAdminTests(QueryPlanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'testpass123'))
+
+    def test_changelist_capped_count(self):
+        url = reverse('admin:subscription_subscription_changelist')
+        active = Subscription.objects.effective('active').count()
+        self.assertGreater(active, 200)
+
+        response = self.call('get', f"{url}?status=active", 5)
+        self.assertContains(response, '150+ subscriptions')
+
+        # the cap bounds the count, not the pages: the last page past it is served
+        last_page = -(-active // 100)
+        response = self.call('get', f"{url}?status=active&p={last_page}", 5)
+        self.assertEqual(len(response.context['cl'].result_list), active - (last_page - 1) * 100)
+        self.assertEqual(response.context['cl'].paginator.num_pages, last_page)
+
+        response = self.client.get(f"{url}?status=active&p={last_page + 1}")
+        self.assertRedirects(response, f"{url}?e=1", fetch_redirect_response=False)
+
+    def test_changelist_count_under_cap(self):
+        url = reverse('admin:subscription_subscription_changelist')
+        count = Subscription.objects.filter(user=self.user).count()
+
+        response = self.call('get', f"{url}?q={self.user.username}", 7)
+        self.assertContains(response, f'{count} subscriptions')
+        self.assertNotContains(response, f'{count}+')
+
+
+class PlanRouteTests(QueryPlanTestCase):
+
+    def test_plans_list(self):
+        self.call('get', reverse('api_plans_list'), 2)
+        # catalog in process memory: only the user lookup
+        response = self.call('get', reverse('api_plans_list'), 1)
+        self.assertEqual(response.json()['data']['count'], len(self.plans))
+
+    def test_plans_list_not_modified(self):
+        url = reverse('api_plans_list')
+        response = self.call('get', url, 2)
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_plans_list_changed_catalog(self):
+        url = reverse('api_plans_list')
+        etag = self.call('get', url, 2)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Plan.objects.create(name='Enterprise', price=499.99, duration_days=365)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['count'], len(self.plans) + 1)
+
+    def test_plan_stats(self):
+        response = self.call('get', reverse('api_plan_stats'), 2)
+        totals = sum(row['total_count'] for row in response.json()['data']['data'])
+        self.assertEqual(totals, Subscription.objects.count())
+        # stored-status counts, the response says they can trail the effective status
+        self.assertEqual(response.json()['data']['counts_note'], STATUS_COUNTS_NOTE)
+
+    def test_delete_plan_with_subscriptions(self):
+        plan = self.plans[2]
+        statuses = set(Subscription.objects.filter(plan=plan).values_list('status', flat=True))
+        self.assertEqual(statuses, {'active', 'cancelled', 'expired'})
+
+        # the cascade removes the counters row before the subscriptions
+        plan.delete()
+        self.assertFalse(Subscription.objects.filter(plan_id=plan.id).exists())
+        self.assertFalse(PlanSubscriptionStats.objects.filter(plan_id=plan.id).exists())
+
+        # deleting a single subscription still moves its plan's counters
+        subscription = Subscription.objects.filter(plan=self.plans[0], status='cancelled').first()
+        cancelled = PlanSubscriptionStats.objects.get(plan=self.plans[0]).cancelled_count
+        subscription.delete()
+        self.assertEqual(PlanSubscriptionStats.objects.get(plan=self.plans[0]).cancelled_count, cancelled - 1)
+
+
+class ExchangeRateRouteTests(QueryPlanTestCase):
+
+    def test_exchange_rate(self):
+        response = self.call('get', f"{reverse('api_exchange_rate')}?base=USD&target=BDT", 2)
+        self.assertFalse(response.json()['data']['data']['stale'])
+
+    def test_exchange_rate_cached(self):
+        url = f"{reverse('api_exchange_rate')}?base=EUR&target=GBP"
+        self.call('get', url, 2)
+        # table served from the cache, the log row is buffered: only the user lookup
+        self.call('get', url, 1)
+
+    def test_exchange_rate_log_buffered(self):
+        url = f"{reverse('api_exchange_rate')}?base=EUR&target=GBP"
+        logged = ExchangeRateLog.objects.count()
+        before = timezone.now()
+        for _ in range(3):
+            self.call('get', url, 2)
+        self.assertEqual(ExchangeRateLog.objects.count(), logged)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_rate_log_buffer(), 3)
+        rows = ExchangeRateLog.objects.filter(base_currency='EUR', target_currency='GBP')
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(row.fetched_at >= before for row in rows))
+        self.assertEqual(flush_rate_log_buffer(), 0)
+
+    def test_exchange_rate_history(self):
+        response = self.call('get', reverse('api_exchange_rate_history'), 3)
+        self.assertEqual(response.json()['data']['count'], 10)
+
+    def test_exchange_rate_history_buckets(self):
+        end = timezone.now()
+        start = end - timedelta(days=365)
+        url = reverse('api_exchange_rate_history')
+        response = self.call('get', url, 2, {
+            'base': 'usd', 'target': 'bdt', 'interval': 'day', 'from': start.isoformat(), 'to': end.isoformat()
+        })
+
+        data = response.json()['data']
+        self.assertEqual(data['count'], 366)
+        self.assertEqual(data['interval'], 'day')
+        starts = [bucket['bucket_start'] for bucket in data['data']]
+        self.assertEqual(starts, sorted(starts))
+
+        # interval alone: the default number of buckets up to now
+        response = self.call('get', url, 2, {'interval': 'week'})
+        self.assertEqual(response.json()['data']['count'], settings.EXCHANGE_RATE_HISTORY_DEFAULT_BUCKETS + 1)
+
+    def test_exchange_rate_history_invalid_range(self):
+        url = reverse('api_exchange_rate_history')
+        self.call('get', url, 2, {'interval': 'hour', 'from': '2020-01-01'}, expected_status=400)
+        self.call('get', url, 2, {'from': '2025-02-01', 'to': '2025-01-01'}, expected_status=400)
+        self.call('get', url, 2, {'interval': 'month'}, expected_status=400)
+
+
+class ExchangeRateRetentionTests(QueryPlanTestCase):
+
+    def test_compact_exchange_rate_logs(self):
+        old = timezone.now() - timedelta(days=settings.EXCHANGE_RATE_LOG_RETENTION_DAYS + 3)
+        logs = ExchangeRateLog.objects.bulk_create([
+            ExchangeRateLog(base_currency='USD', target_currency=target, rate=Decimal(100 + i))
+            for i in range(15) for target in ('JPY', 'CNY')
+        ])
+        for i, log in enumerate(logs):
+            ExchangeRateLog.objects.filter(id=log.id).update(fetched_at=old + timedelta(minutes=10 * i))
+        recent = ExchangeRateLog.objects.count() - len(logs)
+
+        reports = []
+        with CaptureQueriesContext(connection) as context:
+            result = compact_exchange_rate_logs(batch_size=7, progress=reports.append)
+        self.check_plans('compact_exchange_rate_logs', [query['sql'] for query in context.captured_queries])
+
+        self.assertEqual((result['compacted_count'], result['total'], result['batches']), (30, 30, 5))
+        self.assertTrue(result['drained'])
+        self.assertEqual([report['compacted_count'] for report in reports], [7, 14, 21, 28, 30])
+        self.assertEqual(ExchangeRateLog.objects.count(), recent)
+
+        for interval in INTERVALS:
+            buckets = ExchangeRateRollup.objects.filter(base_currency='USD', target_currency='JPY', interval=interval)
+            self.assertEqual(sum(bucket.samples for bucket in buckets), 15)
+        week = ExchangeRateRollup.objects.filter(target_currency='CNY', interval='week').order_by('bucket_start')
+        self.assertEqual((week.first().open, week.last().close), (Decimal(100), Decimal(114)))
+
+        # nothing left past the retention
+        self.assertEqual(compact_exchange_rate_logs()['compacted_count'], 0)
+
+    def test_compact_batch_across_many_buckets(self):
+        # one row per hour: a single batch spans thousands of hour / day / week buckets
+        old = timezone.now() - timedelta(days=settings.EXCHANGE_RATE_LOG_RETENTION_DAYS + 1)
+        hours = 2000
+        ExchangeRateLog.objects.bulk_create([
+            ExchangeRateLog(
+                base_currency='USD', target_currency='JPY', rate=Decimal(150 + i % 7),
+                fetched_at=old - timedelta(hours=i),
+            )
+            for i in range(hours)
+        ], batch_size=500)
+
+        result = compact_exchange_rate_logs(batch_size=hours)
+        self.assertEqual((result['compacted_count'], result['batches']), (hours, 1))
+
+        for interval in INTERVALS:
+            buckets = ExchangeRateRollup.objects.filter(base_currency='USD', target_currency='JPY', interval=interval)
+            self.assertEqual(sum(bucket.samples for bucket in buckets), hours)
+        self.assertEqual(
+            ExchangeRateRollup.objects.filter(base_currency='USD', target_currency='JPY', interval='hour').count(), hours
+        )
+
+    def test_compact_configured_pair(self):
+        # USD/BDT buckets come from the snapshots, its log rows are deleted
+        # without being folded in a second time
+        old = timezone.now() - timedelta(days=settings.EXCHANGE_RATE_LOG_RETENTION_DAYS + 3)
+        # only buckets the snapshots account for
+        ExchangeRateRollup.objects.filter(base_currency='USD', target_currency='BDT').delete()
+        snapshot = ExchangeRateSnapshot.objects.create(base_currency='USD', rates={'USD': 1.0, 'BDT': 120.0})
+        ExchangeRateSnapshot.objects.filter(id=snapshot.id).update(fetched_at=old)
+        snapshot.refresh_from_db()
+        record_snapshot_rollups(snapshot)
+
+        log = ExchangeRateLog.objects.create(base_currency='USD', target_currency='BDT', rate=Decimal('120'))
+        ExchangeRateLog.objects.filter(id=log.id).update(fetched_at=old)
+
+        def buckets():
+            return {
+                (rollup.interval, rollup.bucket_start): (rollup.open, rollup.high, rollup.low, rollup.close, rollup.samples)
+                for rollup in ExchangeRateRollup.objects.filter(
+                    base_currency='USD', target_currency='BDT', bucket_start__lte=old
+                ).order_by()
+            }
+
+        before = buckets()
+        self.assertEqual(before[('hour', bucket_start(old, 'hour'))], (Decimal(120),) * 4 + (1,))
+
+        result = compact_exchange_rate_logs()
+        self.assertEqual(result['compacted_count'], 1)
+        self.assertFalse(ExchangeRateLog.objects.filter(id=log.id).exists())
+        self.assertEqual(buckets(), before)
+
+        # and a rebuild from the snapshots gives the same buckets back
+        rebuild_rate_rollups(since=old)
+        self.assertEqual(buckets(), before)
+
+
+def provider_response(payload, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode()
+    response.url = 'https://provider.test/USD'
+    return response
+
+
+PROVIDER_RATES = {'result': 'success', 'rates': {'USD': 1.0, 'BDT': 121.5}}
+
+
+@mock.patch('apps.subscription.rate_provider.time.sleep')
+class RateProviderClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        self.client = RateProviderClient(max_retries=2, backoff=0.25, breaker=self.breaker)
+
+    def test_retry_with_backoff(self, sleep):
+        responses = [requests.ConnectionError('reset'), provider_response({}, 503), provider_response(PROVIDER_RATES)]
+        with mock.patch.object(self.client.session, 'get', side_effect=responses) as get, \
+                mock.patch('apps.subscription.rate_provider.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(self.client.get_rates('USD'), PROVIDER_RATES['rates'])
+
+        self.assertEqual(get.call_count, 3)
+        # full jitter up to backoff * 2 ** attempt
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+    def test_client_error_not_retried(self, sleep):
+        with mock.patch.object(self.client.session, 'get', return_value=provider_response({}, 404)) as get:
+            with self.assertRaises(RateProviderError):
+                self.client.get_rates('USD')
+        self.assertEqual(get.call_count, 1)
+
+    def test_provider_error_result(self, sleep):
+        payload = {'result': 'error', 'error-type': 'unsupported-code'}
+        with mock.patch.object(self.client.session, 'get', return_value=provider_response(payload)) as get:
+            for _ in range(self.breaker.failure_threshold + 1):
+                with self.assertRaises(RateProviderRejectedError):
+                    self.client.get_rates('XXX')
+        # not retried and not counted against the breaker
+        self.assertEqual(get.call_count, self.breaker.failure_threshold + 1)
+        sleep.assert_not_called()
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+        # a trial call answered with an error result closes the breaker
+        self.breaker.state, self.breaker.opened_at = CircuitBreaker.OPEN, time.monotonic() - self.breaker.reset_timeout
+        with mock.patch.object(self.client.session, 'get', return_value=provider_response(payload)):
+            with self.assertRaises(RateProviderRejectedError):
+                self.client.get_rates('XXX')
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_provider_error_result_async(self, sleep):
+        client = AsyncRateProviderClient(max_retries=2, breaker=self.breaker)
+        response = httpx.Response(
+            200, json={'result': 'error', 'error-type': 'unsupported-code'},
+            request=httpx.Request('GET', 'https://provider.test/XXX'),
+        )
+        session = mock.Mock(get=mock.AsyncMock(return_value=response))
+        with mock.patch.object(client, '_get_session', return_value=session), \
+                mock.patch('apps.subscription.rate_provider.asyncio.sleep') as async_sleep:
+            with self.assertRaises(RateProviderRejectedError):
+                asyncio.run(client.get_rates('XXX'))
+        self.assertEqual(session.get.await_count, 1)
+        async_sleep.assert_not_called()
+        self.assertEqual((self.breaker.state, self.breaker.failures), (CircuitBreaker.CLOSED, 0))
+
+    def test_malformed_payload(self, sleep):
+        for payload in (['unexpected'], {'result': 'success', 'rates': ['BDT']}, 'success'):
+            with mock.patch.object(self.client.session, 'get', return_value=provider_response(payload)):
+                with self.assertRaises(RateProviderError):
+                    self.client.get_rates('USD')
+
+    def test_breaker_opens_and_half_opens(self, sleep):
+        with mock.patch.object(self.client.session, 'get', side_effect=requests.Timeout('slow')) as get:
+            for _ in range(2):
+                with self.assertRaises(RateProviderError):
+                    self.client.get_rates('USD')
+            self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+            # open: the provider isn't called at all
+            calls = get.call_count
+            with self.assertRaises(CircuitOpenError):
+                self.client.get_rates('USD')
+            self.assertEqual(get.call_count, calls)
+
+        # past reset_timeout a failed trial call opens it again ...
+        self.breaker.opened_at -= self.breaker.reset_timeout
+        with mock.patch.object(self.client.session, 'get', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(RateProviderError):
+                self.client.get_rates('USD')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        # ... and a successful one closes it
+        self.breaker.opened_at -= self.breaker.reset_timeout
+        with mock.patch.object(self.client.session, 'get', return_value=provider_response(PROVIDER_RATES)):
+            self.assertEqual(self.client.get_rates('USD'), PROVIDER_RATES['rates'])
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_unexpected_error_in_trial_call(self, sleep):
+        self.breaker.state, self.breaker.opened_at = CircuitBreaker.OPEN, time.monotonic() - self.breaker.reset_timeout
+        with mock.patch.object(self.client.session, 'get', side_effect=RuntimeError('bug')):
+            with self.assertRaises(RuntimeError):
+                self.client.get_rates('USD')
+        # not stuck half open
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+
+class RateFallbackTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.provider = RateProviderClient(max_retries=0, breaker=CircuitBreaker())
+        patcher = mock.patch('apps.subscription.utils.get_rate_provider_client', return_value=self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def provider_down(self):
+        return mock.patch.object(self.provider.session, 'get', side_effect=requests.ConnectionError('down'))
+
+    def old_snapshot(self):
+        snapshot = ExchangeRateSnapshot.objects.create(base_currency='USD', rates={'USD': 1.0, 'BDT': 119.0})
+        fetched_at = timezone.now() - timedelta(seconds=settings.EXCHANGE_RATE_CACHE_TTL + 60)
+        ExchangeRateSnapshot.objects.filter(id=snapshot.id).update(fetched_at=fetched_at)
+        return fetched_at
+
+    def test_stale_cache_entry(self):
+        fetched_at = self.old_snapshot()
+        entry = {'base_currency': 'USD', 'rates': {'USD': 1.0, 'BDT': 120.0}, 'fetched_at': fetched_at}
+        store_exchange_rate_entry(entry)
+
+        with self.provider_down() as get:
+            self.assertEqual(get_cached_rate_snapshot(), dict(entry, stale=True))
+        self.assertEqual(get.call_count, 1)
+
+    def test_stale_snapshot(self):
+        fetched_at = self.old_snapshot()
+        with self.provider_down():
+            entry = get_cached_rate_snapshot()
+        self.assertEqual((entry['rates']['BDT'], entry['fetched_at'], entry['stale']), (119.0, fetched_at, True))
+
+    def test_fresh_fetch(self):
+        with mock.patch.object(self.provider.session, 'get', return_value=provider_response(PROVIDER_RATES)):
+            entry = get_cached_rate_snapshot()
+        self.assertEqual(entry['rates'], PROVIDER_RATES['rates'])
+        self.assertFalse(is_stale(entry))
+        self.assertEqual(ExchangeRateSnapshot.objects.count(), 1)
+
+    def test_last_logged_rate(self):
+        ExchangeRateLog.objects.create(base_currency='USD', target_currency='BDT', rate=Decimal('118.5'))
+        with self.provider_down():
+            self.assertIsNone(get_cached_rate_snapshot())
+
+        entry = get_last_logged_rate_entry('USD', 'BDT')
+        self.assertEqual((entry['rates']['BDT'], entry['stale']), (118.5, True))
+        self.assertIsNone(get_last_logged_rate_entry('USD', 'EUR'))
+
+
+class RateLogBufferTests(APITestCase):
+
+    def test_bounded_buffer(self):
+        buffer = LocalRateLogBuffer(max_size=5, batch_size=2, flush_interval=0)
+        now = timezone.now()
+        added = [buffer.add(('USD', 'BDT', Decimal('121.5'), now)) for _ in range(7)]
+        self.assertEqual(added, [True] * 5 + [False] * 2)
+
+        # three INSERTs of at most two rows
+        with self.assertNumQueries(3):
+            self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(ExchangeRateLog.objects.filter(fetched_at=now).count(), 5)
+        self.assertEqual(buffer.dropped, 0)
+
+
+class PeriodicExchangeRateFetchTests(APITestCase):
+
+    def test_workflow(self):
+        workflow = exchange_rate_fetch_workflow(['USD', 'EUR', 'GBP'])
+
+        self.assertEqual([task.task for task in workflow.tasks], [fetch_rate_table.name] * 3)
+        self.assertEqual([task.args for task in workflow.tasks], [('USD',), ('EUR',), ('GBP',)])
+        self.assertEqual(workflow.body.task, record_exchange_rate_fetch_summary.name)
+
+    def test_beat_schedule(self):
+        entry = celery_app.conf.beat_schedule['fetch-exchange-rate-hourly']
+        self.assertEqual(entry['task'], periodic_exchange_rate_fetch.name)
+        self.assertEqual(settings.EXCHANGE_RATE_FETCH_BASES, [settings.EXCHANGE_RATE_PROVIDER_BASE])
+
+    def test_summary_recorded(self):
+        results = [
+            {'status': 'success', 'base_currency': 'USD', 'snapshot_id': 1},
+            {'status': 'error', 'base_currency': 'EUR', 'message': 'Failed to fetch exchange rate from external API'},
+        ]
+        summary = record_exchange_rate_fetch_summary.apply(args=(results, timezone.now().isoformat()))
+
+        self.assertEqual((summary.result['status'], summary.result['failed']), ('partial', ['EUR']))
+        stored = TaskResult.objects.get(task_id=summary.id)
+        self.assertEqual(stored.task_name, record_exchange_rate_fetch_summary.name)
+        self.assertEqual(json.loads(stored.result)['succeeded'], ['USD'])
+
+
+class SubscriptionExpirySweepTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        self.plans = Plan.objects.bulk_create([
+            Plan(name='Monthly', price=9.99, duration_days=30),
+            Plan(name='Yearly', price=99.99, duration_days=365),
+        ])
+        users = User.objects.bulk_create([User(username=f'sweep{i}', email=f'sweep{i}@example.com') for i in range(30)])
+        # lapsed rows share end_dates in pairs, the watermark has to break ties on id
+        self.lapsed = Subscription.objects.bulk_create([
+            Subscription(user=user, plan=self.plans[i % 2], start_date=now - timedelta(days=40),
+                         end_date=now - timedelta(days=10 + i // 2))
+            for i, user in enumerate(users[:23])
+        ])
+        self.kept = Subscription.objects.bulk_create([
+            # still running, cancelled, auto-renewing within the grace period
+            Subscription(user=users[23], plan=self.plans[0], start_date=now, end_date=now + timedelta(days=5)),
+            Subscription(user=users[24], plan=self.plans[0], start_date=now - timedelta(days=40),
+                         end_date=now - timedelta(days=10), status='cancelled'),
+            Subscription(user=users[25], plan=self.plans[1], start_date=now - timedelta(days=30),
+                         end_date=now - timedelta(hours=1), auto_renew=True),
+        ])
+        rebuild_plan_counters()
+
+    def test_beat_schedule(self):
+        # same key as the old daily entry, so the scheduler's row is updated in place
+        entry = celery_app.conf.beat_schedule['update-expired-subscriptions-daily']
+        self.assertEqual((entry['task'], entry['schedule']), (update_expired_subscriptions.name, crontab()))
+
+    def expired_ids(self):
+        return set(Subscription.objects.filter(status='expired').values_list('id', flat=True))
+
+    def test_resume_from_watermark(self):
+        # a clock that ticks once per reading: the run stops after two batches of 5
+        clock = itertools.count()
+        with mock.patch('apps.subscription.sweeper.time.monotonic', side_effect=lambda: next(clock)):
+            first = sweep_expired_subscriptions(batch_size=5, max_seconds=5)
+        self.assertEqual((first['scanned_count'], first['updated_count'], first['drained']), (10, 10, False))
+
+        order = sorted(self.lapsed, key=lambda subscription: (subscription.end_date, subscription.id))
+        self.assertEqual(self.expired_ids(), {subscription.id for subscription in order[:10]})
+        watermark = SweepWatermark.objects.get(name=EXPIRY_SWEEP_NAME)
+        self.assertEqual((watermark.last_end_date, watermark.last_id), (order[9].end_date, order[9].id))
+
+        # a run while another one holds the lock does nothing
+        cache.add(EXPIRY_SWEEP_LOCK_KEY, 'other', 60)
+        self.assertTrue(sweep_expired_subscriptions(batch_size=5)['skipped'])
+        cache.delete(EXPIRY_SWEEP_LOCK_KEY)
+
+        # the next run picks up after the watermark, nothing skipped or repeated
+        second = sweep_expired_subscriptions(batch_size=5)
+        self.assertTrue(second['resumed'])
+        self.assertEqual((second['scanned_count'], second['updated_count'], second['drained']), (13, 13, True))
+        self.assertEqual(self.expired_ids(), {subscription.id for subscription in self.lapsed})
+        self.assertFalse(Subscription.objects.filter(id__in=[s.id for s in self.kept], status='expired').exists())
+
+        # drained: the watermark is reset, the next pass starts from the oldest row
+        watermark.refresh_from_db()
+        self.assertEqual((watermark.last_end_date, watermark.last_id), (None, 0))
+        third = sweep_expired_subscriptions(batch_size=5)
+        self.assertEqual((third['resumed'], third['scanned_count']), (False, 0))
+
+        stats = {stat.plan_id: (stat.active_count, stat.cancelled_count, stat.expired_count)
+                 for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(stats, {
+            stat.plan_id: (stat.active_count, stat.cancelled_count, stat.expired_count)
+            for stat in rebuild_plan_counters()
+        })
+
+
+class SubscriptionRenewalTests(APITestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.plans = Plan.objects.bulk_create([
+            Plan(name='Monthly', price=9.99, duration_days=30),
+            Plan(name='Yearly', price=99.99, duration_days=365),
+        ])
+        users = User.objects.bulk_create([User(username=f'renew{i}', email=f'renew{i}@example.com') for i in range(40)])
+        self.due = Subscription.objects.bulk_create([
+            Subscription(user=user, plan=self.plans[i % 2], start_date=now - timedelta(days=30),
+                         end_date=now + timedelta(hours=i % 12 - 6), auto_renew=True)
+            for i, user in enumerate(users[:30])
+        ])
+        self.not_due = Subscription.objects.bulk_create([
+            # ending after the window, no auto-renew, lapsed beyond the grace period
+            Subscription(user=users[30], plan=self.plans[0], start_date=now, end_date=now + timedelta(days=10), auto_renew=True),
+            Subscription(user=users[31], plan=self.plans[0], start_date=now, end_date=now + timedelta(hours=1)),
+            Subscription(user=users[32], plan=self.plans[0], start_date=now - timedelta(days=30),
+                         end_date=now - timedelta(days=10), auto_renew=True),
+        ])
+        rebuild_plan_counters()
+        invalidate_plan_catalog()
+
+    def test_partitions(self):
+        since, until = renewal_window()
+        due, max_id, ranges = renewal_partitions(since, until, 4)
+
+        self.assertEqual(due, len(self.due))
+        self.assertEqual(max_id, max(subscription.id for subscription in self.due))
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0][0], min(subscription.user_id for subscription in self.due))
+        self.assertEqual(ranges[-1][1], max(subscription.user_id for subscription in self.due) + 1)
+        self.assertTrue(all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:])))
+
+    def test_renew_partition(self):
+        since, until = renewal_window()
+        due, max_id, ranges = renewal_partitions(since, until, 1)
+
+        # the plan catalog, then per batch the ids, and lock, UPDATE, INSERT and
+        # a counter update per plan inside a savepoint; the last read finds nothing
+        with self.assertNumQueries(1 + 4 * 8 + 1):
+            result = renew_partition(since, until, *ranges[0], max_id, batch_size=8)
+        self.assertEqual((result['renewed_count'], result['batches'], result['drained']), (30, 4, True))
+
+        for predecessor in self.due:
+            successor = Subscription.objects.get(user_id=predecessor.user_id, status='active')
+            self.assertEqual(successor.start_date, predecessor.end_date)
+            self.assertEqual(successor.end_date - successor.start_date, timedelta(days=predecessor.plan.duration_days))
+            self.assertTrue(successor.auto_renew)
+        self.assertEqual(Subscription.objects.filter(id__in=[s.id for s in self.due], status='expired').count(), 30)
+        self.assertFalse(Subscription.objects.filter(id__in=[s.id for s in self.not_due]).exclude(status='active').exists())
+
+        # renewed rows are no longer due, a second run has nothing to do
+        self.assertEqual(renew_partition(since, until, *ranges[0], max_id)['renewed_count'], 0)
+        stats = {stat.plan_id: (stat.active_count, stat.expired_count) for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(stats, {
+            stat.plan_id: (stat.active_count, stat.expired_count) for stat in rebuild_plan_counters()
+        })
+
+    def test_renew_plan_missing_from_catalog(self):
+        # a plan created after this process loaded its catalog copy
+        catalog = get_plan_catalog()
+        plan = Plan.objects.create(name='Weekly', price=2.99, duration_days=7)
+        now = timezone.now()
+        user = User.objects.create_user('renew_new_plan', 'renew_new_plan@example.com', 'testpass123')
+        predecessor = Subscription.objects.create(
+            user=user, plan=plan, start_date=now - timedelta(days=7), end_date=now + timedelta(hours=1), auto_renew=True
+        )
+        self.assertIsNone(catalog.get(plan.id))
+
+        since, until = renewal_window()
+        _, max_id, _ = renewal_partitions(since, until, 1)
+        renewed, _ = renew_batch(since, until, user.id, user.id + 1, max_id, user.id, 10, catalog)
+
+        self.assertEqual(renewed, 1)
+        successor = Subscription.objects.get(user=user, status='active')
+        self.assertEqual(successor.end_date, predecessor.end_date + timedelta(days=7))
+
+    def test_renew_due_subscriptions(self):
+        result = renew_due_subscriptions.apply(kwargs={'partitions': 3}).result
+        self.assertEqual((result['status'], result['due_count'], result['partitions']), ('dispatched', 30, 3))
+
+        summary = json.loads(TaskResult.objects.get(task_id=result['summary_task_id']).result)
+        self.assertEqual((summary['status'], summary['renewed_count']), ('success', 30))
+        self.assertEqual(Subscription.objects.filter(status='active', auto_renew=True).count(), 32)
+
+
+class GenerateLoadDataTests(APITestCase):
+
+    def test_generate_load_data(self):
+        Plan.objects.bulk_create([
+            Plan(name='Monthly', price=9.99, duration_days=30),
+            Plan(name='Yearly', price=99.99, duration_days=365),
+        ])
+        call_command('generate_load_data', subscriptions=2000, users=300, rate_logs=500,
+                     chunk_size=128, batch_size=200, stdout=StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='load').count(), 300)
+        self.assertEqual(Subscription.objects.count(), 2000)
+        self.assertEqual(ExchangeRateLog.objects.count(), 500)
+
+        # every status shows up, never two active rows for one user and plan
+        statuses = set(Subscription.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, {'active', 'cancelled', 'expired'})
+        self.assertFalse(Subscription.objects.filter(status='active', end_date__lt=timezone.now()).exists())
+        self.assertFalse(Subscription.objects.filter(created_at__gt=F('start_date')).exists())
+        stats = {stat.plan_id: stat.active_count for stat in PlanSubscriptionStats.objects.all()}
+        self.assertEqual(sum(stats.values()), Subscription.objects.filter(status='active').count())
+
+        user = User.objects.filter(username__startswith='load').first()
+        self.assertTrue(user.check_password('testpass123'))
+
+
+class RateRollupTests(APITestCase):
+
+    def test_record_rates(self):
+        monday = datetime(2025, 3, 3, 10, 15, tzinfo=dt_timezone.utc)
+        samples = [
+            (monday, Decimal('120.5')),
+            (monday - timedelta(minutes=10), Decimal('119.0')),
+            (monday + timedelta(minutes=30), Decimal('122.25')),
+            (monday + timedelta(hours=5), Decimal('121.0')),
+        ]
+        for fetched_at, rate in samples:
+            # insert, lock, update, plus the savepoint pair
+            with self.assertNumQueries(5):
+                record_rates({('USD', 'BDT'): rate}, fetched_at)
+
+        hour = ExchangeRateRollup.objects.get(interval='hour', bucket_start=monday.replace(minute=0))
+        self.assertEqual((hour.open, hour.high, hour.low, hour.close, hour.samples),
+                         (Decimal('119.0'), Decimal('122.25'), Decimal('119.0'), Decimal('122.25'), 3))
+
+        week = ExchangeRateRollup.objects.get(interval='week')
+        self.assertEqual(week.bucket_start, datetime(2025, 3, 3, tzinfo=dt_timezone.utc))
+        self.assertEqual((week.open, week.close, week.samples), (Decimal('119.0'), Decimal('121.0'), 4))
+        self.assertEqual(ExchangeRateRollup.objects.filter(interval='hour').count(), 2)
+
+    def test_rebuild_matches_incremental(self):
+        rng = random.Random(7)
+        fetched_at = timezone.now() - timedelta(days=20)
+        snapshots = []
+        for _ in range(100):
+            fetched_at += timedelta(minutes=rng.randint(30, 300))
+            snapshots.append(ExchangeRateSnapshot.objects.create(
+                base_currency='USD', rates={'USD': 1.0, 'BDT': 115 + rng.random() * 10, 'EUR': 0.9}
+            ))
+            ExchangeRateSnapshot.objects.filter(id=snapshots[-1].id).update(fetched_at=fetched_at)
+            snapshots[-1].fetched_at = fetched_at
+        for snapshot in reversed(snapshots):
+            record_rates({('USD', 'BDT'): Decimal(str(snapshot.rates['BDT'])).quantize(Decimal('0.000001'))},
+                         snapshot.fetched_at)
+
+        def buckets():
+            return list(ExchangeRateRollup.objects.filter(base_currency='USD', target_currency='BDT').values_list(
+                'interval', 'bucket_start', 'open', 'high', 'low', 'close', 'samples'
+            ).order_by('interval', 'bucket_start'))
+
+        incremental = buckets()
+        rebuild_rate_rollups()
+        self.assertEqual(buckets(), incremental)
+        self.assertEqual(sum(row[-1] for row in incremental if row[0] == 'week'), 100)
+
+
+def reload_subscription_urls():
+    # the URLconf picks sync or async views when it is imported
+    importlib.reload(importlib.import_module('apps.subscription.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+@contextmanager
+def async_api_views():
+    try:
+        with override_settings(ASYNC_API_VIEWS=True):
+            reload_subscription_urls()
+            yield
+    finally:
+        reload_subscription_urls()
+
+
+class ChallengelessJWTAuthentication(ReadOnlyClaimsJWTAuthentication):
+    # no WWW-Authenticate challenge, a failed authentication becomes a 403
+    def authenticate_header(self, request):
+        return None
+
+
+class AsyncAPIViewTests(QueryPlanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    async def get_both(self, url, data=None, **headers):
+        # the sync view's response, then the async one's for the same request
+        self.client.credentials(**{f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+        sync_response = await sync_to_async(self.client.get)(url, data)
+        with async_api_views():
+            async_response = await self.async_client.get(url, data, headers=headers)
+        return sync_response, async_response
+
+    async def test_async_views_routed(self):
+        with async_api_views():
+            self.assertIs(resolve(reverse('api_plans_list')).func.view_class, AsyncPlansListAPIView)
+            self.assertIs(resolve(reverse('api_exchange_rate')).func.view_class, AsyncExchangeRateAPIView)
+        self.assertIs(resolve(reverse('api_plans_list')).func.view_class, PlansListAPIView)
+
+    async def test_unauthenticated(self):
+        for url in (reverse('api_plans_list'), reverse('api_exchange_rate'), reverse('api_exchange_rate_history')):
+            sync_response, async_response = await self.get_both(url)
+            self.assertEqual((async_response.status_code, sync_response.status_code), (401, 401))
+            self.assertEqual(async_response.json(), sync_response.json())
+            self.assertEqual(async_response['WWW-Authenticate'], sync_response['WWW-Authenticate'])
+
+            sync_response, async_response = await self.get_both(url, Authorization='Bearer not-a-token')
+            self.assertEqual((async_response.status_code, sync_response.status_code), (401, 401))
+            self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_forbidden_without_challenge(self):
+        view_kwargs = {'authentication_classes': [ChallengelessJWTAuthentication]}
+        sync_response = PlansListAPIView.as_view(**view_kwargs)(APIRequestFactory().get('/api/plans/'))
+        sync_response.render()
+        async_response = await AsyncPlansListAPIView.as_view(**view_kwargs)(AsyncRequestFactory().get('/api/plans/'))
+
+        self.assertEqual((async_response.status_code, sync_response.status_code), (403, 403))
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+        self.assertFalse(async_response.has_header('WWW-Authenticate'))
+
+    async def test_plans_list(self):
+        url = reverse('api_plans_list')
+        sync_response, async_response = await self.get_both(url, **self.headers)
+        self.assertEqual((async_response.status_code, sync_response.status_code), (200, 200))
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(async_response['ETag'], sync_response['ETag'])
+        self.assertEqual(async_response['Cache-Control'], sync_response['Cache-Control'])
+
+        # revalidation answers 304 without a body, like the sync view
+        sync_response, async_response = await self.get_both(url, **self.headers, **{'If-None-Match': sync_response['ETag']})
+        self.assertEqual((async_response.status_code, sync_response.status_code), (304, 304))
+        self.assertEqual((async_response.content, async_response['ETag']), (b'', sync_response['ETag']))
+
+        sync_response, async_response = await self.get_both(
+            url, **self.headers, **{'If-Modified-Since': sync_response['Last-Modified']}
+        )
+        self.assertEqual((async_response.status_code, sync_response.status_code), (304, 304))
+
+    async def test_exchange_rate(self):
+        url = reverse('api_exchange_rate')
+        for params, expected_status in (({'base': 'usd', 'target': 'bdt'}, 200), ({'base': 'usd', 'target': 'xyz'}, 400)):
+            sync_response, async_response = await self.get_both(url, params, **self.headers)
+            self.assertEqual((async_response.status_code, sync_response.status_code), (expected_status,) * 2)
+            sync_body, async_body = sync_response.json(), async_response.json()
+            if expected_status == 200:
+                # seconds since the fetch, read at different moments
+                for body in (sync_body, async_body):
+                    body['data']['data'].pop('cache_age')
+            self.assertEqual(async_body, sync_body)
+
+    async def test_exchange_rate_history(self):
+        url = reverse('api_exchange_rate_history')
+        end = timezone.now()
+        for params in ({}, {'interval': 'day', 'from': (end - timedelta(days=30)).isoformat(), 'to': end.isoformat()},
+                       {'interval': 'month'}):
+            sync_response, async_response = await self.get_both(url, params, **self.headers)
+            self.assertEqual(async_response.status_code, sync_response.status_code)
+            self.assertEqual(async_response.json(), sync_response.json())
+
+
+class AuthRouteTests(QueryPlanTestCase):
+
+    def test_login(self):
+        self.client.credentials()
+        self.call('post', reverse('api_token_obtain_pair'), 2,
+                  {'username': self.user.username, 'password': 'testpass123'})
+
+    def test_refresh(self):
+        self.client.credentials()
+        self.call('post', reverse('api_token_refresh'), 1,
+                  {'refresh': str(RefreshToken.for_user(self.user))})
+
+    def test_refresh_rotation_revokes_used_token(self):
+        self.client.credentials()
+        refresh = str(RefreshToken.for_user(self.user))
+
+        rotated = self.call('post', reverse('api_token_refresh'), 1, {'refresh': refresh})
+        self.call('post', reverse('api_token_refresh'), 1, {'refresh': refresh}, expected_status=401)
+        self.call('post', reverse('api_token_refresh'), 1, {'refresh': rotated.json()['data']['refresh']})
+
+    def test_cached_user(self):
+        get_plan_catalog()
+        self.call('get', reverse('api_plan_stats'), 2)
+
+        # the user comes from the cache, the stats query is all that's left
+        self.call('get', reverse('api_plan_stats'), 1)
+
+    def test_cached_user_dropped_on_change(self):
+        self.call('get', reverse('api_plan_stats'), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.call('get', reverse('api_plan_stats'), 2, expected_status=401)
+
+    @override_settings(JWT_TRUST_CLAIMS_ON_READS=True)
+    def test_claims_on_reads(self):
+        # no user lookup for reads, the listing query only
+        response = self.call('get', reverse('api_user_subscriptions'), 1)
+        self.assertEqual(len(response.json()['data']['data']), self.subscriptions_per_user)
+
+        # writes still load the user
+        self.call('post', reverse('api_cancel_subscription'), 4, {'subscription_id': 0}, expected_status=400)
+        self.assertEqual(cache.get(user_cache_key(self.user.id))['id'], self.user.id)
+
+    def test_cached_user_fields(self):
+        self.call('get', reverse('api_plan_stats'), 2)
+
+        # the shared cache holds no password hash and no profile fields
+        entry = cache.get(user_cache_key(self.user.id))
+        self.assertEqual(set(entry), {'id', 'username', 'is_active', 'is_staff', 'is_superuser', 'revoke_fingerprint'})
+        self.assertNotIn(self.user.password, entry.values())
+
+        # a cached user still gets the full user in responses
+        plan = self.plans[0]
+        Subscription.objects.filter(user=self.user, plan=plan, status='active').update(status='cancelled')
+        response = self.call('post', reverse('api_subscribe'), 6, {'plan_id': plan.id}, expected_status=201)
+        self.assertEqual(response.json()['data']['data']['user']['email'], self.user.email)
+
+    @mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True)
+    def test_cached_user_password_changed(self):
+        url = reverse('api_plan_stats')
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.call('get', url, 2)
+        self.call('get', url, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('changed123')
+            self.user.save()
+        self.call('get', url, 2, expected_status=401)
+
+        # a new token is cached again, the old one is refused by the fingerprint alone
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.call('get', url, 2)
+        self.call('get', url, 1)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.call('get', url, 0, expected_status=401)
+
+
+class TokenBlacklistTests(SimpleTestCase):
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(10000, 0.01)
+        added = [uuid.uuid4().hex for _ in range(10000)]
+        for jti in added:
+            bloom.add(jti)
+
+        self.assertTrue(all(jti in bloom for jti in added))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 200)
+
+    def test_cache_blacklist(self):
+        blacklist = CacheTokenBlacklist()
+        exp = int(time.time()) + 60
+        blacklist.add('revoked', exp)
+        blacklist.add('expired', exp - 120)
+
+        self.assertIn('revoked', blacklist)
+        self.assertNotIn('expired', blacklist)
+        self.assertNotIn('other', blacklist)
+
+    @skipUnless(settings.TEST_REDIS_URL, "TEST_REDIS_URL is not set")
+    def test_redis_blacklist(self):
+        import redis
+
+        client = redis.Redis.from_url(settings.TEST_REDIS_URL)
+        client.delete(RedisTokenBlacklist.log_key, RedisTokenBlacklist.last_key)
+        # two processes, the second one syncs on every check
+        first = RedisTokenBlacklist(client, 1000, 0.01, sync_interval=60, retention=3600)
+        second = RedisTokenBlacklist(client, 1000, 0.01, sync_interval=0, retention=3600)
+        self.assertNotIn('a', first)
+        self.assertNotIn('a', second)
+
+        first.add('a', int(time.time()) + 60)
+        self.assertIn('a', first)
+        self.assertIn('a', second)
+        self.assertNotIn('b', second)
+
+        # a new process builds its filter from the log
+        self.assertIn('a', RedisTokenBlacklist(client, 1000, 0.01, sync_interval=60, retention=3600))
+        client.delete(blacklist_key('a'), RedisTokenBlacklist.log_key, RedisTokenBlacklist.last_key)
+
+
+@skipIf(orjson is None, "orjson is not installed")
+class RendererTests(SimpleTestCase):
+    payload = {
+        'message': 'Rates retrieved',
+        'rate': 121.5,
+        'rates': [1e-05, 2.5e-05, 0.0001, 1e16, 123456789012345678.0, -0.0, 3.0],
+        'price': Decimal('9.99'),
+        'fetched_at': datetime(2025, 8, 3, 10, 15, 30, 123456, tzinfo=dt_timezone.utc),
+        'day': datetime(2025, 8, 3).date(),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'text': 'd\u00e9j\u00e0 vu \u2028 \u2029 </script>',
+        'big': 2 ** 70,
+        'nested': {'data': [{'a': None, 'b': True}]},
+    }
+
+    def render(self, data, status_code=200, use_orjson=True):
+        class FakeResponse:
+            pass
+        response = FakeResponse()
+        response.status_code = status_code
+        with override_settings(RESPOND_USE_ORJSON=use_orjson):
+            return StandardizedJSONRenderer().render(data, renderer_context={'response': response})
+
+    def test_orjson_output_matches_stdlib(self):
+        for status_code in (200, 400, 404):
+            self.assertEqual(
+                self.render(dict(self.payload), status_code),
+                self.render(dict(self.payload), status_code, use_orjson=False)
+            )
+
+    def test_orjson_used_for_plain_payloads(self):
+        payload = {'message': 'ok', 'data': [{'id': 1, 'rate': 121.5, 'name': 'Basic'}]}
+        self.assertEqual(self.render(payload), self.render(payload, use_orjson=False))
+
+    def test_view_data_is_not_mutated(self):
+        data = {'message': 'ok', 'data': [1, 2]}
+        self.render(data)
+        self.assertEqual(data, {'message': 'ok', 'data': [1, 2]})
+
+    def test_already_standardized_passes_through(self):
+        for key in ('status_code', 'statusCode'):
+            data = {'success': True, key: 200, 'message': 'ok', 'Data': [1]}
+            self.assertEqual(self.render(data, use_orjson=False), JSONRenderer().render(data))
@@ -1,20 +1,39 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from .views.api_view import (
-    SubscribeAPIView, UserSubscriptionsAPIView, CancelSubscriptionAPIView,
-    ExchangeRateAPIView, PlansListAPIView, ExchangeRateHistoryAPIView
+    SubscribeAPIView, BulkSubscribeAPIView, UserSubscriptionsAPIView, SubscriptionExportAPIView,
+    CancelSubscriptionAPIView, BulkCancelSubscriptionAPIView,
+    ExchangeRateAPIView, PlansListAPIView, ExchangeRateHistoryAPIView, PlanStatsAPIView
+)
+from .views.async_view import (
+    AsyncExchangeRateAPIView, AsyncPlansListAPIView, AsyncExchangeRateHistoryAPIView
 )
 from .views.mvt_view import subscription_list
 
+# I/O bound endpoints are served by async views when running under ASGI ==>
+if settings.ASYNC_API_VIEWS:
+    exchange_rate_view = AsyncExchangeRateAPIView.as_view()
+    plans_list_view = AsyncPlansListAPIView.as_view()
+    exchange_rate_history_view = AsyncExchangeRateHistoryAPIView.as_view()
+else:
+    exchange_rate_view = ExchangeRateAPIView.as_view()
+    plans_list_view = PlansListAPIView.as_view()
+    exchange_rate_history_view = ExchangeRateHistoryAPIView.as_view()
+
 urlpatterns = [
     path('subscribe/', SubscribeAPIView.as_view(), name='api_subscribe'),
+    path('subscribe/bulk/', BulkSubscribeAPIView.as_view(), name='api_bulk_subscribe'),
     path('subscriptions/', UserSubscriptionsAPIView.as_view(), name='api_user_subscriptions'),
+    path('subscriptions/export/', SubscriptionExportAPIView.as_view(), name='api_subscriptions_export'),
     path('cancel/', CancelSubscriptionAPIView.as_view(), name='api_cancel_subscription'),
-    path('exchange-rate/', ExchangeRateAPIView.as_view(), name='api_exchange_rate'),
+    path('cancel/bulk/', BulkCancelSubscriptionAPIView.as_view(), name='api_bulk_cancel_subscription'),
+    path('exchange-rate/', exchange_rate_view, name='api_exchange_rate'),
     
-    path('plans/', PlansListAPIView.as_view(), name='api_plans_list'),
-    path('exchange-rate/history/', ExchangeRateHistoryAPIView.as_view(), name='api_exchange_rate_history'),
+    path('plans/', plans_list_view, name='api_plans_list'),
+    path('plans/stats/', PlanStatsAPIView.as_view(), name='api_plan_stats'),
+    path('exchange-rate/history/', exchange_rate_history_view, name='api_exchange_rate_history'),
     
     path('auth/login/', TokenObtainPairView.as_view(), name='api_token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='api_token_refresh'),
@@ -1,29 +1,293 @@
-import requests
+import asyncio
+import logging
+import time
+import uuid
+from datetime import timedelta
 
-def convert_usd_to_bdt(usd_amount):
-    url = f"https://open.er-api.com/v6/latest/USD"
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import ExchangeRateLog, ExchangeRateSnapshot, cross_rate
+from .rollups import record_snapshot_rollups
+from .rate_provider import (
+    CircuitOpenError, RateProviderError, get_async_rate_provider_client, get_rate_provider_client
+)
+
+logger = logging.getLogger(__name__)
 
+
+def fetch_provider_rates(base_currency):
+    # full rate table for base_currency from the external API, or None
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+        return get_rate_provider_client().get_rates(base_currency)
+    except CircuitOpenError:
+        logger.warning(f"Rate provider circuit open, skipping fetch for {base_currency}")
+        return None
+    except RateProviderError as e:
+        logger.error(str(e))
+        return None
 
-        if data.get("result") != "success":
-            print("API returned error:", data)
-            return None
 
-        rates = data.get("rates")
-        if not rates or "BDT" not in rates:
-            print("BDT rate not found in API response.")
+def convert_usd_to_bdt(usd_amount):
+    rates = fetch_provider_rates("USD")
+    if not rates or "BDT" not in rates:
+        print("BDT rate not found in API response.")
+        return None
+
+    bdt_rate = rates["BDT"]
+    bdt = bdt_rate * usd_amount
+    return bdt, bdt_rate
+
+
+# ============ Rate snapshots ============>>
+
+def snapshot_entry(snapshot):
+    return {
+        'base_currency': snapshot.base_currency,
+        'rates': snapshot.rates,
+        'fetched_at': snapshot.fetched_at,
+    }
+
+
+def fetch_rate_snapshot(base_currency=None):
+    # one provider call, the whole table is persisted in a single row
+    base_currency = base_currency or settings.EXCHANGE_RATE_PROVIDER_BASE
+    rates = fetch_provider_rates(base_currency)
+    if rates is None:
+        return None
+
+    snapshot = ExchangeRateSnapshot.objects.create(
+        base_currency=base_currency,
+        rates=rates
+    )
+    # history buckets are updated with every stored table
+    record_snapshot_rollups(snapshot)
+    return snapshot
+
+
+def latest_snapshot_queryset(base_currency=None, max_age=None):
+    base_currency = base_currency or settings.EXCHANGE_RATE_PROVIDER_BASE
+    queryset = ExchangeRateSnapshot.objects.filter(base_currency=base_currency)
+    if max_age is not None:
+        queryset = queryset.filter(fetched_at__gte=timezone.now() - timedelta(seconds=max_age))
+    return queryset.order_by('-fetched_at')
+
+
+def get_latest_snapshot(base_currency=None, max_age=None):
+    return latest_snapshot_queryset(base_currency, max_age).first()
+
+
+def get_entry_rate(entry, base_currency, target_currency):
+    return cross_rate(entry['rates'], base_currency, target_currency)
+
+
+# ============ Cached exchange rates ============>>
+
+def exchange_rate_cache_key(base_currency):
+    return f"exchange_rate_snapshot:{base_currency}"
+
+
+def get_cache_age(entry):
+    return max(0, int((timezone.now() - entry['fetched_at']).total_seconds()))
+
+
+def is_stale(entry):
+    return entry.get('stale', False) or get_cache_age(entry) >= settings.EXCHANGE_RATE_CACHE_TTL
+
+
+def exchange_rate_entry_ttl(entry):
+    # kept past the TTL so it can still be served as stale
+    return settings.EXCHANGE_RATE_CACHE_TTL + settings.EXCHANGE_RATE_STALE_TTL - get_cache_age(entry)
+
+
+def store_exchange_rate_entry(entry):
+    ttl = exchange_rate_entry_ttl(entry)
+    if ttl > 0:
+        cache.set(exchange_rate_cache_key(entry['base_currency']), entry, ttl)
+
+
+def load_exchange_rate_entry(base_currency):
+    # a snapshot written by the periodic task is reused before calling the API
+    snapshot = get_latest_snapshot(base_currency, max_age=settings.EXCHANGE_RATE_CACHE_TTL)
+    if snapshot is None:
+        snapshot = fetch_rate_snapshot(base_currency)
+    if snapshot is None:
+        return None
+    return snapshot_entry(snapshot)
+
+
+def get_stale_entry(base_currency, entry=None):
+    # provider unavailable: last known table, from cache or the database
+    if entry is None:
+        snapshot = get_latest_snapshot(base_currency)
+        if snapshot is None:
             return None
+        entry = snapshot_entry(snapshot)
+        store_exchange_rate_entry(entry)
+    return dict(entry, stale=True)
+
+
+def get_cached_rate_snapshot(base_currency=None):
+    """
+    Serve the provider rate table from the shared cache. Once the TTL is over
+    only one worker (the one holding the fetch lock) revalidates it, the
+    others keep serving the expired table as stale, or wait for the result
+    when there is nothing cached at all. If the provider can't be reached the
+    last known table is returned marked as stale.
+    """
+    base_currency = base_currency or settings.EXCHANGE_RATE_PROVIDER_BASE
+    key = exchange_rate_cache_key(base_currency)
+    entry = cache.get(key)
+    if entry is not None and not is_stale(entry):
+        return entry
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.EXCHANGE_RATE_LOCK_WAIT
+
+    while True:
+        if cache.add(lock_key, token, settings.EXCHANGE_RATE_LOCK_TIMEOUT):
+            try:
+                # someone may have refreshed it while we were acquiring the lock
+                current = cache.get(key)
+                if current is not None and not is_stale(current):
+                    return current
+
+                fresh = load_exchange_rate_entry(base_currency)
+                if fresh is not None:
+                    store_exchange_rate_entry(fresh)
+                    return fresh
+                return get_stale_entry(base_currency, current)
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        if entry is not None:
+            # another worker is revalidating, serve what we have meanwhile
+            return dict(entry, stale=True)
+
+        time.sleep(settings.EXCHANGE_RATE_LOCK_POLL_INTERVAL)
+
+        entry = cache.get(key)
+        if entry is not None and not is_stale(entry):
+            return entry
+        if time.monotonic() >= deadline:
+            return get_stale_entry(base_currency, entry)
+
 
-        bdt_rate = rates["BDT"]
-        bdt = bdt_rate * usd_amount
-        return bdt, bdt_rate
+def last_logged_rate_queryset(base_currency, target_currency):
+    return ExchangeRateLog.objects.filter(
+        base_currency=base_currency,
+        target_currency=target_currency
+    ).order_by('-fetched_at')
 
-    except requests.RequestException as e:
-        print("Network error:", e)
+
+def logged_rate_entry(log_entry, base_currency, target_currency):
+    if log_entry is None:
+        return None
+
+    return {
+        'base_currency': base_currency,
+        'rates': {base_currency: 1.0, target_currency: float(log_entry.rate)},
+        'fetched_at': log_entry.fetched_at,
+        'stale': True,
+    }
+
+
+def get_last_logged_rate_entry(base_currency, target_currency):
+    # no snapshot at all, fall back to the last rate served for this pair
+    log_entry = last_logged_rate_queryset(base_currency, target_currency).first()
+    return logged_rate_entry(log_entry, base_currency, target_currency)
+
+
+# ============ Async variants (used by the ASGI views) ============>>
+
+async def afetch_rate_snapshot(base_currency=None):
+    base_currency = base_currency or settings.EXCHANGE_RATE_PROVIDER_BASE
+    try:
+        rates = await get_async_rate_provider_client().get_rates(base_currency)
+    except CircuitOpenError:
+        logger.warning(f"Rate provider circuit open, skipping fetch for {base_currency}")
         return None
-    except Exception as e:
-        print("Unexpected error:", e)
+    except RateProviderError as e:
+        logger.error(str(e))
         return None
+
+    snapshot = await ExchangeRateSnapshot.objects.acreate(
+        base_currency=base_currency,
+        rates=rates
+    )
+    await sync_to_async(record_snapshot_rollups)(snapshot)
+    return snapshot
+
+
+async def astore_exchange_rate_entry(entry):
+    ttl = exchange_rate_entry_ttl(entry)
+    if ttl > 0:
+        await cache.aset(exchange_rate_cache_key(entry['base_currency']), entry, ttl)
+
+
+async def aload_exchange_rate_entry(base_currency):
+    snapshot = await latest_snapshot_queryset(base_currency, max_age=settings.EXCHANGE_RATE_CACHE_TTL).afirst()
+    if snapshot is None:
+        snapshot = await afetch_rate_snapshot(base_currency)
+    if snapshot is None:
+        return None
+    return snapshot_entry(snapshot)
+
+
+async def aget_stale_entry(base_currency, entry=None):
+    if entry is None:
+        snapshot = await latest_snapshot_queryset(base_currency).afirst()
+        if snapshot is None:
+            return None
+        entry = snapshot_entry(snapshot)
+        await astore_exchange_rate_entry(entry)
+    return dict(entry, stale=True)
+
+
+async def aget_cached_rate_snapshot(base_currency=None):
+    # same single-flight / stale-while-revalidate flow as get_cached_rate_snapshot
+    base_currency = base_currency or settings.EXCHANGE_RATE_PROVIDER_BASE
+    key = exchange_rate_cache_key(base_currency)
+    entry = await cache.aget(key)
+    if entry is not None and not is_stale(entry):
+        return entry
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.EXCHANGE_RATE_LOCK_WAIT
+
+    while True:
+        if await cache.aadd(lock_key, token, settings.EXCHANGE_RATE_LOCK_TIMEOUT):
+            try:
+                current = await cache.aget(key)
+                if current is not None and not is_stale(current):
+                    return current
+
+                fresh = await aload_exchange_rate_entry(base_currency)
+                if fresh is not None:
+                    await astore_exchange_rate_entry(fresh)
+                    return fresh
+                return await aget_stale_entry(base_currency, current)
+            finally:
+                if await cache.aget(lock_key) == token:
+                    await cache.adelete(lock_key)
+
+        if entry is not None:
+            return dict(entry, stale=True)
+
+        await asyncio.sleep(settings.EXCHANGE_RATE_LOCK_POLL_INTERVAL)
+
+        entry = await cache.aget(key)
+        if entry is not None and not is_stale(entry):
+            return entry
+        if time.monotonic() >= deadline:
+            return await aget_stale_entry(base_currency, entry)
+
+
+async def aget_last_logged_rate_entry(base_currency, target_currency):
+    log_entry = await last_logged_rate_queryset(base_currency, target_currency).afirst()
+    return logged_rate_entry(log_entry, base_currency, target_currency)
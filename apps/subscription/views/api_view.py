@@ -3,18 +3,58 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView, CreateAPIView
-from django.db import transaction
+from django.conf import settings
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
+from respond.utils import streaming_list_response
+from django_filters.rest_framework import DjangoFilterBackend
 
-from ..models import Plan, Subscription, ExchangeRateLog
+from ..authentication import ReadOnlyClaimsJWTAuthentication
+from ..models import Plan, Subscription, ExchangeRateLog, PlanSubscriptionStats
 from ..serializers import (
     PlanSerializer, SubscriptionSerializer, CreateSubscriptionSerializer,
     CancelSubscriptionSerializer, ExchangeRateRequestSerializer,
-    ExchangeRateResponseSerializer, ExchangeRateLogSerializer
+    ExchangeRateResponseSerializer, ExchangeRateLogSerializer, PlanStatsSerializer,
+    SubscriptionListSerializer, BulkSubscribeSerializer, BulkSubscribeResultSerializer,
+    ActiveSubscriptionConflict, BulkCancelSubscriptionSerializer,
+    ExchangeRateHistoryRequestSerializer, ExchangeRateRollupSerializer
 )
-from ..utils import convert_usd_to_bdt
+from ..catalog import get_plan_catalog
+from ..counters import STATUS_COUNTS_NOTE
+from ..filters import SubscriptionFilter
+from ..log_buffer import record_rate_observation
+from ..pagination import SubscriptionCursorPagination
+from ..provisioning import bulk_subscribe
+from ..rollups import rollup_history_queryset
+from ..utils import (
+    get_cached_rate_snapshot, get_last_logged_rate_entry, get_entry_rate,
+    get_cache_age, is_stale
+)
+
+
+def set_catalog_headers(response, catalog):
+    # clients and proxies revalidate with the ETag instead of refetching
+    response['ETag'] = catalog.etag
+    response['Last-Modified'] = http_date(catalog.last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def rollup_history_data(query, rollups):
+    # query is the history request serializer's data, dates rendered like the buckets
+    return {
+        'message': 'Exchange rate history retrieved successfully',
+        'base_currency': query['base'],
+        'target_currency': query['target'],
+        'interval': query['interval'],
+        'from': query['from'],
+        'to': query['to'],
+        'count': len(rollups),
+        'data': ExchangeRateRollupSerializer(rollups, many=True).data
+    }
 
 
 class SubscribeAPIView(CreateAPIView):
@@ -27,7 +67,8 @@ class SubscribeAPIView(CreateAPIView):
         responses={
             201: SubscriptionSerializer,
             400: "Bad Request - Validation errors",
-            401: "Unauthorized - Invalid or missing JWT token"
+            401: "Unauthorized - Invalid or missing JWT token",
+            409: "Conflict - Already an active subscription for this plan"
         }
     )
     def post(self, request, *args, **kwargs):
@@ -35,15 +76,20 @@ class SubscribeAPIView(CreateAPIView):
         
         if serializer.is_valid():
             try:
-                with transaction.atomic():
-                    subscription = serializer.save()
-                    response_serializer = SubscriptionSerializer(subscription)
-                    
-                    return Response({
-                        'message': 'Subscription created successfully',
-                        'data': response_serializer.data
-                    }, status=status.HTTP_201_CREATED)
-                    
+                # the serializer's insert is its own transaction ==>
+                subscription = serializer.save()
+                response_serializer = SubscriptionSerializer(subscription)
+                
+                return Response({
+                    'message': 'Subscription created successfully',
+                    'data': response_serializer.data
+                }, status=status.HTTP_201_CREATED)
+                
+            except ActiveSubscriptionConflict as e:
+                return Response({
+                    'message': 'Validation failed',
+                    'errors': {'plan_id': [str(e.detail)]}
+                }, status=status.HTTP_409_CONFLICT)
             except Exception as e:
                 return Response({
                     'message': f'Failed to create subscription: {str(e)}'
@@ -55,34 +101,111 @@ class SubscribeAPIView(CreateAPIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkSubscribeAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    
+    @extend_schema(
+        summary="Subscribe users to plans in bulk",
+        description="Seat provisioning: create active subscriptions for a list of "
+                    "(user_id, plan_id) items. Items are checked and created independently, "
+                    "the response has one result per item in request order.",
+        request=BulkSubscribeSerializer,
+        responses={
+            201: BulkSubscribeResultSerializer(many=True),
+            200: BulkSubscribeResultSerializer(many=True),
+            400: "Bad Request - Validation errors",
+            401: "Unauthorized - Invalid or missing JWT token",
+            403: "Forbidden - Staff only"
+        }
+    )
+    def post(self, request):
+        serializer = BulkSubscribeSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response({
+                'message': 'Validation failed',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = bulk_subscribe(serializer.validated_data['items'])
+        created = sum(1 for result in results if result['status'] == 'created')
+        
+        return Response({
+            'message': f'{created} of {len(results)} subscriptions created',
+            'created': created,
+            'failed': len(results) - created,
+            'data': results
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
 class UserSubscriptionsAPIView(ListAPIView):
     serializer_class = SubscriptionSerializer
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SubscriptionCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = SubscriptionFilter
     
     def get_queryset(self):
-        return Subscription.objects.filter(
-            user=self.request.user
-        ).select_related('plan', 'user').order_by('-created_at')
+        # ordering comes from the cursor paginator ==>
+        return Subscription.objects.filter(user_id=self.request.user.id)
     
     @extend_schema(
         summary="Get user's subscriptions",
-        description="List all subscriptions for the authenticated user",
+        description="List the authenticated user's subscriptions, newest first. "
+                    "Cursor paginated: follow the `next` / `previous` links.",
         responses={
             200: SubscriptionSerializer(many=True),
             401: "Unauthorized - Invalid or missing JWT token"
         }
     )
     def get(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        # plain .values() rows through the listing serializer, same JSON as
+        # SubscriptionSerializer without the per-row field machinery ==>
+        queryset = SubscriptionListSerializer.get_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        serializer = SubscriptionListSerializer(page)
         
         return Response({
             'message': 'Subscriptions retrieved successfully',
-            'count': queryset.count(),
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
             'data': serializer.data
         })
 
 
+class SubscriptionExportAPIView(ListAPIView):
+    serializer_class = SubscriptionSerializer
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = SubscriptionFilter
+    
+    def get_queryset(self):
+        return Subscription.objects.filter(user_id=self.request.user.id).order_by('-created_at', '-id')
+    
+    @extend_schema(
+        summary="Export user's subscriptions",
+        description="Every subscription of the authenticated user, newest first, in one "
+                    "streamed response. Takes the same filters as the subscriptions list.",
+        responses={
+            200: SubscriptionSerializer(many=True),
+            401: "Unauthorized - Invalid or missing JWT token"
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        # rows are read in chunks and written as they are serialized ==>
+        queryset = SubscriptionListSerializer.get_values(self.filter_queryset(self.get_queryset()))
+        serializer = SubscriptionListSerializer(queryset.iterator(chunk_size=settings.SUBSCRIPTION_EXPORT_CHUNK_SIZE))
+        
+        return streaming_list_response(
+            serializer.iter_data(),
+            message='Subscriptions exported successfully',
+            chunk_size=settings.SUBSCRIPTION_EXPORT_CHUNK_SIZE
+        )
+
+
 class CancelSubscriptionAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
@@ -105,19 +228,24 @@ class CancelSubscriptionAPIView(APIView):
         
         if serializer.is_valid():
             try:
-                with transaction.atomic():
-                    subscription = serializer.save()
-                    response_serializer = SubscriptionSerializer(subscription)
-                    
-                    return Response({
-                        'message': 'Subscription cancelled successfully',
-                        'data': response_serializer.data
-                    })
-                    
+                subscription = serializer.save()
             except Exception as e:
                 return Response({
                     'message': f'Failed to cancel subscription: {str(e)}'
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            # no active row matched the conditional update ==>
+            if subscription is None:
+                return Response({
+                    'message': 'Validation failed',
+                    'errors': {'subscription_id': [serializer.not_found_message]}
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            response_serializer = SubscriptionSerializer(subscription)
+            return Response({
+                'message': 'Subscription cancelled successfully',
+                'data': response_serializer.data
+            })
         
         return Response({
             'message': 'Validation failed',
@@ -125,12 +253,50 @@ class CancelSubscriptionAPIView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkCancelSubscriptionAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @extend_schema(
+        summary="Cancel subscriptions in bulk",
+        description="Cancel many of the authenticated user's active subscriptions in one "
+                    "statement. Ids that are not active or not the user's are listed in `failed`.",
+        request=BulkCancelSubscriptionSerializer,
+        responses={
+            200: "Cancelled and failed subscription ids",
+            400: "Bad Request - Validation errors",
+            401: "Unauthorized - Invalid or missing JWT token"
+        }
+    )
+    def post(self, request):
+        serializer = BulkCancelSubscriptionSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        
+        if not serializer.is_valid():
+            return Response({
+                'message': 'Validation failed',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        cancelled, failed = serializer.save()
+        
+        return Response({
+            'message': f'{len(cancelled)} subscriptions cancelled',
+            'data': {
+                'cancelled': cancelled,
+                'failed': failed
+            }
+        })
+
+
 class ExchangeRateAPIView(APIView):
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     @extend_schema(
         summary="Get exchange rate",
-        description="Fetch current exchange rate and store in log",
+        description="Get current exchange rate (served from a shared cache, refetched once the TTL expires) and store in log. When the provider is unavailable the last known rate is returned with stale=true",
         parameters=[
             OpenApiParameter(
                 name='base',
@@ -168,40 +334,46 @@ class ExchangeRateAPIView(APIView):
         target_currency = serializer.validated_data['target']
         
         try:
-            if base_currency == 'USD' and target_currency == 'BDT':
-                result = convert_usd_to_bdt(1.0)
-                
-                if result is None:
-                    return Response({
-                        'success': False,
-                        'message': 'Failed to fetch exchange rate from external API'
-                    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-                
-                bdt_amount, rate = result
-                
-                log_entry = ExchangeRateLog.objects.create(
-                    base_currency=base_currency,
-                    target_currency=target_currency,
-                    rate=rate
-                )
-                
-                response_data = {
-                    'base_currency': base_currency,
-                    'target_currency': target_currency,
-                    'rate': rate,
-                    'fetched_at': log_entry.fetched_at,
-                    'message': 'Exchange rate fetched successfully'
-                }
-                
+            entry = get_cached_rate_snapshot()
+            
+            if entry is None:
+                entry = get_last_logged_rate_entry(base_currency, target_currency)
+            
+            if entry is None:
                 return Response({
-                    'message': 'Exchange rate retrieved successfully',
-                    'data': response_data
-                })
+                    'success': False,
+                    'message': 'Failed to fetch exchange rate from external API'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            
+            # any pair is a cross rate of the latest provider snapshot ==>
+            rate = get_entry_rate(entry, base_currency, target_currency)
             
-            else:
+            if rate is None:
                 return Response({
-                    'message': f'Currency pair {base_currency}/{target_currency} not supported yet'
+                    'message': f'Currency pair {base_currency}/{target_currency} not supported'
                 }, status=status.HTTP_400_BAD_REQUEST)
+            
+            stale = is_stale(entry)
+            
+            # stale rates would repeat old values in the history, only fresh ones are recorded ==>
+            # buffered, written in batches off the request path
+            if not stale:
+                record_rate_observation(base_currency, target_currency, rate)
+            
+            response_data = {
+                'base_currency': base_currency,
+                'target_currency': target_currency,
+                'rate': rate,
+                'fetched_at': entry['fetched_at'],
+                'cache_age': get_cache_age(entry),
+                'stale': stale,
+                'message': 'Exchange rate fetched successfully'
+            }
+            
+            return Response({
+                'message': 'Exchange rate retrieved successfully',
+                'data': response_data
+            })
                 
         except Exception as e:
             return Response({
@@ -210,31 +382,73 @@ class ExchangeRateAPIView(APIView):
 
 
 class PlansListAPIView(ListAPIView):
-    queryset = Plan.objects.all()
     serializer_class = PlanSerializer
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     @extend_schema(
         summary="Get available plans",
-        description="List all subscription plans available for purchase",
+        description="List all subscription plans available for purchase. "
+                    "Send `If-None-Match` / `If-Modified-Since` to get a 304 "
+                    "while the catalog is unchanged.",
         responses={
             200: PlanSerializer(many=True),
+            304: "Not Modified - Catalog unchanged since the given ETag / date",
             401: "Unauthorized - Invalid or missing JWT token"
         }
     )
     def get(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        catalog = get_plan_catalog()
         
-        return Response({
+        not_modified = get_conditional_response(
+            request, etag=catalog.etag, last_modified=catalog.last_modified.timestamp()
+        )
+        if not_modified is not None:
+            return set_catalog_headers(not_modified, catalog)
+        
+        response = Response({
             'message': 'Plans retrieved successfully',
-            'count': queryset.count(),
+            'count': len(catalog),
+            'data': catalog.data
+        })
+        return set_catalog_headers(response, catalog)
+
+
+class PlanStatsAPIView(ListAPIView):
+    serializer_class = PlanStatsSerializer
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    
+    def get_queryset(self):
+        # one row per plan from the counters table ==>
+        return PlanSubscriptionStats.objects.select_related('plan').order_by('plan__price')
+    
+    @extend_schema(
+        summary="Get per-plan subscription stats",
+        description="Active, cancelled and expired subscription counts for every plan, from the counters "
+                    "table. They follow the stored status and trail the effective one by up to the "
+                    "expiry sweep's lag (see `counts_note`)",
+        responses={
+            200: PlanStatsSerializer(many=True),
+            401: "Unauthorized - Invalid or missing JWT token"
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        stats = list(self.get_queryset())
+        serializer = self.get_serializer(stats, many=True)
+        
+        return Response({
+            'message': 'Plan stats retrieved successfully',
+            'count': len(stats),
+            'counts_note': STATUS_COUNTS_NOTE,
             'data': serializer.data
         })
 
 
 class ExchangeRateHistoryAPIView(ListAPIView):
     serializer_class = ExchangeRateLogSerializer
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
@@ -248,7 +462,8 @@ class ExchangeRateHistoryAPIView(ListAPIView):
     
     @extend_schema(
         summary="Get exchange rate history",
-        description="Get historical exchange rate data",
+        description="Get historical exchange rate data. Without interval / from / to the last 10 logged rates, "
+                    "with any of them OHLC buckets from the rollup tables, oldest first",
         parameters=[
             OpenApiParameter(
                 name='base',
@@ -264,13 +479,49 @@ class ExchangeRateHistoryAPIView(ListAPIView):
                 description='Target currency code (default: BDT)',
                 default='BDT'
             ),
+            OpenApiParameter(
+                name='interval',
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description='Bucket size: hour, day or week (default: day)',
+                enum=['hour', 'day', 'week']
+            ),
+            OpenApiParameter(
+                name='from',
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description='Range start, ISO 8601 date or datetime (default: 90 buckets before to)'
+            ),
+            OpenApiParameter(
+                name='to',
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description='Range end, ISO 8601 date or datetime (default: now)'
+            ),
         ],
         responses={
             200: ExchangeRateLogSerializer(many=True),
+            400: "Bad Request - Invalid parameters or too many buckets",
             401: "Unauthorized - Invalid or missing JWT token"
         }
     )
     def get(self, request, *args, **kwargs):
+        params = ExchangeRateHistoryRequestSerializer(data=request.query_params)
+
+        if not params.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Invalid parameters',
+                'errors': params.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        query = params.validated_data
+        if 'interval' in query:
+            rollups = list(rollup_history_queryset(
+                query['base'], query['target'], query['interval'], query['from'], query['to']
+            ))
+            return Response(rollup_history_data(params.data, rollups))
+
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         
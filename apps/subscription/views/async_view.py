@@ -0,0 +1,198 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+
+from respond.renderers import StandardizedJSONRenderer
+from ..authentication import ReadOnlyClaimsJWTAuthentication
+from ..catalog import get_plan_catalog
+from ..log_buffer import arecord_rate_observation
+from ..models import ExchangeRateLog
+from ..rollups import rollup_history_queryset
+from ..serializers import (
+    ExchangeRateRequestSerializer, ExchangeRateLogSerializer, ExchangeRateHistoryRequestSerializer
+)
+from ..utils import (
+    aget_cached_rate_snapshot, aget_last_logged_rate_entry, get_entry_rate,
+    get_cache_age, is_stale
+)
+from .api_view import rollup_history_data, set_catalog_headers
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView for the ASGI serving mode.
+    Authenticates with the configured DRF authentication classes and renders
+    through the standardized renderer, so responses match the sync views.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    renderer_class = StandardizedJSONRenderer
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in self.http_method_names or not hasattr(self, request.method.lower()):
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        try:
+            user = await self.authenticate(request)
+        except exceptions.APIException as e:
+            return self.exception_response(request, e)
+
+        if user is None:
+            return self.exception_response(request, exceptions.NotAuthenticated())
+
+        request.user = user
+        handler = getattr(self, request.method.lower())
+        return await handler(request, *args, **kwargs)
+
+    async def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            authenticator = authentication_class()
+            result = await sync_to_async(authenticator.authenticate)(request)
+            if result is not None:
+                return result[0]
+        return None
+
+    def exception_response(self, request, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        status_code = exc.status_code
+
+        # like APIView.handle_exception: a 401 needs a WWW-Authenticate
+        # challenge, without one it is sent as a 403
+        auth_header = None
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            if self.authentication_classes:
+                auth_header = self.authentication_classes[0]().authenticate_header(request)
+            if not auth_header:
+                status_code = status.HTTP_403_FORBIDDEN
+
+        response = self.render(data, status_code)
+        if auth_header:
+            response['WWW-Authenticate'] = auth_header
+        return response
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        response = HttpResponse(status=status_code, content_type='application/json')
+        response.content = self.renderer_class().render(data, 'application/json', {'response': response})
+        return response
+
+
+class AsyncExchangeRateAPIView(AsyncAPIView):
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
+
+    async def get(self, request):
+        serializer = ExchangeRateRequestSerializer(data=request.GET)
+
+        if not serializer.is_valid():
+            return self.render({
+                'success': False,
+                'message': 'Invalid parameters',
+                'errors': serializer.errors
+            }, status.HTTP_400_BAD_REQUEST)
+
+        base_currency = serializer.validated_data['base']
+        target_currency = serializer.validated_data['target']
+
+        try:
+            entry = await aget_cached_rate_snapshot()
+
+            if entry is None:
+                entry = await aget_last_logged_rate_entry(base_currency, target_currency)
+
+            if entry is None:
+                return self.render({
+                    'success': False,
+                    'message': 'Failed to fetch exchange rate from external API'
+                }, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            rate = get_entry_rate(entry, base_currency, target_currency)
+
+            if rate is None:
+                return self.render({
+                    'message': f'Currency pair {base_currency}/{target_currency} not supported'
+                }, status.HTTP_400_BAD_REQUEST)
+
+            stale = is_stale(entry)
+
+            if not stale:
+                await arecord_rate_observation(base_currency, target_currency, rate)
+
+            response_data = {
+                'base_currency': base_currency,
+                'target_currency': target_currency,
+                'rate': rate,
+                'fetched_at': entry['fetched_at'],
+                'cache_age': get_cache_age(entry),
+                'stale': stale,
+                'message': 'Exchange rate fetched successfully'
+            }
+
+            return self.render({
+                'message': 'Exchange rate retrieved successfully',
+                'data': response_data
+            })
+
+        except Exception as e:
+            return self.render({
+                'message': f'Error fetching exchange rate: {str(e)}'
+            }, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class AsyncPlansListAPIView(AsyncAPIView):
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
+
+    async def get(self, request):
+        catalog = await sync_to_async(get_plan_catalog)()
+
+        not_modified = get_conditional_response(
+            request, etag=catalog.etag, last_modified=catalog.last_modified.timestamp()
+        )
+        if not_modified is not None:
+            return set_catalog_headers(not_modified, catalog)
+
+        response = self.render({
+            'message': 'Plans retrieved successfully',
+            'count': len(catalog),
+            'data': catalog.data
+        })
+        return set_catalog_headers(response, catalog)
+
+
+class AsyncExchangeRateHistoryAPIView(AsyncAPIView):
+    authentication_classes = [ReadOnlyClaimsJWTAuthentication]
+
+    async def get(self, request):
+        params = ExchangeRateHistoryRequestSerializer(data=request.GET)
+
+        if not params.is_valid():
+            return self.render({
+                'success': False,
+                'message': 'Invalid parameters',
+                'errors': params.errors
+            }, status.HTTP_400_BAD_REQUEST)
+
+        query = params.validated_data
+        if 'interval' in query:
+            queryset = rollup_history_queryset(
+                query['base'], query['target'], query['interval'], query['from'], query['to']
+            )
+            rollups = [rollup async for rollup in queryset]
+            return self.render(rollup_history_data(params.data, rollups))
+
+        base = request.GET.get('base', 'USD')
+        target = request.GET.get('target', 'BDT')
+
+        queryset = ExchangeRateLog.objects.filter(
+            base_currency=base.upper(),
+            target_currency=target.upper()
+        ).order_by('-fetched_at')[:10]  # Last 10 entries
+
+        logs = [log async for log in queryset]
+        serializer = ExchangeRateLogSerializer(logs, many=True)
+
+        return self.render({
+            'message': 'Exchange rate history retrieved successfully',
+            'count': len(logs),
+            'data': serializer.data
+        })
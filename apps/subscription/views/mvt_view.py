@@ -1,19 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render
-from django.contrib.auth.models import User
+from ..counters import STATUS_COUNTS_NOTE, get_status_totals
 from ..models import Subscription
+from ..pagination import KeysetPage
+
+STATUS_COUNTS_CACHE_KEY = 'subscription_status_counts'
+
 
 def subscription_list(request):
-    subscriptions = Subscription.objects.select_related('user', 'plan').all()
-    
-    active_subscriptions = subscriptions.filter(status='active')
-    cancelled_subscriptions = subscriptions.filter(status='cancelled')
-    expired_subscriptions = subscriptions.filter(status='expired')
+    # counters are summed from the per-plan counters table in O(plans) ==>
+    status_counts = cache.get_or_set(
+        STATUS_COUNTS_CACHE_KEY, get_status_totals, settings.SUBSCRIPTION_COUNTERS_CACHE_TTL
+    )
+    total_count = sum(status_counts.values())
+
+    # badges show the status as of now, lapsed rows as expired ==>
+    subscriptions = Subscription.objects.select_related('user', 'plan').with_effective_status()
+    # keyset pages: any depth costs one index range read, no OFFSET ==>
+    page_obj = KeysetPage(
+        subscriptions, settings.PAGINATE_BY, after=request.GET.get('after'), before=request.GET.get('before')
+    )
     
     context = {
-        'subscriptions': subscriptions,
-        'active_subscriptions': active_subscriptions,
-        'cancelled_subscriptions': cancelled_subscriptions,
-        'expired_subscriptions': expired_subscriptions,
+        'page_obj': page_obj,
+        'subscriptions': page_obj.object_list,
+        'total_count': total_count,
+        'active_count': status_counts['active'],
+        'cancelled_count': status_counts['cancelled'],
+        'expired_count': status_counts['expired'],
+        # the totals trail the badges in the list, say so next to them ==>
+        'counts_note': STATUS_COUNTS_NOTE,
         'title': 'All Subscriptions'
     }
     
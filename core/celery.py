@@ -25,13 +25,26 @@ from celery.schedules import crontab
 
 app.conf.beat_schedule = {
     'fetch-exchange-rate-hourly': {
-        'task': 'apps.subscription.tasks.fetch_exchange_rate',
+        'task': 'apps.subscription.tasks.periodic_exchange_rate_fetch',
         'schedule': crontab(minute=0),
-        'args': ('USD', 'BDT'),
     },
+    # the key predates the every-minute schedule; DatabaseScheduler matches
+    # its PeriodicTask row by name, so renaming it would leave the old row running
     'update-expired-subscriptions-daily': {
         'task': 'apps.subscription.tasks.update_expired_subscriptions',
-        'schedule': crontab(hour=0, minute=0),
+        'schedule': crontab(),
+    },
+    'flush-exchange-rate-logs': {
+        'task': 'apps.subscription.tasks.flush_exchange_rate_logs',
+        'schedule': max(settings.EXCHANGE_RATE_LOG_FLUSH_INTERVAL, 1),
+    },
+    'renew-due-subscriptions-nightly': {
+        'task': 'apps.subscription.tasks.renew_due_subscriptions',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'compact-exchange-rate-logs-nightly': {
+        'task': 'apps.subscription.tasks.compact_exchange_rate_logs',
+        'schedule': crontab(hour=3, minute=30),
     },
 }
 
@@ -108,4 +108,6 @@ TAGGIT_CASE_INSENSITIVE = True
 from .credentials.stripe import *
 from .configurations.restapi import *
 from .configurations.celery_settings import *
+from .configurations.cache_settings import *
+from .configurations.exchange_rate import *
 # << --- cors, credentials, and configurations --- >>
\ No newline at end of file
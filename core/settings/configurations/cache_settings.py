@@ -0,0 +1,33 @@
+import os
+
+# ============ Cache Configuration ============>>
+# Shared cache (Redis) when REDIS_URL is provided, otherwise a per-process
+# local memory cache which is good enough for development.
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', os.environ.get('REDIS_URL', ''))
+
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'subscription',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'subscription-local',
+        }
+    }
+
+
+
+# Subscription dashboard status counters (seconds)
+SUBSCRIPTION_COUNTERS_CACHE_TTL = int(os.environ.get('SUBSCRIPTION_COUNTERS_CACHE_TTL', 60))
+
+# Plan catalog: per-process copy revalidated against the shared version stamp
+# every PLAN_CATALOG_LOCAL_TTL seconds; catalogs in the shared cache are keyed
+# by version so they never need invalidating (None = no expiry)
+PLAN_CATALOG_LOCAL_TTL = int(os.environ.get('PLAN_CATALOG_LOCAL_TTL', 5))
+PLAN_CATALOG_CACHE_TTL = None
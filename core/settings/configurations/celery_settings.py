@@ -40,7 +40,14 @@ CELERY_TASK_QUEUES = (
 CELERY_TASK_ROUTES = {
     'apps.subscription.tasks.fetch_exchange_rate': {'queue': 'exchange_rates'},
     'apps.subscription.tasks.periodic_exchange_rate_fetch': {'queue': 'exchange_rates'},
+    'apps.subscription.tasks.fetch_rate_table': {'queue': 'exchange_rates'},
+    'apps.subscription.tasks.record_exchange_rate_fetch_summary': {'queue': 'exchange_rates'},
     'apps.subscription.tasks.update_expired_subscriptions': {'queue': 'subscriptions'},
+    'apps.subscription.tasks.renew_due_subscriptions': {'queue': 'subscriptions'},
+    'apps.subscription.tasks.renew_subscription_partition': {'queue': 'subscriptions'},
+    'apps.subscription.tasks.record_subscription_renewal_summary': {'queue': 'subscriptions'},
+    'apps.subscription.tasks.compact_exchange_rate_logs': {'queue': 'exchange_rates'},
+    'apps.subscription.tasks.flush_exchange_rate_logs': {'queue': 'exchange_rates'},
 }
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
@@ -59,4 +66,29 @@ CELERY_TASK_ANNOTATIONS = {
     'apps.subscription.tasks.fetch_exchange_rate': {
         'rate_limit': '10/m',
     },
-} 
\ No newline at end of file
+    'apps.subscription.tasks.fetch_rate_table': {
+        'rate_limit': '10/m',
+    },
+}
+
+# ============ Subscription expiry sweeper ============>>
+# runs every minute, each run stops well before the next one is due
+SUBSCRIPTION_EXPIRY_BATCH_SIZE = int(os.environ.get('SUBSCRIPTION_EXPIRY_BATCH_SIZE', 1000))
+SUBSCRIPTION_EXPIRY_MAX_SECONDS = int(os.environ.get('SUBSCRIPTION_EXPIRY_MAX_SECONDS', 45)) 
+# ============ Subscription auto-renewal ============>>
+# nightly: auto-renew subscriptions ending before the next run, or lapsed
+# within the grace period, are renewed by user id range in parallel on the
+# subscriptions queue, one partition per task
+SUBSCRIPTION_RENEWAL_LEAD_HOURS = int(os.environ.get('SUBSCRIPTION_RENEWAL_LEAD_HOURS', 24))
+SUBSCRIPTION_RENEWAL_GRACE_HOURS = int(os.environ.get('SUBSCRIPTION_RENEWAL_GRACE_HOURS', 72))
+SUBSCRIPTION_RENEWAL_PARTITIONS = int(os.environ.get('SUBSCRIPTION_RENEWAL_PARTITIONS', 16))
+SUBSCRIPTION_RENEWAL_BATCH_SIZE = int(os.environ.get('SUBSCRIPTION_RENEWAL_BATCH_SIZE', 1000))
+SUBSCRIPTION_RENEWAL_MAX_SECONDS = int(os.environ.get('SUBSCRIPTION_RENEWAL_MAX_SECONDS', 20 * 60))
+# ============ Exchange rate log retention ============>>
+# raw log rows older than the retention are folded into the rate rollups and
+# deleted, in short batches, by a nightly run that stops before the soft time limit
+EXCHANGE_RATE_LOG_RETENTION_DAYS = int(os.environ.get('EXCHANGE_RATE_LOG_RETENTION_DAYS', 30))
+EXCHANGE_RATE_LOG_COMPACT_BATCH_SIZE = int(os.environ.get('EXCHANGE_RATE_LOG_COMPACT_BATCH_SIZE', 2000))
+EXCHANGE_RATE_LOG_COMPACT_MAX_SECONDS = int(os.environ.get('EXCHANGE_RATE_LOG_COMPACT_MAX_SECONDS', 20 * 60))
+# pause between batches (seconds), gives replicas and other writers room
+EXCHANGE_RATE_LOG_COMPACT_PAUSE = float(os.environ.get('EXCHANGE_RATE_LOG_COMPACT_PAUSE', 0))
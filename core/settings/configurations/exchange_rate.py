@@ -0,0 +1,74 @@
+import os
+
+# ============ Exchange Rate Provider ============>>
+# open.er-api.com returns the full rate table for one base currency per call,
+# any other pair is derived from it as a cross rate
+EXCHANGE_RATE_API_URL = os.environ.get('EXCHANGE_RATE_API_URL', 'https://open.er-api.com/v6/latest/{base}')
+EXCHANGE_RATE_PROVIDER_BASE = os.environ.get('EXCHANGE_RATE_PROVIDER_BASE', 'USD')
+
+# Rate tables fetched in parallel by periodic_exchange_rate_fetch (comma separated).
+# Reads, rollups and cross rates only use the provider base table, extra bases
+# are stored snapshots for their own sake
+EXCHANGE_RATE_FETCH_BASES = [
+    base.strip().upper()
+    for base in os.environ.get('EXCHANGE_RATE_FETCH_BASES', EXCHANGE_RATE_PROVIDER_BASE).split(',')
+    if base.strip()
+]
+
+# Pooled client: timeouts (seconds), bounded retries with jittered backoff
+EXCHANGE_RATE_CONNECT_TIMEOUT = float(os.environ.get('EXCHANGE_RATE_CONNECT_TIMEOUT', 2))
+EXCHANGE_RATE_READ_TIMEOUT = float(os.environ.get('EXCHANGE_RATE_READ_TIMEOUT', 4))
+EXCHANGE_RATE_MAX_RETRIES = int(os.environ.get('EXCHANGE_RATE_MAX_RETRIES', 2))
+EXCHANGE_RATE_RETRY_BACKOFF = float(os.environ.get('EXCHANGE_RATE_RETRY_BACKOFF', 0.25))
+EXCHANGE_RATE_POOL_SIZE = int(os.environ.get('EXCHANGE_RATE_POOL_SIZE', 10))
+
+# Circuit breaker: consecutive failures before opening, seconds before a trial call
+EXCHANGE_RATE_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('EXCHANGE_RATE_BREAKER_FAILURE_THRESHOLD', 5))
+EXCHANGE_RATE_BREAKER_RESET_TIMEOUT = int(os.environ.get('EXCHANGE_RATE_BREAKER_RESET_TIMEOUT', 30))
+
+
+# ============ Exchange Rate Cache ============>>
+# How long (seconds) a fetched rate table is served from cache before refetching
+EXCHANGE_RATE_CACHE_TTL = int(os.environ.get('EXCHANGE_RATE_CACHE_TTL', 10 * 60))
+
+# Expired tables are kept this long (seconds) and served as stale while one
+# worker revalidates or while the provider is unavailable
+EXCHANGE_RATE_STALE_TTL = int(os.environ.get('EXCHANGE_RATE_STALE_TTL', 24 * 60 * 60))
+
+# Single-flight fetch lock: max time the fetching worker holds the lock, and how
+# long the other workers wait for its result before giving up
+EXCHANGE_RATE_LOCK_TIMEOUT = int(os.environ.get('EXCHANGE_RATE_LOCK_TIMEOUT', 20))
+EXCHANGE_RATE_LOCK_WAIT = float(os.environ.get('EXCHANGE_RATE_LOCK_WAIT', 6))
+EXCHANGE_RATE_LOCK_POLL_INTERVAL = float(os.environ.get('EXCHANGE_RATE_LOCK_POLL_INTERVAL', 0.05))
+
+
+# ============ Exchange Rate Rollups ============>>
+# Pairs folded into the hour / day / week OHLC buckets on every stored snapshot
+# (comma separated BASE/TARGET). After adding one, backfill it from the stored
+# snapshots with `python manage.py rebuild_rate_rollups`
+EXCHANGE_RATE_ROLLUP_PAIRS = [
+    tuple(pair.strip().upper().split('/'))
+    for pair in os.environ.get('EXCHANGE_RATE_ROLLUP_PAIRS', 'USD/BDT,USD/EUR,USD/GBP,EUR/BDT').split(',')
+    if pair.strip()
+]
+
+# History requests: buckets returned when no `from` is given, and the most a
+# single request may ask for
+EXCHANGE_RATE_HISTORY_DEFAULT_BUCKETS = int(os.environ.get('EXCHANGE_RATE_HISTORY_DEFAULT_BUCKETS', 90))
+EXCHANGE_RATE_HISTORY_MAX_BUCKETS = int(os.environ.get('EXCHANGE_RATE_HISTORY_MAX_BUCKETS', 1000))
+
+
+# ============ Exchange Rate Log Buffer ============>>
+# Rates served by the API are logged write-behind: buffered, then written with
+# bulk_create in batches. In a Redis list shared by every process
+# (EXCHANGE_RATE_LOG_BUFFER_REDIS_URL, defaults to the cache Redis) drained by
+# the flush_exchange_rate_logs task, or without Redis in a per-process queue
+# written by a background thread and at exit. Observations past
+# EXCHANGE_RATE_LOG_BUFFER_SIZE are dropped until the next flush.
+EXCHANGE_RATE_LOG_BUFFER_REDIS_URL = os.environ.get(
+    'EXCHANGE_RATE_LOG_BUFFER_REDIS_URL', os.environ.get('REDIS_CACHE_URL', os.environ.get('REDIS_URL', ''))
+)
+EXCHANGE_RATE_LOG_BUFFER_SIZE = int(os.environ.get('EXCHANGE_RATE_LOG_BUFFER_SIZE', 100000))
+EXCHANGE_RATE_LOG_FLUSH_BATCH_SIZE = int(os.environ.get('EXCHANGE_RATE_LOG_FLUSH_BATCH_SIZE', 1000))
+# seconds between flushes (the beat schedule, or the local flusher thread; 0 = flush() only)
+EXCHANGE_RATE_LOG_FLUSH_INTERVAL = float(os.environ.get('EXCHANGE_RATE_LOG_FLUSH_INTERVAL', 5))
@@ -6,7 +6,7 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'INSECURE-DEFAULT')
 # ============ Django REST Framework Configuration ===========>>
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.subscription.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -25,6 +25,15 @@ REST_FRAMEWORK = {
 }
 
 
+# Serve the I/O bound endpoints (exchange rate, plans, history) with async
+# views, enable it when running under ASGI (uvicorn)
+ASYNC_API_VIEWS = os.getenv('ASYNC_API_VIEWS', 'False').lower() in ('true', '1', 't')
+
+# Render API responses with orjson when it is installed (same bytes as the
+# stdlib encoder, just faster); set to False to always use the stdlib
+RESPOND_USE_ORJSON = os.getenv('RESPOND_USE_ORJSON', 'True').lower() in ('true', '1', 't')
+
+
 # ============== JWT Configuration ===============>>
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -50,10 +59,28 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_REFRESH_SERIALIZER': 'apps.subscription.authentication.BlacklistTokenRefreshSerializer',
 
     'JTI_CLAIM': 'jti',
 }
 
+# Seconds an authenticated user is served from the shared cache instead of a
+# query per request (0 turns it off); saving / deleting the user drops it
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', 60))
+
+# Read-only endpoints (subscription list / export, plans, stats, exchange
+# rates) authenticate GETs from the token claims alone, no user lookup.
+# A deactivated user keeps read access until the access token expires
+JWT_TRUST_CLAIMS_ON_READS = os.getenv('JWT_TRUST_CLAIMS_ON_READS', 'False').lower() in ('true', '1', 't')
+
+# Refresh tokens revoked on rotation: kept in Redis (JWT_BLACKLIST_REDIS_URL,
+# defaults to the cache Redis) with a per-process bloom filter in front that
+# syncs every JWT_BLACKLIST_SYNC_INTERVAL seconds; without Redis in the Django cache
+JWT_BLACKLIST_REDIS_URL = os.getenv('JWT_BLACKLIST_REDIS_URL', os.getenv('REDIS_CACHE_URL', os.getenv('REDIS_URL', '')))
+JWT_BLACKLIST_BLOOM_CAPACITY = int(os.getenv('JWT_BLACKLIST_BLOOM_CAPACITY', 1000000))
+JWT_BLACKLIST_BLOOM_ERROR_RATE = float(os.getenv('JWT_BLACKLIST_BLOOM_ERROR_RATE', 0.001))
+JWT_BLACKLIST_SYNC_INTERVAL = float(os.getenv('JWT_BLACKLIST_SYNC_INTERVAL', 1.0))
+
 # ======== CORS Settings ========>>
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -66,6 +93,19 @@ CORS_ALLOW_CREDENTIALS = True
 # Pagination
 PAGINATE_BY = 12
 
+# Rows per database fetch and per rendered chunk of the streamed subscription export
+SUBSCRIPTION_EXPORT_CHUNK_SIZE = int(os.getenv('SUBSCRIPTION_EXPORT_CHUNK_SIZE', 1000))
+
+# Bulk subscribe: items accepted per request and rows per INSERT
+SUBSCRIPTION_BULK_MAX_ITEMS = int(os.getenv('SUBSCRIPTION_BULK_MAX_ITEMS', 1000))
+SUBSCRIPTION_BULK_BATCH_SIZE = int(os.getenv('SUBSCRIPTION_BULK_BATCH_SIZE', 500))
+
+# Admin changelists on large tables: below ADMIN_LARGE_TABLE_THRESHOLD rows the
+# count is exact, above it the unfiltered count comes from the table statistics
+# and filtered counts stop at ADMIN_COUNT_LIMIT
+ADMIN_LARGE_TABLE_THRESHOLD = int(os.getenv('ADMIN_LARGE_TABLE_THRESHOLD', 100000))
+ADMIN_COUNT_LIMIT = int(os.getenv('ADMIN_COUNT_LIMIT', 10000))
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
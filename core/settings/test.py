@@ -0,0 +1,42 @@
+from .base import *
+
+# SETTINGS_MODULE=core.settings.test python manage.py test apps.subscription
+# SQLite by default; point TEST_DB_* at a MySQL server to run the same suite there
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+STATIC_URL = 'static/'
+
+DATABASES = {
+    'default': {
+        'ENGINE': os.getenv('TEST_DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.getenv('TEST_DB_NAME', BASE_DIR / 'test_db.sqlite3'),
+        'USER': os.getenv('TEST_DB_USER', ''),
+        'PASSWORD': os.getenv('TEST_DB_PASSWORD', ''),
+        'HOST': os.getenv('TEST_DB_HOST', ''),
+        'PORT': os.getenv('TEST_DB_PORT', ''),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# refresh token blacklist in the cache above; set TEST_REDIS_URL to also
+# run the Redis blacklist tests against a server (its keys are flushed)
+JWT_BLACKLIST_REDIS_URL = ''
+TEST_REDIS_URL = os.getenv('TEST_REDIS_URL', '')
+
+# rate log buffer in process, written only when a test flushes it
+EXCHANGE_RATE_LOG_BUFFER_REDIS_URL = ''
+EXCHANGE_RATE_LOG_FLUSH_INTERVAL = 0
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# EXPLAIN output of every query the suite runs is written here when set
+QUERY_PLANS_DIR = os.getenv('QUERY_PLANS_DIR', '')
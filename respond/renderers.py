@@ -1,5 +1,19 @@
+from django.conf import settings
 from rest_framework.renderers import JSONRenderer
 
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used without it
+    orjson = None
+
+
+# floats the stdlib and orjson write differently: 1e-05 / 0.00001 and
+# 1e+16 / 1e16. With digits and '-' folded to '0' those show up as '0.0000'
+# or '0e0'; output that has either is rendered by the stdlib instead (false
+# positives only cost the fallback)
+ORJSON_FLOAT_FOLD = bytes.maketrans(b'123456789-', b'0000000000')
+ORJSON_FLOAT_MARKERS = (b'0.0000', b'0e0')
+
 
 class StandardizedJSONRenderer(JSONRenderer):
 
@@ -8,10 +22,10 @@ class StandardizedJSONRenderer(JSONRenderer):
         response = renderer_context.get("response") if renderer_context else None
         status_code = getattr(response, "status_code", 200)
 
-        #  if the response is already standardized==>>
-        if isinstance(data, dict) and "success" in data and "status_code" in data:
+        #  if the response is already standardized (respond.utils uses statusCode)==>>
+        if isinstance(data, dict) and "success" in data and ("status_code" in data or "statusCode" in data):
             # Response is already standardized, return as is==>>
-            return super().render(data, accepted_media_type, renderer_context)
+            return self.dumps(data, accepted_media_type, renderer_context)
 
         success = 200 <= status_code < 400
 
@@ -21,8 +35,10 @@ class StandardizedJSONRenderer(JSONRenderer):
         error_details = None
 
         if isinstance(data, dict):
-            if "message" in data and isinstance(data["message"], str):
-                message = data.pop("message")
+            if isinstance(data.get("message"), str):
+                # without mutating the view's data
+                message = data["message"]
+                data = {key: value for key, value in data.items() if key != "message"}
 
             # Handle different error scenarios
             if not success:
@@ -61,7 +77,42 @@ class StandardizedJSONRenderer(JSONRenderer):
         else:
             standardized["error_details"] = error_details
 
-        return super().render(standardized, accepted_media_type, renderer_context)
+        return self.dumps(standardized, accepted_media_type, renderer_context)
+
+    def dumps(self, data, accepted_media_type=None, renderer_context=None):
+        # orjson when available and enabled, same bytes as JSONRenderer.render()
+        if self.use_orjson(data, accepted_media_type, renderer_context):
+            try:
+                ret = orjson.dumps(
+                    data,
+                    default=self.encoder_class().default,
+                    option=orjson.OPT_PASSTHROUGH_DATETIME,
+                )
+            except TypeError:
+                # unsupported type or an int beyond 64 bits
+                ret = None
+
+            if ret is not None and not self.float_mismatch(ret):
+                if b'\xe2\x80' in ret:
+                    # JSONRenderer escapes the line / paragraph separators
+                    ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+                return ret
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def float_mismatch(self, ret):
+        folded = ret.translate(ORJSON_FLOAT_FOLD)
+        return any(marker in folded for marker in ORJSON_FLOAT_MARKERS)
+
+    def use_orjson(self, data, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and settings.RESPOND_USE_ORJSON
+            and data is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
 
     def _is_validation_error(self, data):
         if not isinstance(data, dict):
@@ -1,7 +1,12 @@
+from itertools import islice
+
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .renderers import StandardizedJSONRenderer
+
 
 # ======  standardized API response format =======>>
 def get_standardized_response(success=True, message="", data=None, status_code=200, error_details=None):
@@ -41,6 +46,41 @@ def error_response(message="", error_details=None, status_code=400):
     )
 
 
+# ====== streamed list response ===========>>
+def streaming_list_response(items, message="", extra=None, status_code=200, chunk_size=500):
+    """
+    Same bytes as a view returning {'message': ..., **extra, 'data': [...]}
+    through StandardizedJSONRenderer, but the list is rendered chunk by chunk
+    as `items` is consumed, so memory doesn't grow with the number of rows.
+    """
+    renderer = StandardizedJSONRenderer()
+
+    data_field = {key: value for key, value in (extra or {}).items() if key != "data"}
+    data_field["data"] = []
+    envelope = renderer.dumps({
+        "success": True,
+        "status_code": status_code,
+        "message": message,
+        "data": data_field,
+    })
+    # the empty list is the last value in the envelope, items go in between
+    head, tail = envelope[:-3], envelope[-3:]
+
+    def stream():
+        yield head
+        iterator = iter(items)
+        separator = b""
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+            yield separator + renderer.dumps(chunk)[1:-1]
+            separator = b","
+        yield tail
+
+    return StreamingHttpResponse(stream(), status=status_code, content_type="application/json")
+
+
 # ==== validation error response from serializer errors ===>>
 def validation_error_response(serializer_errors):
     first_field = list(serializer_errors.keys())[0]
@@ -0,0 +1,76 @@
+"""
+Latency of the Subscription admin pages against a fixed budget.
+
+Seed the database first (millions of subscriptions), then run:
+
+    python -m scripts.bench_admin --username admin --budget-ms 500
+"""
+import argparse
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings.local')
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, reset_queries
+from django.test import Client
+
+from apps.subscription.models import Subscription
+
+
+def get_pages():
+    subscription = Subscription.objects.order_by('-created_at', '-id').first()
+    user = subscription.user if subscription else None
+
+    pages = [
+        ('changelist', '/admin/subscription/subscription/'),
+        ('status filter', '/admin/subscription/subscription/?status=active'),
+        ('plan filter', '/admin/subscription/subscription/?status=active&plan__id__exact=1'),
+        ('page 50', '/admin/subscription/subscription/?p=50'),
+        ('add form', '/admin/subscription/subscription/add/'),
+    ]
+    if user is not None:
+        pages.append(('username search', f'/admin/subscription/subscription/?q={user.username}'))
+    if subscription is not None:
+        pages.append(('change form', f'/admin/subscription/subscription/{subscription.id}/change/'))
+    return pages
+
+
+def main(args):
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    settings.DEBUG = True  # to collect connection.queries
+
+    client = Client()
+    client.force_login(User.objects.get(username=args.username))
+
+    failed = False
+    print(f"{'page':20} {'p50 ms':>9} {'max ms':>9} {'queries':>8}")
+    for name, url in get_pages():
+        timings = []
+        for _ in range(args.repeat):
+            reset_queries()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, f"{url} returned {response.status_code}"
+
+        over = max(timings) > args.budget_ms
+        failed = failed or over
+        print(f"{name:20} {statistics.median(timings):9.1f} {max(timings):9.1f} "
+              f"{len(connection.queries):8d}{'  OVER BUDGET' if over else ''}")
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Subscription admin latency budget')
+    parser.add_argument('--username', required=True, help='superuser to log in as')
+    parser.add_argument('--budget-ms', type=float, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    main(parser.parse_args())
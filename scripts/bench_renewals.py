@@ -0,0 +1,135 @@
+"""
+Renewal throughput against the number of workers.
+
+Seeds --renewals auto-renew subscriptions that are all due, then renews
+them with 1, 2, 4, ... worker processes, each one running
+renew_partition on its own user id range exactly as a Celery worker on the
+subscriptions queue does. Between runs the successors are deleted and the
+predecessors made active again, so every run renews the same rows:
+
+    SETTINGS_MODULE=core.settings.test python -m scripts.bench_renewals --renewals 1000000 --workers 1,2,4,8
+
+Point TEST_DB_* at MySQL / PostgreSQL for the scaling numbers: SQLite has
+one writer lock, its workers take turns and the column stays flat.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', os.getenv('SETTINGS_MODULE', 'core.settings.test'))
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from apps.subscription.counters import rebuild_plan_counters
+from apps.subscription.models import Plan, PlanSubscriptionStats, Subscription
+from apps.subscription.renewals import renew_partition, renewal_partitions, renewal_window
+
+
+def seed(renewals, batch_size):
+    plans = Plan.objects.bulk_create([
+        Plan(name=f'Plan {i}', price=9.99 * (i + 1), duration_days=30 * (i + 1)) for i in range(3)
+    ])
+    now = timezone.now()
+    for start in range(0, renewals, batch_size):
+        count = min(batch_size, renewals - start)
+        users = User.objects.bulk_create([
+            User(username=f'renew{i}', email=f'renew{i}@example.com') for i in range(start, start + count)
+        ])
+        # one due subscription per user, end dates spread over the window
+        Subscription.objects.bulk_create([
+            Subscription(
+                user_id=user.id,
+                plan=plans[i % len(plans)],
+                start_date=now - timedelta(days=30),
+                end_date=now + timedelta(minutes=i % (12 * 60)),
+                status='active',
+                auto_renew=True,
+            )
+            for i, user in enumerate(users, start)
+        ])
+    rebuild_plan_counters()
+
+
+def reset(max_id):
+    Subscription.objects.filter(id__gt=max_id).delete()
+    Subscription.objects.filter(id__lte=max_id).update(status='active')
+    rebuild_plan_counters()
+
+
+def run_partition(task):
+    # a fresh connection per process, like a prefork worker child
+    connections['default'].close()
+    since, until, user_from, user_to, max_id, batch_size = task
+    return renew_partition(since, until, user_from, user_to, max_id, batch_size=batch_size, max_seconds=3600)
+
+
+def run(workers, partitions_per_worker, batch_size):
+    since, until = renewal_window()
+    due, max_id, ranges = renewal_partitions(since, until, workers * partitions_per_worker)
+    tasks = [(since, until, user_from, user_to, max_id, batch_size) for user_from, user_to in ranges]
+
+    # forked children must not share the parent's connection
+    connections.close_all()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        started = time.perf_counter()
+        results = pool.map(run_partition, tasks, chunksize=1)
+        elapsed = time.perf_counter() - started
+
+    renewed = sum(result['renewed_count'] for result in results)
+    counters = {stat.plan_id: (stat.active_count, stat.expired_count) for stat in PlanSubscriptionStats.objects.all()}
+    rebuilt = {stat.plan_id: (stat.active_count, stat.expired_count) for stat in rebuild_plan_counters()}
+    correct = (
+        renewed == due
+        and Subscription.objects.filter(id__gt=max_id, status='active').count() == due
+        and counters == rebuilt
+    )
+    return due, max_id, renewed, elapsed, correct
+
+
+def main(args):
+    worker_counts = [int(count) for count in args.workers.split(',')]
+
+    print(f"{args.renewals} due renewals, batches of {args.batch_size}, "
+          f"{args.partitions_per_worker} partitions per worker, {connection.vendor}\n")
+    print(f"{'workers':>7} {'renewed':>9} {'seconds':>9} {'rows/s':>9} {'speedup':>8}  correct")
+
+    baseline = None
+    for workers in worker_counts:
+        due, max_id, renewed, elapsed, correct = run(workers, args.partitions_per_worker, args.batch_size)
+        rate = renewed / elapsed
+        baseline = baseline or rate
+        print(f"{workers:7} {renewed:9} {elapsed:9.2f} {rate:9.0f} {rate / baseline:7.2f}x  {correct}")
+        reset(max_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Subscription renewal scaling benchmark')
+    parser.add_argument('--renewals', type=int, default=100000)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--partitions-per-worker', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=settings.SUBSCRIPTION_RENEWAL_BATCH_SIZE)
+    parser.add_argument('--seed-batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    if connection.vendor == 'sqlite':
+        # processes need a shared database file, not the in-memory test database
+        connection.settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / 'bench_renewals.sqlite3')
+        connection.settings_dict['OPTIONS'].update(timeout=60, transaction_mode='IMMEDIATE')
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(args.renewals, args.seed_batch_size)
+        main(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
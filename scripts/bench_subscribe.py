@@ -0,0 +1,154 @@
+"""
+Concurrent subscribe load test: the old check-then-insert path against the
+optimistic insert of CreateSubscriptionSerializer.
+
+Builds a throwaway test database and fires --requests subscribes from
+--workers threads at once, for (user, plan) pairs drawn so that many of
+them collide. Each path must end with exactly one active subscription per
+pair and counters that match a rebuild:
+
+    SETTINGS_MODULE=core.settings.test python -m scripts.bench_subscribe --workers 200
+
+Point TEST_DB_* at MySQL / PostgreSQL for numbers that mean something, on
+SQLite every insert waits for the one writer lock.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', os.getenv('SETTINGS_MODULE', 'core.settings.test'))
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, connections, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from apps.subscription.catalog import get_plan_catalog
+from apps.subscription.counters import rebuild_plan_counters
+from apps.subscription.models import Plan, PlanSubscriptionStats, Subscription
+from apps.subscription.serializers import ActiveSubscriptionConflict, CreateSubscriptionSerializer
+
+
+class FakeRequest:
+    def __init__(self, user):
+        self.user = user
+
+
+def legacy_subscribe(user, plan_id):
+    # what the serializer did before: exists() check, plan query, insert
+    if not Plan.objects.filter(id=plan_id).exists():
+        return 'invalid'
+    if Subscription.objects.filter(user=user, plan_id=plan_id, status='active').exists():
+        return 'conflict'
+    plan = Plan.objects.get(id=plan_id)
+    try:
+        with transaction.atomic():
+            Subscription.objects.create(user=user, plan=plan, start_date=timezone.now(), status='active')
+    except IntegrityError:
+        # surfaced as a 500 by the view
+        return 'error'
+    return 'created'
+
+
+def optimistic_subscribe(user, plan_id):
+    serializer = CreateSubscriptionSerializer(data={'plan_id': plan_id}, context={'request': FakeRequest(user)})
+    if not serializer.is_valid():
+        return 'invalid'
+    try:
+        serializer.save()
+    except ActiveSubscriptionConflict:
+        return 'conflict'
+    return 'created'
+
+
+def seed(users_count):
+    plans = Plan.objects.bulk_create([
+        Plan(name=f'Plan {i}', price=9.99 * (i + 1), duration_days=30) for i in range(3)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f'load{i}', email=f'load{i}@example.com') for i in range(users_count)
+    ])
+    rebuild_plan_counters()
+    return users, plans
+
+
+def run(path, pairs, workers):
+    def call(pair):
+        user, plan_id = pair
+        started = time.perf_counter()
+        outcome = path(user, plan_id)
+        return outcome, time.perf_counter() - started
+
+    start = threading.Barrier(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # connections opened and the threads lined up before the clock starts
+        list(executor.map(lambda _: (connections['default'].ensure_connection(), start.wait()), range(workers)))
+        started = time.perf_counter()
+        results = list(executor.map(call, pairs))
+        elapsed = time.perf_counter() - started
+        list(executor.map(lambda _: connections['default'].close(), range(workers)))
+
+    return results, elapsed
+
+
+def check(pairs):
+    # one active row per requested pair, counters equal to a full recount
+    active = Counter(Subscription.objects.filter(status='active').values_list('user_id', 'plan_id'))
+    one_each = set(active) == {(user.id, plan_id) for user, plan_id in pairs} and max(active.values()) == 1
+    counters = {stat.plan_id: stat.active_count for stat in PlanSubscriptionStats.objects.all()}
+    rebuilt = {stat.plan_id: stat.active_count for stat in rebuild_plan_counters()}
+    return one_each, counters == rebuilt
+
+
+def main(args, users, plans):
+    rng = random.Random(1)
+    # few distinct pairs for many requests: most of them race another one
+    pairs = [(rng.choice(users), rng.choice(plans).id) for _ in range(args.requests)]
+    get_plan_catalog()
+
+    print(f"{args.requests} subscribes, {len(set((u.id, p) for u, p in pairs))} distinct pairs, "
+          f"{args.workers} workers, {connection.vendor}\n")
+    print(f"{'path':12} {'created':>8} {'409':>6} {'500':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  correct")
+
+    for name, path in [('check-first', legacy_subscribe), ('optimistic', optimistic_subscribe)]:
+        Subscription.objects.all().delete()
+        rebuild_plan_counters()
+
+        results, elapsed = run(path, pairs, args.workers)
+        outcomes = Counter(outcome for outcome, _ in results)
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        one_each, counters_ok = check(pairs)
+
+        print(f"{name:12} {outcomes['created']:8} {outcomes['conflict']:6} {outcomes['error']:6} "
+              f"{len(results) / elapsed:8.0f} {latencies[len(latencies) // 2]:8.1f} "
+              f"{latencies[int(len(latencies) * 0.99)]:8.1f}  {one_each and counters_ok}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent subscribe load test')
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=200)
+    args = parser.parse_args()
+
+    if connection.vendor == 'sqlite':
+        # threads need a shared database file, not the in-memory test database
+        connection.settings_dict['TEST']['NAME'] = str(settings.BASE_DIR / 'bench_subscribe.sqlite3')
+        connection.settings_dict['OPTIONS'].update(timeout=60, transaction_mode='IMMEDIATE')
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        users, plans = seed(args.users)
+        main(args, users, plans)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
@@ -0,0 +1,107 @@
+"""
+SubscriptionSerializer vs the .values() listing serializer.
+
+Builds a throwaway test database, seeds it and times both paths, query
+included and serialization only:
+
+    SETTINGS_MODULE=core.settings.test python -m scripts.bench_subscription_serializer --rows 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', os.getenv('SETTINGS_MODULE', 'core.settings.test'))
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from apps.subscription.models import Plan, Subscription
+from apps.subscription.serializers import SubscriptionListSerializer, SubscriptionSerializer
+
+
+def seed(rows):
+    rng = random.Random(1)
+    now = timezone.now()
+    plans = Plan.objects.bulk_create([
+        Plan(name=f'Plan {i}', price=9.99 * (i + 1), duration_days=30 * (i + 1)) for i in range(5)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(max(1, rows // 50))
+    ])
+    subscriptions = []
+    for i in range(rows):
+        start_date = now - timedelta(days=rng.randint(0, 400))
+        plan = plans[i % len(plans)]
+        subscriptions.append(Subscription(
+            user=users[i % len(users)],
+            plan=plan,
+            start_date=start_date,
+            end_date=start_date + timedelta(days=plan.duration_days),
+            # one active subscription per user, the unique_active_user_plan index
+            status='active' if i < len(users) else rng.choice(['cancelled', 'expired']),
+        ))
+    Subscription.objects.bulk_create(subscriptions, batch_size=1000)
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(args):
+    queryset = Subscription.objects.order_by('-created_at', '-id')
+
+    instances = list(queryset.select_related('user', 'plan'))
+    rows = list(SubscriptionListSerializer.get_values(queryset))
+
+    renderer = JSONRenderer()
+    same = renderer.render(SubscriptionSerializer(instances, many=True).data) == \
+        renderer.render(SubscriptionListSerializer(rows).data)
+
+    results = [
+        ('SubscriptionSerializer', 'serialize',
+         timed(lambda: SubscriptionSerializer(instances, many=True).data, args.repeat)),
+        ('SubscriptionListSerializer', 'serialize',
+         timed(lambda: SubscriptionListSerializer(rows).data, args.repeat)),
+        ('SubscriptionSerializer', 'query + serialize',
+         timed(lambda: SubscriptionSerializer(queryset.select_related('user', 'plan'), many=True).data, args.repeat)),
+        ('SubscriptionListSerializer', 'query + serialize',
+         timed(lambda: SubscriptionListSerializer(SubscriptionListSerializer.get_values(queryset)).data, args.repeat)),
+    ]
+
+    print(f"{len(rows)} rows, median of {args.repeat} runs, identical JSON: {same}\n")
+    print(f"{'serializer':28} {'path':18} {'ms':>9} {'rows/s':>10}")
+    for name, path, ms in results:
+        print(f"{name:28} {path:18} {ms:9.1f} {len(rows) / ms * 1000:10.0f}")
+
+    print(f"\nspeedup, serialize: {results[0][2] / results[1][2]:.1f}x, "
+          f"query + serialize: {results[2][2] / results[3][2]:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Subscription listing serializer benchmark')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(args.rows)
+        main(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
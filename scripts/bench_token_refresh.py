@@ -0,0 +1,111 @@
+"""
+Refresh token rotation throughput per blacklist store.
+
+    SETTINGS_MODULE=core.settings.test python -m scripts.bench_token_refresh --redis-url redis://localhost:6379/15
+
+Each store runs in its own process on a throwaway test database:
+  none   rotation without revocation (the tree before the blacklist)
+  db     simplejwt's token_blacklist app, a table write per issued token
+  cache  CacheTokenBlacklist, a cache read per check
+  redis  RedisTokenBlacklist, bloom filter in front of Redis (--redis-url)
+
+Besides refreshes/s it times the check alone for a token that isn't
+revoked, with --revoked tokens already in the store.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+STORES = ['none', 'db', 'cache', 'redis']
+
+
+def run_store(args):
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', os.getenv('SETTINGS_MODULE', 'core.settings.test'))
+    from django.conf import settings
+
+    if args.store == 'db':
+        settings.INSTALLED_APPS = list(settings.INSTALLED_APPS) + ['rest_framework_simplejwt.token_blacklist']
+    settings.JWT_BLACKLIST_REDIS_URL = args.redis_url if args.store == 'redis' else ''
+    # a local memory cache culls at 300 entries by default, revocations included
+    settings.CACHES['default'].setdefault('OPTIONS', {})['MAX_ENTRIES'] = args.revoked * 2
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from apps.subscription.authentication import BlacklistTokenRefreshSerializer
+    from apps.subscription.blacklist import get_token_blacklist
+
+    serializer_class = BlacklistTokenRefreshSerializer if args.store in ('cache', 'redis') else TokenRefreshSerializer
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user('bench', 'bench@example.com', 'x')
+        exp = int(time.time()) + 3600
+
+        check_us = None
+        if args.store in ('cache', 'redis'):
+            blacklist = get_token_blacklist()
+            for _ in range(args.revoked):
+                blacklist.add(uuid.uuid4().hex, exp)
+            jti = uuid.uuid4().hex
+            jti in blacklist
+            started = time.perf_counter()
+            for _ in range(args.checks):
+                jti in blacklist
+            check_us = (time.perf_counter() - started) / args.checks * 10 ** 6
+
+        refresh = first = str(RefreshToken.for_user(user))
+        started = time.perf_counter()
+        for _ in range(args.refreshes):
+            serializer = serializer_class(data={'refresh': refresh})
+            serializer.is_valid(raise_exception=True)
+            refresh = serializer.validated_data['refresh']
+        elapsed = time.perf_counter() - started
+
+        # a rotated token used again: refused by every store but none
+        try:
+            refused = not serializer_class(data={'refresh': first}).is_valid()
+        except Exception:
+            refused = True
+
+        print(f"{args.store:6} {args.refreshes / elapsed:12.0f} "
+              f"{'-' if check_us is None else f'{check_us:.1f}':>12} {str(refused):>9}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Refresh token blacklist benchmark')
+    parser.add_argument('--store', choices=STORES + ['all'], default='all')
+    parser.add_argument('--redis-url', default=os.getenv('REDIS_URL', ''))
+    parser.add_argument('--refreshes', type=int, default=2000)
+    parser.add_argument('--revoked', type=int, default=100000)
+    parser.add_argument('--checks', type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.store != 'all':
+        run_store(args)
+        sys.exit()
+
+    print(f"{args.refreshes} refreshes, {args.revoked} revoked tokens in the store\n")
+    print(f"{'store':6} {'refreshes/s':>12} {'check us':>12} {'replay refused':>9}")
+    for store in STORES:
+        if store == 'redis' and not args.redis_url:
+            print(f"{store:6} {'(no --redis-url)':>25}")
+            continue
+        command = [sys.executable, '-m', 'scripts.bench_token_refresh', '--store', store,
+                   '--refreshes', str(args.refreshes), '--revoked', str(args.revoked),
+                   '--checks', str(args.checks), '--redis-url', args.redis_url]
+        output = subprocess.run(command, capture_output=True, text=True)
+        print(output.stdout.strip().splitlines()[-1] if output.returncode == 0 else f"{store:6} failed:\n{output.stderr}")
@@ -0,0 +1,88 @@
+"""
+Concurrent throughput of the I/O bound endpoints, WSGI vs ASGI.
+
+Start both servers against the same database and cache, then run:
+
+    gunicorn --workers 4 --bind 127.0.0.1:8000 core.wsgi:application
+    ASYNC_API_VIEWS=True uvicorn core.asgi:application --port 8001 --workers 4
+
+    python -m scripts.bench_wsgi_asgi --username example1 --password testpass123
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+ENDPOINTS = [
+    '/api/exchange-rate/?base=USD&target=BDT',
+    '/api/plans/',
+    '/api/exchange-rate/history/',
+]
+
+
+async def get_token(base_url, username, password):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.post('/api/auth/token/', json={'username': username, 'password': password})
+        response.raise_for_status()
+        return response.json()['data']['access']
+
+
+async def run(base_url, path, token, requests, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30,
+                                 headers={'Authorization': f'Bearer {token}'}) as client:
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': requests / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'mean': statistics.mean(latencies) * 1000,
+        'errors': errors,
+    }
+
+
+async def main(args):
+    targets = [('wsgi', args.wsgi_url), ('asgi', args.asgi_url)]
+    token = await get_token(args.wsgi_url, args.username, args.password)
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}\n")
+    print(f"{'endpoint':45} {'mode':5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'errors':>7}")
+    for path in ENDPOINTS:
+        for mode, base_url in targets:
+            result = await run(base_url, path, token, args.requests, args.concurrency)
+            print(f"{path:45} {mode:5} {result['rps']:9.1f} {result['p50']:9.1f} "
+                  f"{result['p95']:9.1f} {result['mean']:9.1f} {result['errors']:7d}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare WSGI and ASGI throughput')
+    parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--asgi-url', default='http://127.0.0.1:8001')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -1,21 +1,11 @@
-import requests
+from apps.subscription.rate_provider import RateProviderClient, RateProviderError
 
-def fetch_exchange_rates(base="USD", symbols=["BDT"]):
-    url = f"https://open.er-api.com/v6/latest/{base}"
-
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
+client = RateProviderClient()
 
-        if data.get("result") != "success":
-            print("API returned error:", data)
-            return
 
-        rates = data.get("rates")
-        if not rates:
-            print("Unexpected API response structure:", data)
-            return
+def fetch_exchange_rates(base="USD", symbols=["BDT"]):
+    try:
+        rates = client.get_rates(base)
 
         print(f"Exchange rates (base {base}):")
         for currency in symbols:
@@ -33,7 +23,7 @@ def fetch_exchange_rates(base="USD", symbols=["BDT"]):
         else:
             print("BDT rate not found.")
 
-    except requests.RequestException as e:
+    except RateProviderError as e:
         print("Network error:", e)
     except Exception as e:
         print("Unexpected error:", e)